@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,7 +43,7 @@ MIDDLEWARE = [
 
     # 🔥 custom middleware
     'notify.middleware.auth_flow.AuthFlowMiddleware',
-    'notify.middleware.no_cache.NoCacheMiddleware',
+    'notify.middleware.cache_policy.CachePolicyMiddleware',
 ]
 
 ROOT_URLCONF = 'InternalNotify.urls'
@@ -76,6 +77,71 @@ DATABASES = {
     }
 }
 
+# SQLite profile
+# - "production": web + scheduler เขียน DB ไฟล์เดียวกันพร้อมกันได้ (ลด "database is locked")
+#     WAL       -> อ่านไม่ block เขียน / เขียนไม่ block อ่าน
+#     IMMEDIATE -> จอง write lock ตั้งแต่ BEGIN (รอตาม busy_timeout แทนที่จะ error ทันทีตอน upgrade lock)
+#     CONN_MAX_AGE -> ใช้ connection เดิมต่อ (PRAGMA รันครั้งเดียวตอนเปิด)
+# - "default": ค่าเดิมของ Django (rollback journal, connection ต่อ request)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",                    # WAL + NORMAL: ไม่เสียข้อมูลเมื่อ process ตาย (เสียได้แค่ตอนไฟดับ)
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-32000")),  # ค่าติดลบ = KiB (~32MB)
+    "temp_store": "MEMORY",
+}
+
+# ใช้ซ้ำใน `python manage.py bench_sqlite` (เทียบกับค่า default)
+SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': int(os.getenv("SQLITE_CONN_MAX_AGE", "600")),
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ";".join(f"PRAGMA {k}={v}" for k, v in SQLITE_PRAGMAS.items()),
+    },
+}
+
+if SQLITE_PROFILE == "production":
+    DATABASES['default'].update(SQLITE_PRODUCTION)
+
+
+# Cache (fragment ของ dashboard / จำนวนแถวของ pagination)
+# - locmem: ต่อ process (พอสำหรับเครื่องเดียว, version ของ fragment อยู่ใน DB จึงไม่เห็นของเก่า)
+# - file:   ใช้ร่วมกันทุก process ในเครื่อง
+# - db:     ใช้ร่วมกันข้ามเครื่อง (ต้องรัน `python manage.py createcachetable` ก่อน)
+NOTIFY_CACHE_BACKEND = os.getenv("NOTIFY_CACHE_BACKEND", "locmem")
+
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "internalnotify",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("NOTIFY_CACHE_LOCATION", str(BASE_DIR / ".django_cache")),
+    },
+    "db": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": os.getenv("NOTIFY_CACHE_LOCATION", "django_cache"),
+    },
+}
+
+CACHES = {
+    "default": {
+        **CACHE_BACKENDS[NOTIFY_CACHE_BACKEND],
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("NOTIFY_CACHE_MAX_ENTRIES", "5000"))},
+    },
+}
+
+NOTIFY_FRAGMENT_CACHE_SECONDS = int(os.getenv("NOTIFY_FRAGMENT_CACHE_SECONDS", "300"))
+NOTIFY_COUNT_CACHE_SECONDS = int(os.getenv("NOTIFY_COUNT_CACHE_SECONDS", "60"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -112,10 +178,142 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# production (DEBUG=False): collectstatic เติม hash ลงชื่อไฟล์ (css/base.1a2b3c4d5e6f.css)
+# -> {% static %} คืนชื่อที่มี hash, CachePolicyMiddleware / nginx ใส่ max-age 1 ปี + immutable
+# ไฟล์เปลี่ยน = ชื่อเปลี่ยน browser โหลดใหม่เอง
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG else
+            "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"
+        ),
+    },
+}
+
+# static ที่ไม่มี hash (DEBUG) -> cache สั้น ๆ แล้ว revalidate ด้วย ETag / Last-Modified
+NOTIFY_STATIC_MAX_AGE = int(os.getenv("NOTIFY_STATIC_MAX_AGE", "3600"))
 
 AUTH_USER_MODEL = 'notify.User'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "user_uploads"
 
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
\ No newline at end of file
+# ไฟล์แนบ /media/ ผ่าน notify.views.serve_attachment (ตรวจเจ้าของ) แล้วส่งไฟล์ด้วย
+#   ""       -> FileResponse + Range (runserver / gunicorn ตรง ๆ)
+#   "nginx"  -> X-Accel-Redirect ให้ nginx ส่งเอง ต้องมี
+#               location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+#   "apache" -> X-Sendfile (mod_xsendfile / lighttpd)
+NOTIFY_MEDIA_SENDFILE = os.getenv("NOTIFY_MEDIA_SENDFILE", "")
+NOTIFY_MEDIA_ACCEL_PREFIX = os.getenv("NOTIFY_MEDIA_ACCEL_PREFIX", "/protected-media/")
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+
+# Bot API endpoint (load test: ชี้ไป `python manage.py run_fake_telegram` เช่น http://127.0.0.1:8081)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+
+# Notification Engine
+# ดูรายละเอียดใน notify/services/notification_engine.py
+
+NOTIFY_DUE_BATCH_SIZE = int(os.getenv("NOTIFY_DUE_BATCH_SIZE", "500"))
+NOTIFY_DISPATCH_WORKERS = int(os.getenv("NOTIFY_DISPATCH_WORKERS", "1"))
+NOTIFY_STATUS_FLUSH_SIZE = int(os.getenv("NOTIFY_STATUS_FLUSH_SIZE", "500"))
+NOTIFY_STATUS_WRITE_CHUNK = int(os.getenv("NOTIFY_STATUS_WRITE_CHUNK", "100"))
+NOTIFY_FANOUT_CHUNK_SIZE = int(os.getenv("NOTIFY_FANOUT_CHUNK_SIZE", "200"))
+
+# รวมรายการของ chat เดียวกันที่ถึงเวลาใน tick เดียวกันเป็นข้อความ digest
+NOTIFY_COALESCE = os.getenv("NOTIFY_COALESCE", "false").lower() == "true"
+NOTIFY_DIGEST_MIN_ITEMS = int(os.getenv("NOTIFY_DIGEST_MIN_ITEMS", "2"))
+
+# Retry: exponential backoff + jitter (retry ครั้งที่ n รอ ~BASE * 2^(n-1) วินาที, ไม่เกิน CAP)
+NOTIFY_MAX_RETRY = int(os.getenv("NOTIFY_MAX_RETRY", "2"))
+NOTIFY_RETRY_BACKOFF_BASE = float(os.getenv("NOTIFY_RETRY_BACKOFF_BASE", "60"))
+NOTIFY_RETRY_BACKOFF_CAP = float(os.getenv("NOTIFY_RETRY_BACKOFF_CAP", "3600"))
+
+# Multi-worker: lease ของรายการที่ claim ไป / ชื่อ worker (default = hostname:pid)
+NOTIFY_LEASE_SECONDS = int(os.getenv("NOTIFY_LEASE_SECONDS", "300"))
+
+# เขียน DB แล้วเจอ "database is locked" -> ลองใหม่กี่ครั้ง (backoff เริ่มที่ NOTIFY_DB_LOCK_BACKOFF วินาที)
+NOTIFY_DB_LOCK_RETRIES = int(os.getenv("NOTIFY_DB_LOCK_RETRIES", "5"))
+NOTIFY_DB_LOCK_BACKOFF = float(os.getenv("NOTIFY_DB_LOCK_BACKOFF", "0.05"))
+NOTIFY_WORKER_ID = os.getenv("NOTIFY_WORKER_ID", "")
+
+# เก็บประวัติการส่ง (NotificationDelivery) กี่วัน -> `manage.py prune_deliveries`
+NOTIFY_DELIVERY_RETENTION_DAYS = int(os.getenv("NOTIFY_DELIVERY_RETENTION_DAYS", "30"))
+
+# admin dashboard stats: นับใหม่ทั้งหมดทุกกี่วินาที (แก้ค่าที่เพี้ยนจาก +/- แบบ incremental), 0 = ปิด
+NOTIFY_STATS_RECOMPUTE_SECONDS = int(os.getenv("NOTIFY_STATS_RECOMPUTE_SECONDS", "3600"))
+
+# รัน engine ใน web process (runserver) หรือไม่
+# production: ตั้งเป็น False แล้วรัน `python manage.py run_notify_worker` แยก
+NOTIFY_RUN_SCHEDULER_IN_WEB = os.getenv("NOTIFY_RUN_SCHEDULER_IN_WEB", "true").lower() == "true"
+
+# Scheduler: "interval" (poll ทุก NOTIFY_POLL_SECONDS) หรือ "timer" (รอจนถึงเวลาส่งพอดี)
+NOTIFY_SCHEDULER_MODE = os.getenv("NOTIFY_SCHEDULER_MODE", "interval")
+NOTIFY_POLL_SECONDS = int(os.getenv("NOTIFY_POLL_SECONDS", "15"))
+NOTIFY_RECONCILE_SECONDS = int(os.getenv("NOTIFY_RECONCILE_SECONDS", "60"))
+# timer mode: engine แยก process เห็น notification ใหม่ภายในกี่วินาที (0 = รอ reconcile)
+NOTIFY_WATCH_SECONDS = float(os.getenv("NOTIFY_WATCH_SECONDS", "5"))
+NOTIFY_TIMER_HORIZON = int(os.getenv("NOTIFY_TIMER_HORIZON", "1000"))
+
+# /metrics: admin ที่ login อยู่ หรือ scraper ที่ส่ง Authorization: Bearer <NOTIFY_METRICS_TOKEN>
+# (token ว่าง = scrape ไม่ได้) ใช้ token เดียวกันกับ --metrics-port ของ run_notify_worker
+NOTIFY_METRICS_TOKEN = os.getenv("NOTIFY_METRICS_TOKEN", "")
+# IP ที่ scrape ได้โดยไม่ต้องมี token (default ว่าง)
+# หลัง nginx ทุก request มาจาก 127.0.0.1 -> ห้ามใส่ IP ของ proxy
+NOTIFY_METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.getenv("NOTIFY_METRICS_ALLOWED_IPS", "").split(",") if ip.strip()
+]
+
+# Telegram HTTP client (connection pool / timeouts)
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", str(max(10, NOTIFY_DISPATCH_WORKERS))))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_TEXT_TIMEOUT = float(os.getenv("TELEGRAM_TEXT_TIMEOUT", "10"))
+TELEGRAM_FILE_TIMEOUT = float(os.getenv("TELEGRAM_FILE_TIMEOUT", "20"))
+
+# Telegram rate limit (token bucket: global ต่อ bot + ต่อ chat)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_GLOBAL_BURST = float(os.getenv("TELEGRAM_GLOBAL_BURST", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_RATE_LIMIT_MAX_WAIT = float(os.getenv("TELEGRAM_RATE_LIMIT_MAX_WAIT", "5"))
+
+# Telegram log: response body ยาวสุดกี่ตัวอักษร / สุ่ม log body ของ response ที่สำเร็จกี่ % (0-1)
+TELEGRAM_LOG_BODY_CHARS = int(os.getenv("TELEGRAM_LOG_BODY_CHARS", "300"))
+TELEGRAM_LOG_BODY_SAMPLE = float(os.getenv("TELEGRAM_LOG_BODY_SAMPLE", "0"))
+
+
+# Logging
+# engine / sender / scheduler -> JSON 1 บรรทัดต่อ event ผ่าน queue (ไม่ block thread ที่ส่งข้อความ)
+NOTIFY_LOG_LEVEL = os.getenv("NOTIFY_LOG_LEVEL", "INFO").upper()
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "notify_queue": {
+            "class": "notify.log.NonBlockingHandler",
+            "maxsize": int(os.getenv("NOTIFY_LOG_QUEUE_SIZE", "10000")),
+        },
+    },
+    "loggers": {
+        "notify": {
+            "handlers": ["notify_queue"],
+            "level": NOTIFY_LOG_LEVEL,
+            "propagate": False,
+        },
+    },
+}
+
+# manage.py test -> ไม่พิมพ์ log (JSON / django.request) ปนผลเทสต์
+if sys.argv[1:2] == ["test"]:
+    LOGGING["handlers"] = {"null": {"class": "logging.NullHandler"}}
+    LOGGING["loggers"] = {
+        name: {"handlers": ["null"], "propagate": False}
+        for name in ("notify", "django.request")
+    }
@@ -1,5 +1,78 @@
 from django.contrib import admin
-from .models import User, Notification
+from .models import User, Notification, NotificationDelivery, TelegramFile
+
+from notify.scheduler import notify_schedule_changed
+from notify.services import fragment_cache
+from notify.services import stats as notification_stats
+from notify.services.notification_engine import compute_next_fire_at, release_lease
+from notify.services.pagination import invalidate_counts
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    """
+    ช่องทางเดียวที่สร้าง broadcast ถึงทุกคน (target_type = all)
+    -> ทำ bookkeeping เหมือน view create / edit / delete
+       (next_fire_at, stats, dashboard_version, cached count, ปลุก timer)
+    field ที่ engine เป็นเจ้าของแก้ไม่ได้
+    """
+
+    list_display = ("id", "title", "user", "target_type", "event_type", "status", "next_fire_at")
+    list_filter = ("status", "target_type", "event_type")
+    search_fields = ("title", "user__username")
+
+    readonly_fields = (
+        "next_fire_at",
+        "last_sent_event_at",
+        "sending_event_at",
+        "send_started_at",
+        "lease_owner",
+        "lease_expires_at",
+    )
+
+    # แก้ field เหล่านี้ = เริ่มรอบใหม่ (เหมือนหน้าแก้ไขของ user)
+    SCHEDULE_FIELDS = {"event_type", "event_datetime", "start_datetime", "interval_value", "interval_unit", "status"}
+
+    def save_model(self, request, obj, form, change):
+        stat_keys_before = None
+        user_ids = {obj.user_id}
+        if change:
+            before = Notification.objects.select_related("user").get(pk=obj.pk)
+            stat_keys_before = notification_stats.keys_for(before)
+            user_ids.add(before.user_id)
+            if self.SCHEDULE_FIELDS & set(form.changed_data):
+                obj.last_sent_event_at = None
+            # engine กำลังส่งรอบเดิมอยู่ -> ผลของรอบเดิมไม่เขียนทับการแก้ไขนี้
+            release_lease(obj)
+
+        obj.next_fire_at = compute_next_fire_at(obj)
+        super().save_model(request, obj, form, change)
+
+        if change:
+            notification_stats.track_changed(stat_keys_before, obj)
+        else:
+            notification_stats.track_created(obj)
+
+        fragment_cache.bump_dashboard_version(*user_ids)
+        invalidate_counts("notifications:all", *[f"notifications:user:{uid}" for uid in user_ids])
+        notify_schedule_changed(obj)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        notification_stats.track_deleted(obj)
+        fragment_cache.bump_dashboard_version(obj.user_id)
+        invalidate_counts("notifications:all", f"notifications:user:{obj.user_id}")
+        notify_schedule_changed()
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list("user_id", flat=True))
+        notification_stats.track_deleted_queryset(queryset)
+        super().delete_queryset(request, queryset)
+        fragment_cache.bump_dashboard_version(*user_ids)
+        invalidate_counts("notifications:all", *[f"notifications:user:{uid}" for uid in user_ids])
+        notify_schedule_changed()
+
 
 admin.site.register(User)
-admin.site.register(Notification)
\ No newline at end of file
+admin.site.register(NotificationDelivery)
+admin.site.register(TelegramFile)
@@ -11,5 +11,10 @@ class NotifyConfig(AppConfig):
         if os.environ.get("RUN_MAIN") != "true":
             return
 
+        # ใช้ worker แยก (manage.py run_notify_worker) -> ไม่ต้องรัน engine ใน web process
+        from django.conf import settings
+        if not getattr(settings, "NOTIFY_RUN_SCHEDULER_IN_WEB", True):
+            return
+
         from notify.scheduler import start
         start()
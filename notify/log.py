@@ -0,0 +1,118 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from notify.services import metrics
+
+# =========================
+# Structured logging (engine / sender)
+# =========================
+# - ทุกบรรทัดเป็น JSON 1 บรรทัด มี notification_id / chat_id / latency_ms เสมอ (null ถ้าไม่มี)
+# - QueueHandler: thread ที่ส่งข้อความแค่ put ลง queue ไม่ต้องรอเขียน stdout
+# - queue เต็ม -> ทิ้ง log (นับไว้ใน dropped) ดีกว่า block การส่ง
+
+# field ที่ทุกบรรทัดต้องมี
+BASE_FIELDS = ("notification_id", "chat_id", "latency_ms")
+
+# attribute มาตรฐานของ LogRecord (ที่เหลือ = extra ของ caller)
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("notify_log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    แนบ field ให้ทุกบรรทัดใน block นี้ (เช่น notification_id ระหว่างส่ง 1 รายการ)
+    ใช้ได้กับ thread pool: ContextVar แยกกันต่อ thread
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    เติม field จาก log_context() ลง record (รันใน thread ที่เรียก log ก่อนเข้า queue)
+    """
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+
+        for key in BASE_FIELDS:
+            payload[key] = getattr(record, key, None)
+
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in payload:
+                payload[key] = value
+
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class NonBlockingHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler + QueueListener ในตัว (ใช้ใน settings.LOGGING ได้ตรง ๆ)
+    - caller thread: filter + put_nowait ลง queue
+    - listener thread: format JSON แล้วเขียน stream
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.dropped = 0
+        self.addFilter(ContextFilter())
+
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JsonFormatter())
+
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # ไม่ format ใน caller thread (QueueHandler ปกติจะ format ก่อน put)
+        # แค่ resolve args + exception เป็น string ให้ส่งข้าม thread ได้ปลอดภัย
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.LOG_DROPPED.inc()
+
+
+def truncate(text: str, limit: int) -> str:
+    if text is None or len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit})"
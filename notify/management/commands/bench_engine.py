@@ -0,0 +1,295 @@
+# notify/management/commands/bench_engine.py
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.utils import timezone
+
+from notify.models import Notification, NotificationDelivery, User
+from notify.services import notification_engine as engine
+from notify.services import stats
+from notify.services.telegram_sender import SendResult
+
+# user / notification ที่ benchmark สร้างขึ้น (ลบทิ้งตอนจบ ยกเว้น --keep)
+PREFIX = "bench_"
+SEED_CHUNK = 5000
+
+
+class QueryCounter:
+    """
+    นับ SQL ทุก connection (รวม thread ใน dispatch pool) ระหว่าง benchmark
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _wrap(self, original):
+        counter = self
+
+        def wrapper(cursor, sql, *args, **kwargs):
+            with counter._lock:
+                counter.count += 1
+            return original(cursor, sql, *args, **kwargs)
+
+        return wrapper
+
+    def patch(self):
+        return mock.patch.multiple(
+            CursorWrapper,
+            execute=self._wrap(CursorWrapper.execute),
+            executemany=self._wrap(CursorWrapper.executemany),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark engine: seed User/Notification จำลอง แล้ววัด build_due_items + process_notifications "
+        "(ส่งผ่าน transport จำลอง ไม่ยิง Telegram จริง) -- เขียนลง DB ที่ตั้งค่าไว้ ใช้กับ DB ทดสอบเท่านั้น"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--notifications", type=int, default=10_000, help="1k - 1M")
+        parser.add_argument("--recurring-ratio", type=float, default=0.3)
+        parser.add_argument("--due-ratio", type=float, default=0.2, help="สัดส่วนที่ถึงเวลาส่งแล้วตอนเริ่ม")
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--ticks", type=int, default=0, help="0 = วนจนไม่มีรายการค้าง")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="latency จำลองของ transport ต่อข้อความ")
+        parser.add_argument("--failure-rate", type=float, default=0.0)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", default="bench_engine.json")
+        parser.add_argument("--keep", action="store_true", help="ไม่ลบข้อมูลที่ seed ไว้")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"มี user {PREFIX}* ค้างอยู่ (รันครั้งก่อนใช้ --keep?) ลบก่อนแล้วรันใหม่")
+
+        now = timezone.now()
+
+        # engine จะส่งทุกรายการที่ถึงเวลา -> ห้ามมีของจริงที่จะถึงเวลาในเร็ว ๆ นี้
+        if (
+            Notification.objects
+            .filter(status="pending", next_fire_at__lte=now + timedelta(days=1))
+            .exclude(user__username__startswith=PREFIX)
+            .exists()
+        ):
+            raise CommandError("มี notification จริงรอส่งอยู่ใน DB นี้ -- รัน benchmark กับ DB ทดสอบเท่านั้น")
+
+        random.seed(options["seed"])
+
+        try:
+            seed_started = time.perf_counter()
+            self._seed(options, now)
+            seed_seconds = time.perf_counter() - seed_started
+            self.stdout.write(
+                f"seeded {options['users']} users / {options['notifications']} notifications "
+                f"in {seed_seconds:.1f}s"
+            )
+
+            report = {
+                "params": {k: options[k] for k in (
+                    "users", "notifications", "recurring_ratio", "due_ratio",
+                    "workers", "ticks", "latency_ms", "failure_rate", "seed",
+                )},
+                "env": {
+                    "db_vendor": connection.vendor,
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "dispatch_workers": options["workers"] or engine.DISPATCH_WORKERS,
+                    "due_batch_size": engine.DUE_BATCH_SIZE,
+                    "coalesce": engine.COALESCE,
+                },
+                "seed_seconds": round(seed_seconds, 3),
+                "build_due_items": self._bench_build(now),
+                "process_notifications": self._bench_process(options),
+            }
+        finally:
+            if not options["keep"]:
+                self._cleanup()
+
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+
+        self._print(report)
+        self.stdout.write(f"written: {options['output']}")
+
+    # ===== seed =====
+
+    def _seed(self, options, now):
+        users = [
+            User(
+                username=f"{PREFIX}{i}",
+                telegram_chat_id=str(9_000_000_000 + i),
+                department=random.choice(User.DEPARTMENT_CHOICES)[0],
+            )
+            for i in range(options["users"])
+        ]
+        User.objects.bulk_create(users, batch_size=SEED_CHUNK)
+        user_ids = list(User.objects.filter(username__startswith=PREFIX).values_list("id", flat=True))
+
+        units = ["minute", "hour", "day", "month"]
+        remaining = options["notifications"]
+        seq = 0
+
+        while remaining > 0:
+            batch = []
+            for _ in range(min(SEED_CHUNK, remaining)):
+                due = random.random() < options["due_ratio"]
+                # ถึงเวลาแล้ว: ย้อนหลังไม่เกิน 1 ชม. / ยังไม่ถึง: ภายใน 30 วัน
+                offset = -random.uniform(0, 3600) if due else random.uniform(60, 30 * 86400)
+                at = now + timedelta(seconds=offset)
+
+                n = Notification(
+                    user_id=random.choice(user_ids),
+                    title=f"{PREFIX}{seq}",
+                    description="benchmark",
+                    status="pending",
+                )
+                if random.random() < options["recurring_ratio"]:
+                    n.event_type = "recurring"
+                    n.start_datetime = at
+                    n.interval_value = random.randint(1, 12)
+                    n.interval_unit = random.choice(units)
+                else:
+                    n.event_type = "one_time"
+                    n.event_datetime = at
+
+                n.next_fire_at = engine.compute_next_fire_at(n)
+                batch.append(n)
+                seq += 1
+
+            Notification.objects.bulk_create(batch, batch_size=SEED_CHUNK)
+            remaining -= len(batch)
+
+    def _cleanup(self):
+        ids = list(
+            Notification.objects
+            .filter(user__username__startswith=PREFIX)
+            .values_list("id", flat=True)
+        )
+        for i in range(0, len(ids), SEED_CHUNK):
+            chunk = ids[i:i + SEED_CHUNK]
+            NotificationDelivery.objects.filter(notification_id__in=chunk).delete()
+            Notification.objects.filter(id__in=chunk).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+        # engine นับ success/failure ของข้อมูล benchmark ลง notification_stats ไปแล้ว
+        stats.recompute()
+
+    # ===== benchmarks =====
+
+    def _bench_build(self, now):
+        counter = QueryCounter()
+        timings = []
+
+        with counter.patch():
+            for _ in range(5):
+                started = time.perf_counter()
+                items = engine.build_due_items(now=now)
+                timings.append(time.perf_counter() - started)
+
+        qs = (
+            Notification.objects
+            .filter(status="pending", next_fire_at__lte=now, sending_event_at__isnull=True)
+            .order_by("next_fire_at")[:engine.DUE_BATCH_SIZE]
+        )
+
+        return {
+            "runs": len(timings),
+            "rows_fetched": len(items),
+            "queries_per_run": counter.count / len(timings),
+            "p50_ms": round(statistics.median(timings) * 1000, 3),
+            "max_ms": round(max(timings) * 1000, 3),
+            "query_plan": qs.explain(),
+        }
+
+    def _bench_process(self, options):
+        latency = options["latency_ms"] / 1000
+        failure_rate = options["failure_rate"]
+        item_latencies = []
+        lock = threading.Lock()
+
+        def stub_send(notification, chat_id=None):
+            if latency:
+                time.sleep(latency)
+            chat_id = chat_id or notification.user.telegram_chat_id
+            return SendResult(ok=random.random() >= failure_rate, chat_id=chat_id, latency_ms=latency * 1000)
+
+        def stub_message(chat_id, text):
+            if latency:
+                time.sleep(latency)
+            return SendResult(ok=random.random() >= failure_rate, chat_id=chat_id, latency_ms=latency * 1000)
+
+        process_job = engine.process_job
+
+        def timed_job(job, batch=None):
+            started = time.perf_counter()
+            outcomes = process_job(job, batch)
+            elapsed = time.perf_counter() - started
+            with lock:
+                # digest: เวลาเฉลี่ยต่อรายการ
+                item_latencies.extend([elapsed / len(outcomes)] * len(outcomes))
+            return outcomes
+
+        counter = QueryCounter()
+        ticks = []
+        tracemalloc.start()
+
+        started = time.perf_counter()
+        with counter.patch(), \
+                mock.patch.object(engine, "send_notification", stub_send), \
+                mock.patch.object(engine, "send_message", stub_message), \
+                mock.patch.object(engine, "process_job", timed_job):
+            while True:
+                stats = engine.process_notifications(workers=options["workers"])
+                ticks.append(stats)
+                if not stats.due or (options["ticks"] and len(ticks) >= options["ticks"]):
+                    break
+        wall = time.perf_counter() - started
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        processed = sum(s.success + s.failure + s.deferred for s in ticks)
+        lat = sorted(item_latencies) or [0.0]
+
+        return {
+            "ticks": len(ticks),
+            "items": processed,
+            "success": sum(s.success for s in ticks),
+            "failure": sum(s.failure for s in ticks),
+            "deferred": sum(s.deferred for s in ticks),
+            "skipped": sum(s.skipped for s in ticks),
+            "wall_seconds": round(wall, 3),
+            "items_per_second": round(processed / wall, 1) if wall else 0,
+            "queries": counter.count,
+            "queries_per_item": round(counter.count / processed, 3) if processed else None,
+            "item_p50_ms": round(lat[len(lat) // 2] * 1000, 3),
+            "item_p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 3),
+            "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        }
+
+    def _print(self, report):
+        build = report["build_due_items"]
+        proc = report["process_notifications"]
+        self.stdout.write(
+            f"build_due_items      rows={build['rows_fetched']} queries={build['queries_per_run']:g} "
+            f"p50={build['p50_ms']}ms max={build['max_ms']}ms"
+        )
+        self.stdout.write(f"  plan: {build['query_plan']}")
+        self.stdout.write(
+            f"process_notifications items={proc['items']} ticks={proc['ticks']} "
+            f"{proc['items_per_second']} items/s queries={proc['queries']} "
+            f"({proc['queries_per_item']}/item) p50={proc['item_p50_ms']}ms p99={proc['item_p99_ms']}ms "
+            f"peak_mem={proc['peak_memory_mb']}MB"
+        )
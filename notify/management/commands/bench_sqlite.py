@@ -0,0 +1,203 @@
+# notify/management/commands/bench_sqlite.py
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from notify.services.db_retry import is_lock_error, retry_on_lock
+
+SCHEMA = """
+CREATE TABLE bench_notification (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    next_fire_at REAL,
+    sending INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX bench_notification_due ON bench_notification (status, next_fire_at);
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark SQLite: web (insert) + engine (claim/update) + reader พร้อมกัน "
+        "เทียบ Django default กับ SQLITE_PRODUCTION (WAL, busy_timeout, IMMEDIATE, persistent connection) "
+        "-- ใช้ไฟล์ DB ชั่วคราว ไม่แตะ DB จริง"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5.0, help="เวลาที่รันต่อ profile")
+        parser.add_argument("--web-writers", type=int, default=2)
+        parser.add_argument("--engine-writers", type=int, default=2)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--rows", type=int, default=20_000, help="จำนวนแถวตั้งต้น")
+        parser.add_argument("--claim-size", type=int, default=50, help="แถวต่อ 1 transaction ของ engine")
+        parser.add_argument("--output", default="bench_sqlite.json")
+
+    def handle(self, *args, **options):
+        profiles = [
+            ("default", {}, False),
+            ("production", settings.SQLITE_PRODUCTION, False),
+            ("production+retry", settings.SQLITE_PRODUCTION, True),
+        ]
+
+        report = {
+            "params": {k: options[k] for k in (
+                "seconds", "web_writers", "engine_writers", "readers", "rows", "claim_size",
+            )},
+            "pragmas": settings.SQLITE_PRAGMAS,
+            "profiles": {},
+        }
+
+        with tempfile.TemporaryDirectory(prefix="bench_sqlite_") as tmp:
+            for name, profile, retry in profiles:
+                path = os.path.join(tmp, f"{name}.sqlite3")
+                alias = f"bench_{name}"
+                self._configure(alias, path, profile)
+                try:
+                    result = self._run(alias, options, retry)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+                report["profiles"][name] = result
+                self._print(name, result)
+
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"written: {options['output']}")
+
+    # ===== setup =====
+
+    def _configure(self, alias, path, profile):
+        config = {"ENGINE": "django.db.backends.sqlite3", "NAME": path, **profile}
+        # configure_settings เติมค่า default (AUTOCOMMIT, TIME_ZONE, ...) เหมือน DATABASES ปกติ
+        connections.settings[alias] = connections.configure_settings({"default": config})["default"]
+
+    def _seed(self, alias, rows):
+        conn = connections[alias]
+        with conn.cursor() as cursor:
+            cursor.executescript(SCHEMA)
+        now = time.time()
+        with transaction.atomic(using=alias), conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO bench_notification (title, status, next_fire_at) VALUES (%s, %s, %s)",
+                [(f"seed {i}", "pending", now - 60 + i % 120) for i in range(rows)],
+            )
+        conn.close()
+
+    # ===== workload =====
+
+    def _run(self, alias, options, retry):
+        self._seed(alias, options["rows"])
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        counts = {"web_writes": 0, "engine_writes": 0, "reads": 0, "lock_errors": 0}
+        latencies = {"web_writes": [], "engine_writes": [], "reads": []}
+
+        def web_write(cursor):
+            # create_notification: INSERT 1 แถว
+            cursor.execute(
+                "INSERT INTO bench_notification (title, status, next_fire_at) VALUES (%s, %s, %s)",
+                ("web", "pending", time.time() + 3600),
+            )
+
+        def engine_write(cursor):
+            # claim: อ่านรายการที่ถึงเวลา แล้ว UPDATE ใน transaction เดียว (read -> write upgrade)
+            cursor.execute(
+                "SELECT id FROM bench_notification WHERE status = %s AND next_fire_at <= %s "
+                "AND sending = 0 ORDER BY next_fire_at LIMIT %s",
+                ("pending", time.time(), options["claim_size"]),
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if ids:
+                cursor.execute(
+                    f"UPDATE bench_notification SET next_fire_at = next_fire_at + 60 "
+                    f"WHERE id IN ({','.join(['%s'] * len(ids))})",
+                    ids,
+                )
+
+        def read(cursor):
+            # dashboard: นับ + หน้าแรก
+            cursor.execute("SELECT COUNT(*) FROM bench_notification WHERE status = %s", ("pending",))
+            cursor.fetchone()
+            cursor.execute("SELECT id, title FROM bench_notification ORDER BY id DESC LIMIT 20")
+            cursor.fetchall()
+
+        def in_transaction(op):
+            def run():
+                with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                    op(cursor)
+            return run
+
+        def autocommit(op):
+            # view ที่อ่านอย่างเดียวไม่เปิด transaction (IMMEDIATE จะจอง write lock ทั้งที่ไม่ได้เขียน)
+            def run():
+                with connections[alias].cursor() as cursor:
+                    op(cursor)
+            return run
+
+        def loop(kind, op):
+            conn = connections[alias]
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    op()
+                except OperationalError as e:
+                    if not is_lock_error(e):
+                        raise
+                    with lock:
+                        counts["lock_errors"] += 1
+                else:
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        counts[kind] += 1
+                        latencies[kind].append(elapsed)
+                finally:
+                    # เหมือนจบ request: CONN_MAX_AGE=0 -> ปิด connection, มีอายุ -> ใช้ต่อ
+                    conn.close_if_unusable_or_obsolete()
+            conn.close()
+
+        engine_op = in_transaction(engine_write)
+        if retry:
+            engine_op = retry_on_lock(engine_op)
+
+        workers = (
+            [("web_writes", in_transaction(web_write))] * options["web_writers"]
+            + [("engine_writes", engine_op)] * options["engine_writers"]
+            + [("reads", autocommit(read))] * options["readers"]
+        )
+        threads = [threading.Thread(target=loop, args=w, daemon=True) for w in workers]
+
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+
+        result = {"wall_seconds": round(wall, 3), "lock_errors": counts["lock_errors"]}
+        for kind, values in latencies.items():
+            values.sort()
+            result[kind] = {
+                "ops": counts[kind],
+                "ops_per_second": round(counts[kind] / wall, 1),
+                "p50_ms": round(values[len(values) // 2] * 1000, 3) if values else None,
+                "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))] * 1000, 3) if values else None,
+            }
+        return result
+
+    def _print(self, name, result):
+        parts = [
+            f"{kind}={result[kind]['ops_per_second']}/s (p99 {result[kind]['p99_ms']}ms)"
+            for kind in ("web_writes", "engine_writes", "reads")
+        ]
+        self.stdout.write(f"{name:<18} {'  '.join(parts)}  lock_errors={result['lock_errors']}")
@@ -0,0 +1,77 @@
+# notify/management/commands/bench_telegram_sender.py
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from notify.services.fake_telegram import FakeTelegramConfig, FakeTelegramServer
+from notify.services.telegram_sender import NO_PROXIES, build_session
+
+
+class Command(BaseCommand):
+    help = "Benchmark: requests.post ทีละครั้ง vs Session ที่มี connection pool (ยิงไป HTTP server จำลองในเครื่อง)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--delay-ms", type=float, default=0.0, help="latency จำลองของ server ต่อ request")
+
+    def handle(self, *args, **options):
+        total = options["requests"]
+        concurrency = options["concurrency"]
+
+        server = FakeTelegramServer(("127.0.0.1", 0), FakeTelegramConfig(latency=f"fixed:{options['delay_ms']}"))
+        server.start()
+
+        url = f"{server.url}/botTEST/sendMessage"
+        payload = {"chat_id": "1", "text": "benchmark"}
+
+        def bare_post():
+            return requests.post(url, json=payload, timeout=10, proxies=NO_PROXIES)
+
+        session = build_session(pool_size=max(10, concurrency))
+
+        def pooled_post():
+            return session.post(url, json=payload, timeout=10, proxies=NO_PROXIES)
+
+        try:
+            self.stdout.write(f"stand-in: {url}  requests={total}  concurrency={concurrency}")
+            for name, fn in (("bare requests.post", bare_post), ("pooled session", pooled_post)):
+                self._report(name, self._run(fn, total, concurrency), total)
+        finally:
+            session.close()
+            server.shutdown()
+
+    def _run(self, fn, total, concurrency):
+        latencies = []
+
+        def one(_):
+            started = time.perf_counter()
+            fn().raise_for_status()
+            return time.perf_counter() - started
+
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                latencies = list(executor.map(one, range(total)))
+        else:
+            latencies = [one(i) for i in range(total)]
+
+        return {
+            "wall": time.perf_counter() - wall_started,
+            "cpu": time.process_time() - cpu_started,
+            "latencies": sorted(latencies),
+        }
+
+    def _report(self, name, result, total):
+        lat = result["latencies"]
+        p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+        self.stdout.write(
+            f"{name:<20} {total / result['wall']:8.1f} req/s  "
+            f"p50={statistics.median(lat) * 1000:6.2f}ms  p99={p99 * 1000:6.2f}ms  "
+            f"cpu/req={result['cpu'] / total * 1000:6.3f}ms"
+        )
@@ -0,0 +1,41 @@
+# notify/management/commands/prune_deliveries.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notify.models import NotificationDelivery
+
+
+class Command(BaseCommand):
+    help = "ลบประวัติการส่ง (NotificationDelivery) ที่เก่ากว่า --days วัน ทีละ batch (ใส่ cron วันละครั้ง)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int,
+            default=getattr(settings, "NOTIFY_DELIVERY_RETENTION_DAYS", 30),
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        qs = NotificationDelivery.objects.filter(sent_at__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{qs.count()} deliveries older than {cutoff:%Y-%m-%d %H:%M} would be deleted")
+            return
+
+        # ลบทีละ batch (ใช้ index sent_at) -> ไม่ล็อกตารางนาน
+        deleted = 0
+        while True:
+            ids = list(qs.order_by("sent_at").values_list("id", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+            count, _ = NotificationDelivery.objects.filter(id__in=ids).delete()
+            deleted += count
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} deliveries older than {cutoff:%Y-%m-%d %H:%M}"
+        ))
@@ -0,0 +1,21 @@
+# notify/management/commands/recompute_notification_stats.py
+from django.core.management.base import BaseCommand
+
+from notify.services import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "นับ notification_stats ใหม่ทั้งหมดจากตาราง notifications (แก้ค่าที่เพี้ยน) -- "
+        "engine ทำให้อัตโนมัติทุก NOTIFY_STATS_RECOMPUTE_SECONDS อยู่แล้ว ใช้ตอนต้องการทันที / ใส่ cron"
+    )
+
+    def handle(self, *args, **options):
+        counts = stats.recompute()
+        if counts is None:
+            self.stdout.write(self.style.WARNING("Stats changed while counting, nothing written -- run again"))
+            return
+
+        for (dimension, value), count in sorted(counts.items()):
+            self.stdout.write(f"{dimension:<12} {value or '-':<12} {count}")
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {len(counts)} stat rows"))
@@ -0,0 +1,59 @@
+# notify/management/commands/run_fake_telegram.py
+from django.core.management.base import BaseCommand, CommandError
+
+from notify.services.fake_telegram import FakeTelegramConfig, FakeTelegramServer, parse_latency
+
+
+class Command(BaseCommand):
+    help = (
+        "Fake Telegram Bot API สำหรับ load / chaos test (ไม่ยิง Telegram จริง) -- "
+        "ตั้ง TELEGRAM_API_BASE_URL=http://<host>:<port> ให้ worker ชี้มาที่นี่"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument(
+            "--latency", default="0",
+            help="ms: 20 | uniform:10-50 | exp:20 | lognormal:20,0.5",
+        )
+        parser.add_argument("--rate-429", type=float, default=0.0, help="สัดส่วน 429 แบบสุ่ม (0-1)")
+        parser.add_argument("--retry-after", type=int, default=1)
+        parser.add_argument("--rate-5xx", type=float, default=0.0, help="สัดส่วน 502 (0-1)")
+        parser.add_argument("--rate-timeout", type=float, default=0.0, help="สัดส่วน request ที่ค้าง (0-1)")
+        parser.add_argument("--timeout-seconds", type=float, default=30.0)
+        parser.add_argument("--chat-rate", type=float, default=0.0, help="msg/s ต่อ chat ก่อนตอบ 429 (0 = ไม่จำกัด)")
+        parser.add_argument("--chat-burst", type=float, default=3.0)
+        parser.add_argument("--global-rate", type=float, default=0.0, help="msg/s ทั้ง bot ก่อนตอบ 429 (0 = ไม่จำกัด)")
+
+    def handle(self, *args, **options):
+        try:
+            parse_latency(options["latency"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["rate_429"] + options["rate_5xx"] + options["rate_timeout"] > 1:
+            raise CommandError("--rate-429 + --rate-5xx + --rate-timeout ต้องไม่เกิน 1")
+
+        config = FakeTelegramConfig(
+            latency=options["latency"],
+            rate_429=options["rate_429"],
+            retry_after=options["retry_after"],
+            rate_5xx=options["rate_5xx"],
+            rate_timeout=options["rate_timeout"],
+            timeout_seconds=options["timeout_seconds"],
+            chat_rate=options["chat_rate"],
+            chat_burst=options["chat_burst"],
+            global_rate=options["global_rate"],
+        )
+        server = FakeTelegramServer((options["host"], options["port"]), config)
+
+        self.stdout.write(f"fake Telegram Bot API: {server.url}  (stats: {server.url}/stats)")
+        self.stdout.write(f"  TELEGRAM_API_BASE_URL={server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"stats: {server.stats.snapshot()}")
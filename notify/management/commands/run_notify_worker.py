@@ -0,0 +1,200 @@
+# notify/management/commands/run_notify_worker.py
+import json
+import logging
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from notify import scheduler as notify_scheduler
+from notify.services import metrics
+from notify.services.notification_engine import (
+    DUE_BATCH_SIZE,
+    get_worker_id,
+    process_notifications,
+    recover_expired_leases,
+    shutdown_dispatch_executor,
+)
+
+logger = logging.getLogger("notify.worker")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        # เหมือน /metrics ของ web: ต้องมี Authorization: Bearer <NOTIFY_METRICS_TOKEN>
+        token = getattr(settings, "NOTIFY_METRICS_TOKEN", "")
+        if not metrics.bearer_token_matches(self.headers.get("Authorization", ""), token):
+            self.send_error(403)
+            return
+
+        body = metrics.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "รัน notification engine แยกจาก web process (SIGTERM = ส่งงานที่ค้างให้เสร็จแล้วปิด)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="จำนวนรายการที่ส่งพร้อมกัน (default: NOTIFY_DISPATCH_WORKERS)",
+        )
+        parser.add_argument(
+            "--mode", choices=["interval", "timer"], default=notify_scheduler.SCHEDULER_MODE,
+            help="interval = poll ทุก --poll-seconds / timer = รอจนถึงเวลาส่งพอดี",
+        )
+        parser.add_argument("--poll-seconds", type=float, default=notify_scheduler.POLL_SECONDS)
+        parser.add_argument("--heartbeat-seconds", type=float, default=30)
+        parser.add_argument(
+            "--heartbeat-file", default=None,
+            help="เขียนสถานะล่าสุดเป็น JSON (ใช้ทำ liveness probe; "
+                 "timer mode loop_idle ยาวได้ถึง NOTIFY_WATCH_SECONDS หรือ NOTIFY_RECONCILE_SECONDS ถ้าปิด watch)",
+        )
+        parser.add_argument(
+            "--metrics-port", type=int, default=None,
+            help="เปิด /metrics ของ worker process นี้ (Prometheus text format) ที่ port นี้ "
+                 "(ต้องส่ง Authorization: Bearer <NOTIFY_METRICS_TOKEN>)",
+        )
+        parser.add_argument("--metrics-host", default="127.0.0.1")
+
+    def handle(self, *args, **options):
+        self.worker_id = get_worker_id()
+        self.stop_event = threading.Event()
+        self.ticks = 0
+        self.last_stats = None
+        self.last_loop_at = time.monotonic()
+        self.timer = None
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop,
+            args=(options["heartbeat_seconds"], options["heartbeat_file"]),
+            name="notify-heartbeat",
+            daemon=True,
+        )
+        heartbeat.start()
+
+        if options["metrics_port"]:
+            self._serve_metrics(options["metrics_host"], options["metrics_port"])
+
+        logger.info(
+            "worker %s started", self.worker_id,
+            extra={"worker": self.worker_id, "mode": options["mode"], "workers": options["workers"] or "default"},
+        )
+
+        try:
+            if options["mode"] == "timer":
+                self._run_timer(options["workers"])
+            else:
+                self._run_interval(options["workers"], options["poll_seconds"])
+        finally:
+            # งานที่อยู่ใน pool ส่งให้เสร็จก่อนปิด
+            shutdown_dispatch_executor()
+            self._write_heartbeat(options["heartbeat_file"], state="stopped")
+            logger.info("worker %s stopped", self.worker_id, extra={"worker": self.worker_id, "ticks": self.ticks})
+
+    # ===== loops =====
+
+    def _run_interval(self, workers, poll_seconds):
+        while not self.stop_event.is_set():
+            self.last_loop_at = time.monotonic()
+            close_old_connections()
+
+            try:
+                stats = process_notifications(workers=workers)
+                self.ticks += 1
+                self.last_stats = stats
+            except Exception:
+                logger.exception("tick failed", extra={"worker": self.worker_id})
+                stats = None
+
+            # ยังมีค้างเกิน batch -> ไม่ต้องรอ
+            if stats and stats.due >= DUE_BATCH_SIZE:
+                continue
+
+            self.stop_event.wait(poll_seconds)
+
+    def _run_timer(self, workers):
+        recover_expired_leases()
+        self.timer = notify_scheduler.TimerScheduler(workers=workers)
+
+        if self.stop_event.is_set():
+            return
+        self.timer.run()
+
+    # ===== metrics =====
+
+    def _serve_metrics(self, host, port):
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="notify-metrics", daemon=True).start()
+        logger.info("metrics on http://%s:%s/metrics", host, server.server_address[1])
+
+    # ===== signal / heartbeat =====
+
+    def _request_stop(self, signum, frame):
+        if self.stop_event.is_set():
+            return
+
+        logger.info("signal %s received -> draining in-flight sends", signum, extra={"worker": self.worker_id})
+        self.stop_event.set()
+        if self.timer is not None:
+            self.timer.stop()
+
+    def _heartbeat_loop(self, interval, path):
+        while not self.stop_event.wait(interval):
+            if self.timer is not None:
+                self.last_loop_at = self.timer.last_loop_at
+                self.ticks = self.timer.ticks
+                self.last_stats = self.timer.last_stats
+
+            idle = time.monotonic() - self.last_loop_at
+            stats = self.last_stats
+            logger.info(
+                "heartbeat",
+                extra={
+                    "worker": self.worker_id,
+                    "ticks": self.ticks,
+                    "loop_idle_s": round(idle),
+                    "last_tick_due": stats.due if stats else None,
+                    "last_tick_s": round(stats.duration, 2) if stats else None,
+                },
+            )
+            self._write_heartbeat(path, state="running")
+
+    def _write_heartbeat(self, path, state):
+        if not path:
+            return
+
+        payload = {
+            "worker_id": self.worker_id,
+            "state": state,
+            "at": timezone.now().isoformat(),
+            "ticks": self.ticks,
+            "loop_idle_seconds": round(time.monotonic() - self.last_loop_at, 1),
+        }
+
+        # เขียนไฟล์ชั่วคราวแล้ว rename -> probe ไม่เจอไฟล์ครึ่ง ๆ
+        target = Path(path)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_text(json.dumps(payload))
+        tmp.replace(target)
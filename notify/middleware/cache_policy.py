@@ -0,0 +1,76 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import parse_http_date_safe
+
+# ชื่อไฟล์ที่ ManifestStaticFilesStorage เติม hash ของเนื้อไฟล์ (เช่น css/base.1a2b3c4d5e6f.css)
+# -> เนื้อหาไม่มีวันเปลี่ยน cache ได้ตลอด
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# static ที่ไม่มี hash (DEBUG / ไม่ได้ collectstatic) -> cache สั้น ๆ แล้ว revalidate
+STATIC_MAX_AGE = getattr(settings, "NOTIFY_STATIC_MAX_AGE", 3600)
+
+
+class CachePolicyMiddleware:
+    """
+    Cache-Control แยกตามชนิดของ response (แทน NoCacheMiddleware ที่ใส่ no-store ทุกอย่าง)
+
+    - /static/ ที่มี hash ในชื่อ : public, max-age=1 ปี, immutable
+    - /static/ ไม่มี hash        : public, max-age=STATIC_MAX_AGE + ETag / Last-Modified
+    - /media/ (ไฟล์แนบ)         : private, no-cache + ETag / Last-Modified -> 304 ถ้าไม่เปลี่ยน
+    - อื่น ๆ (HTML หลัง login ฯลฯ) : no-store เหมือนเดิม (ยกเว้น view ตั้ง Cache-Control เอง)
+
+    หมายเหตุ: runserver เสิร์ฟ /static/ ก่อนถึง middleware
+    production ให้ front-end (nginx) ตั้ง header เดียวกันนี้ให้ STATIC_ROOT
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_prefix = "/" + settings.STATIC_URL.lstrip("/")
+        self.media_prefix = "/" + settings.MEDIA_URL.lstrip("/")
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        path = request.path
+
+        if path.startswith(self.static_prefix):
+            if HASHED_NAME.search(path):
+                patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+                return response
+            patch_cache_control(response, public=True, max_age=STATIC_MAX_AGE)
+            return self._conditional(request, response)
+
+        if path.startswith(self.media_prefix):
+            # ไฟล์ของ user -> browser เก็บได้ แต่ต้องถาม server ทุกครั้ง (ไม่ให้ proxy กลางทางเก็บ)
+            patch_cache_control(response, private=True, no_cache=True)
+            return self._conditional(request, response)
+
+        if not response.has_header("Cache-Control"):
+            add_never_cache_headers(response)
+            patch_cache_control(response, no_store=True)
+        response["Pragma"] = "no-cache"
+        response["Expires"] = "0"
+        return response
+
+    def _conditional(self, request, response):
+        """
+        ETag (weak) จากขนาด + เวลาแก้ไข -> ไม่ต้องอ่านเนื้อไฟล์ (FileResponse เป็น streaming)
+        แล้วตอบ 304 ถ้า If-None-Match / If-Modified-Since ตรง
+        """
+        if request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+
+        last_modified = parse_http_date_safe(response.get("Last-Modified", ""))
+
+        if not response.has_header("ETag") and last_modified and response.has_header("Content-Length"):
+            response["ETag"] = f'W/"{int(response["Content-Length"]):x}-{last_modified:x}"'
+
+        return get_conditional_response(
+            request,
+            etag=response.get("ETag"),
+            last_modified=last_modified,
+            response=response,
+        )
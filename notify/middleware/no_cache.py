@@ -1,18 +0,0 @@
-class NoCacheMiddleware:
-    """
-    ป้องกัน browser cache หน้า login / dashboard
-    """
-
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        response = self.get_response(request)
-
-        response['Cache-Control'] = (
-            'no-store, no-cache, must-revalidate, max-age=0'
-        )
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
-
-        return response
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-17 20:11
+
+from django.db import migrations, models
+
+
+def backfill_next_fire_at(apps, schema_editor):
+    """
+    เติม next_fire_at ให้ notification เดิม (logic เดียวกับ engine.compute_next_fire_at)
+    """
+    Notification = apps.get_model('notify', 'Notification')
+
+    batch = []
+    qs = Notification.objects.filter(status='pending').only(
+        'id', 'event_type', 'event_datetime', 'start_datetime', 'last_sent_event_at',
+    )
+
+    for n in qs.iterator(chunk_size=2000):
+        event_at = n.event_datetime if n.event_type == 'one_time' else n.start_datetime
+        if not event_at or n.last_sent_event_at == event_at:
+            continue
+
+        n.next_fire_at = event_at
+        batch.append(n)
+
+        if len(batch) >= 2000:
+            Notification.objects.bulk_update(batch, ['next_fire_at'])
+            batch = []
+
+    if batch:
+        Notification.objects.bulk_update(batch, ['next_fire_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0006_alter_user_department'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='next_fire_at',
+            field=models.DateTimeField(blank=True, help_text='เวลาที่ต้องส่งรอบถัดไป (denormalized จาก event/start datetime, None = ไม่ต้องส่งแล้ว)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', 'next_fire_at'], name='notif_status_next_fire_idx'),
+        ),
+        migrations.RunPython(backfill_next_fire_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0007_notification_next_fire_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='sending_event_at',
+            field=models.DateTimeField(blank=True, help_text='รอบ (event_at) ที่ engine claim ไปส่งแล้วแต่ยังไม่บันทึกผล', null=True),
+        ),
+    ]
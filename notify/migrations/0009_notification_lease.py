@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 20:18
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def expire_inflight_claims(apps, schema_editor):
+    """
+    แถวที่ค้าง sending_event_at จากก่อนมี lease -> ให้ lease หมดอายุทันที
+    (engine จะเก็บกวาดด้วย recover_expired_leases)
+    """
+    Notification = apps.get_model('notify', 'Notification')
+    Notification.objects.filter(sending_event_at__isnull=False).update(lease_expires_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0008_notification_sending_event_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, help_text='lease หมดอายุเมื่อไร (worker ตาย -> worker อื่นเก็บกวาดต่อ)', null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='lease_owner',
+            field=models.CharField(blank=True, help_text='engine worker ที่ถือสิทธิ์ส่งรอบนี้อยู่', max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['lease_expires_at'], name='notif_lease_expiry_idx'),
+        ),
+        migrations.RunPython(expire_inflight_claims, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-17 20:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0009_notification_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('event_at', models.DateTimeField(help_text='รอบที่ตั้งเวลาไว้ (scheduled time)')),
+                ('attempt', models.PositiveSmallIntegerField(default=1)),
+                ('outcome', models.CharField(choices=[('success', 'Success'), ('failure', 'Failure'), ('deferred', 'Deferred'), ('recovered', 'Recovered')], max_length=10)),
+                ('sent_at', models.DateTimeField()),
+                ('http_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('telegram_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, default='', max_length=100)),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='notify.notification')),
+            ],
+            options={
+                'db_table': 'notification_deliveries',
+                'indexes': [models.Index(fields=['sent_at'], name='delivery_sent_at_idx'), models.Index(fields=['notification', 'event_at'], name='delivery_notif_event_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 20:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('notify', '0010_notificationdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='target_department',
+            field=models.CharField(blank=True, choices=[('UN', 'Unassigned (ต้องแก้ไข)'), ('FO', 'Front Office'), ('RS', 'Reservations'), ('EO', 'Executive Office'), ('FI', 'Finance'), ('SM', 'Sales Marketing'), ('RV', 'Revenue'), ('FB', 'Food & Beverage'), ('KC', 'Kitchen'), ('EN', 'Engineering'), ('HR', 'Human Resource'), ('HK', 'House Keeping')], max_length=2, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='auth.group'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_type',
+            field=models.CharField(choices=[('user', 'Only Me'), ('department', 'Department'), ('group', 'User Group'), ('all', 'Everyone')], default='user', help_text='ส่งถึงใคร: ตัวเอง / ทั้งแผนก / กลุ่มผู้ใช้ / ทุกคน', max_length=10),
+        ),
+    ]
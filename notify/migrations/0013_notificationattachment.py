@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-17 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_files_to_attachments(apps, schema_editor):
+    """
+    Notification.file (ไฟล์เดียว) -> NotificationAttachment
+    """
+    Notification = apps.get_model('notify', 'Notification')
+    NotificationAttachment = apps.get_model('notify', 'NotificationAttachment')
+
+    batch = []
+    qs = Notification.objects.exclude(file__isnull=True).exclude(file='').only('id', 'file')
+
+    for n in qs.iterator(chunk_size=2000):
+        batch.append(NotificationAttachment(notification_id=n.id, file=n.file, position=0))
+
+        if len(batch) >= 2000:
+            NotificationAttachment.objects.bulk_create(batch)
+            batch = []
+
+    if batch:
+        NotificationAttachment.objects.bulk_create(batch)
+
+
+def copy_first_attachment_back(apps, schema_editor):
+    Notification = apps.get_model('notify', 'Notification')
+    NotificationAttachment = apps.get_model('notify', 'NotificationAttachment')
+
+    for a in NotificationAttachment.objects.order_by('-position', '-id').iterator(chunk_size=2000):
+        Notification.objects.filter(id=a.notification_id).update(file=a.file)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0012_telegramfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.TextField()),
+                ('original_name', models.CharField(blank=True, default='', max_length=255)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='notify.notification')),
+            ],
+            options={
+                'db_table': 'notification_attachments',
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.RunPython(copy_files_to_attachments, copy_first_attachment_back),
+        migrations.RemoveField(
+            model_name='notification',
+            name='file',
+        ),
+    ]
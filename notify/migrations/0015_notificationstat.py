@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-17 20:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_stats(apps, schema_editor):
+    """
+    นับครั้งแรกจาก notifications ที่มีอยู่แล้ว
+    """
+    Notification = apps.get_model('notify', 'Notification')
+    NotificationStat = apps.get_model('notify', 'NotificationStat')
+
+    fields = {'status': 'status', 'department': 'user__department', 'event_type': 'event_type'}
+    rows = []
+    for dimension, field in fields.items():
+        for value, count in Notification.objects.order_by().values_list(field).annotate(count=Count('id')):
+            rows.append(NotificationStat(dimension=dimension, value=value or '', count=count))
+
+    NotificationStat.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0014_dashboard_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('status', 'Status'), ('department', 'Department'), ('event_type', 'Event Type')], max_length=20)),
+                ('value', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'notification_stats',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'value'), name='notification_stat_dim_value_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
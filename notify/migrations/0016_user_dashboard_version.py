@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0015_notificationstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='dashboard_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Dashboard fragment cache version'),
+        ),
+    ]
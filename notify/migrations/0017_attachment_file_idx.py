@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-17 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0016_user_dashboard_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificationattachment',
+            index=models.Index(fields=['file'], name='attachment_file_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-17 20:56
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_inflight_started(apps, schema_editor):
+    """
+    แถวที่ถูก claim อยู่ก่อนมี field นี้ -> ไม่รู้ว่าเริ่มส่งไปหรือยัง
+    ถือว่าเริ่มแล้ว (recover_expired_leases จะไม่ส่งซ้ำ เหมือนพฤติกรรมเดิม)
+    """
+    Notification = apps.get_model('notify', 'Notification')
+    Notification.objects.filter(sending_event_at__isnull=False).update(send_started_at=F('sending_event_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notify', '0017_attachment_file_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='send_started_at',
+            field=models.DateTimeField(blank=True, help_text='เวลาที่เริ่มยิง Telegram ของรอบที่ claim ไว้ (None = claim แล้วแต่ยังไม่ได้เริ่มส่ง)', null=True),
+        ),
+        migrations.RunPython(mark_inflight_started, migrations.RunPython.noop),
+    ]
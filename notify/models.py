@@ -1,5 +1,5 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, Group
 
 
 # =====================
@@ -43,8 +43,20 @@ class User(AbstractUser):
         help_text="User Department"
     )
 
+    # bump ทุกครั้งที่ notification ของ user นี้เปลี่ยน (views + engine)
+    # -> key ของ fragment cache ใน dashboard เปลี่ยนตาม ของเก่าไม่ถูกใช้อีก
+    dashboard_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Dashboard fragment cache version"
+    )
+
     class Meta:
         db_table = 'users'
+        indexes = [
+            # admin dashboard: keyset ORDER BY date_joined DESC, id DESC
+            models.Index(fields=['date_joined', 'id'], name='user_date_joined_idx'),
+        ]
 
     def __str__(self):
         return self.username
@@ -73,15 +85,44 @@ class Notification(models.Model):
     ('failure', 'Failure'),
     ]
 
+    TARGET_TYPE_CHOICES = [
+        ('user', 'Only Me'),
+        ('department', 'Department'),
+        ('group', 'User Group'),
+        ('all', 'Everyone'),
+    ]
+
+    # เจ้าของ notification (คนสร้าง) / ผู้รับเมื่อ target_type = user
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='notifications'
     )
 
+    target_type = models.CharField(
+        max_length=10,
+        choices=TARGET_TYPE_CHOICES,
+        default='user',
+        help_text="ส่งถึงใคร: ตัวเอง / ทั้งแผนก / กลุ่มผู้ใช้ / ทุกคน"
+    )
+
+    target_department = models.CharField(
+        max_length=2,
+        choices=User.DEPARTMENT_CHOICES,
+        null=True,
+        blank=True,
+    )
+
+    target_group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
+
     title = models.TextField()
     description = models.TextField(null=True, blank=True)
-    file = models.TextField(null=True, blank=True)
 
     event_type = models.CharField(
         max_length=10,
@@ -113,10 +154,205 @@ class Notification(models.Model):
 
     last_sent_event_at = models.DateTimeField(null=True, blank=True)
 
+    next_fire_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="เวลาที่ต้องส่งรอบถัดไป (denormalized จาก event/start datetime, None = ไม่ต้องส่งแล้ว)"
+    )
+
+    sending_event_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="รอบ (event_at) ที่ engine claim ไปส่งแล้วแต่ยังไม่บันทึกผล"
+    )
+
+    send_started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="เวลาที่เริ่มยิง Telegram ของรอบที่ claim ไว้ (None = claim แล้วแต่ยังไม่ได้เริ่มส่ง)"
+    )
+
+    lease_owner = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        help_text="engine worker ที่ถือสิทธิ์ส่งรอบนี้อยู่"
+    )
+
+    lease_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="lease หมดอายุเมื่อไร (worker ตาย -> worker อื่นเก็บกวาดต่อ)"
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'notifications'
+        indexes = [
+            # engine query: status='pending' AND next_fire_at <= now ORDER BY next_fire_at
+            models.Index(fields=['status', 'next_fire_at'], name='notif_status_next_fire_idx'),
+            # หา lease ที่หมดอายุ
+            models.Index(fields=['lease_expires_at'], name='notif_lease_expiry_idx'),
+            # dashboard (keyset): WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', 'created_at', 'id'], name='notif_user_created_idx'),
+            # admin dashboard (keyset): ORDER BY created_at DESC, id DESC
+            models.Index(fields=['created_at', 'id'], name='notif_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+# =====================
+# Notification Attachments
+# =====================
+class NotificationAttachment(models.Model):
+    """
+    ไฟล์แนบของ notification (ได้หลายไฟล์)
+    - ส่งรวมเป็น sendMediaGroup ครั้งละไม่เกิน 10 ไฟล์
+    """
+
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        related_name='attachments'
+    )
+
+    # relative path จาก MEDIA_ROOT
+    file = models.TextField()
+    original_name = models.CharField(max_length=255, blank=True, default="")
+    position = models.PositiveSmallIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'notification_attachments'
+        ordering = ['position', 'id']
+        indexes = [
+            # /media/<path>: หา attachment จาก path เพื่อตรวจเจ้าของ
+            models.Index(fields=['file'], name='attachment_file_idx'),
+        ]
+
+    @property
+    def name(self):
+        return self.original_name or self.file.rsplit('/', 1)[-1]
+
+    def __str__(self):
+        return self.file
+
+
+# =====================
+# Notification Delivery Log (append-only)
+# =====================
+
+class NotificationDelivery(models.Model):
+    """
+    ประวัติการส่ง 1 แถวต่อ 1 รอบ (event_at) ต่อ 1 ครั้งที่พยายามส่ง
+    - เขียนแบบ bulk insert ตอนจบ tick ไม่แก้ไขย้อนหลัง
+    - ลบของเก่าด้วย `python manage.py prune_deliveries`
+    """
+
+    OUTCOME_CHOICES = [
+        ('success', 'Success'),
+        ('failure', 'Failure'),
+        ('deferred', 'Deferred'),
+        ('recovered', 'Recovered'),
+    ]
+
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='deliveries'
+    )
+
+    chat_id = models.CharField(max_length=50, null=True, blank=True)
+
+    event_at = models.DateTimeField(help_text="รอบที่ตั้งเวลาไว้ (scheduled time)")
+    attempt = models.PositiveSmallIntegerField(default=1)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES)
+
+    sent_at = models.DateTimeField()
+    http_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    telegram_message_id = models.BigIntegerField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True, default="")
+
+    class Meta:
+        db_table = 'notification_deliveries'
+        indexes = [
+            models.Index(fields=['sent_at'], name='delivery_sent_at_idx'),
+            models.Index(fields=['notification', 'event_at'], name='delivery_notif_event_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_id}@{self.event_at} #{self.attempt} {self.outcome}"
+
+
+# =====================
+# Telegram file_id cache
+# =====================
+class TelegramFile(models.Model):
+    """
+    file_id ที่ Telegram คืนมาหลัง upload ครั้งแรก (key = sha256 ของเนื้อไฟล์)
+    - ส่งครั้งถัดไปใช้ file_id แทนการ upload ไฟล์ใหม่
+    - ไฟล์เนื้อหาเดียวกัน (แม้ชื่อต่างกัน) ใช้ file_id เดียวกัน
+    """
+
+    KIND_CHOICES = [
+        ('photo', 'Photo'),
+        ('document', 'Document'),
+    ]
+
+    sha256 = models.CharField(max_length=64)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    file_id = models.CharField(max_length=255)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'telegram_files'
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'kind'], name='telegram_file_sha256_kind_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.sha256[:12]}"
+
+
+# =====================
+# Aggregate stats (admin dashboard)
+# =====================
+class NotificationStat(models.Model):
+    """
+    ตัวนับสรุปของ notification (admin dashboard) แยกตาม dimension
+    - status / department (ของเจ้าของ) / event_type
+    - อัปเดตแบบ +/- ตอนสร้าง/แก้/ลบ และตอน engine เปลี่ยนสถานะ
+    - recompute ทั้งตารางเป็นระยะ (แก้ค่าที่เพี้ยน) ดู notify/services/stats.py
+    """
+
+    DIMENSION_CHOICES = [
+        ('status', 'Status'),
+        ('department', 'Department'),
+        ('event_type', 'Event Type'),
+    ]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    value = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'notification_stats'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'value'], name='notification_stat_dim_value_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.value}: {self.count}"
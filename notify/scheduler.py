@@ -1,16 +1,217 @@
 # notify/scheduler.py
+import heapq
+import logging
+import threading
+import time
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 from apscheduler.schedulers.background import BackgroundScheduler
 from django.conf import settings
-from notify.services.notification_engine import process_notifications
+from django.db import transaction
+from django.utils import timezone
+
+from notify.models import Notification
+from notify.services import metrics
+from notify.services.notification_engine import (
+    DUE_BATCH_SIZE,
+    process_notifications,
+    recover_expired_leases,
+)
+
+logger = logging.getLogger("notify.scheduler")
+
+# interval = APScheduler poll ทุก POLL_SECONDS (แบบเดิม)
+# timer    = นอนรอจนถึง next_fire_at ตัวถัดไปพอดี (ตื่นก่อนได้เมื่อมีการแก้ schedule)
+SCHEDULER_MODE = getattr(settings, "NOTIFY_SCHEDULER_MODE", "interval")
+POLL_SECONDS = getattr(settings, "NOTIFY_POLL_SECONDS", 15)
+
+# timer mode: reload heap จาก DB อย่างน้อยทุก ๆ กี่วินาที (กันหลุด sync)
+RECONCILE_SECONDS = getattr(settings, "NOTIFY_RECONCILE_SECONDS", 60)
+
+# timer mode: เช็คเวลาส่งที่เร็วที่สุดใน DB ทุก ๆ กี่วินาที (query 1 แถวผ่าน index)
+# -> engine ที่รันแยก process (run_notify_worker) เห็น notification ใหม่ภายในเวลานี้
+#    ไม่ต้องรอรอบ reconcile (ต้องไม่ช้ากว่า POLL_SECONDS ของ interval mode)
+WATCH_SECONDS = getattr(settings, "NOTIFY_WATCH_SECONDS", 5)
+
+# timer mode: จำนวนเวลาส่งล่วงหน้าที่โหลดเข้า heap
+TIMER_HORIZON = getattr(settings, "NOTIFY_TIMER_HORIZON", 1000)
 
 scheduler = None
+timer = None
+
+
+class TimerScheduler:
+    """
+    Event-driven scheduler: min-heap ของ (next_fire_at, notification_id)
+
+    - โหลดเวลาส่งที่ใกล้ที่สุด TIMER_HORIZON รายการจาก DB (index status+next_fire_at)
+    - นอนรอจนถึงเวลาบนสุดของ heap แล้วเรียก process_notifications()
+    - view เรียก schedule()/wake() ให้ตื่นก่อนเวลาเมื่อ schedule เปลี่ยน
+    - engine ที่รันแยก process ไม่ได้รับการปลุกจาก view
+      -> watch() ทุก watch_seconds: เวลาส่งที่เร็วที่สุดใน DB เร็วกว่าหัว heap -> ใส่เข้า heap
+    - reload จาก DB ทุก reconcile_seconds เป็น safety net
+    """
+
+    def __init__(
+        self,
+        horizon=TIMER_HORIZON,
+        reconcile_seconds=RECONCILE_SECONDS,
+        watch_seconds=WATCH_SECONDS,
+        workers=None,
+    ):
+        self.horizon = horizon
+        self.reconcile_seconds = reconcile_seconds
+        self.watch_seconds = watch_seconds
+        self.workers = workers
+        self.ticks = 0
+        self.last_stats = None
+        self.last_loop_at = time.monotonic()
+        self._heap: list[tuple] = []
+        self._cond = threading.Condition()
+        self._dirty = True
+        self._stopped = False
+        self._loaded_at = 0.0
+        self._watched_at = 0.0
+        self._thread = None
+
+    # ===== called from views / other threads =====
+
+    def schedule(self, fire_at, notification_id=None):
+        """เพิ่มเวลาส่งใหม่เข้า heap แล้วปลุก loop ให้คำนวณเวลานอนใหม่"""
+        with self._cond:
+            heapq.heappush(self._heap, (fire_at, notification_id or 0))
+            self._cond.notify()
+
+    def wake(self):
+        """schedule เปลี่ยนแบบไม่รู้เวลา (เช่นลบ) -> reload จาก DB"""
+        with self._cond:
+            self._dirty = True
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    # ===== loop =====
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run,
+            name="notify-timer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def load(self):
+        # lease ของ worker ที่ตายไปแล้ว -> เก็บกวาดทุกครั้งที่ reload
+        recover_expired_leases()
+
+        rows = self._upcoming().values_list("next_fire_at", "id")[:self.horizon]
+        heap = list(rows)
+        heapq.heapify(heap)
+
+        with self._cond:
+            self._heap = heap
+            self._dirty = False
+            self._loaded_at = self._watched_at = time.monotonic()
+
+    def watch(self):
+        """
+        รายการใหม่ / ถูกเลื่อนให้เร็วขึ้นโดย process อื่น -> ปลุกตามเวลานั้น
+        (เลื่อนให้ช้าลง / ลบ -> ตื่นเกินมาหนึ่งรอบแล้ว reload ตามปกติ)
+        """
+        first = self._upcoming().values_list("next_fire_at", "id").first()
+
+        with self._cond:
+            self._watched_at = time.monotonic()
+            if first and (not self._heap or first[0] < self._heap[0][0]):
+                heapq.heappush(self._heap, first)
+
+    def _upcoming(self):
+        # แถวที่ worker อื่นถือ lease อยู่ไม่ต้องรอ
+        return (
+            Notification.objects
+            .filter(status="pending", next_fire_at__isnull=False, sending_event_at__isnull=True)
+            .order_by("next_fire_at")
+        )
+
+    def _watch_due(self) -> bool:
+        return bool(self.watch_seconds) and time.monotonic() - self._watched_at >= self.watch_seconds
+
+    def _wait_until_due(self) -> bool:
+        """
+        นอนจนกว่าจะถึงเวลาบนสุดของ heap / ถูกปลุก / ถึงรอบ watch / ถึงรอบ reconcile
+        คืน True ถ้ามีรายการถึงเวลาส่ง
+        """
+        with self._cond:
+            if self._stopped or self._dirty:
+                return False
+
+            timeout = self.reconcile_seconds - (time.monotonic() - self._loaded_at)
+            if self.watch_seconds:
+                timeout = min(timeout, self.watch_seconds - (time.monotonic() - self._watched_at))
+            if self._heap:
+                until_due = (self._heap[0][0] - timezone.now()).total_seconds()
+                timeout = min(timeout, until_due)
+
+            if timeout > 0:
+                self._cond.wait(timeout)
+
+            if time.monotonic() - self._loaded_at >= self.reconcile_seconds:
+                self._dirty = True
+
+            now = timezone.now()
+            due = False
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+                due = True
+            return due
+
+    def run(self):
+        while not self._stopped:
+            self.last_loop_at = time.monotonic()
+            try:
+                if self._dirty:
+                    self.load()
+                elif self._watch_due():
+                    self.watch()
+
+                if not self._wait_until_due():
+                    continue
+
+                stats = process_notifications(workers=self.workers)
+                self.ticks += 1
+                self.last_stats = stats
+
+                # recurring / retry / deferred เปลี่ยน next_fire_at -> reload
+                self.wake()
+
+                # ยังมีค้างเกิน batch -> วนส่งต่อทันที
+                while stats.due >= DUE_BATCH_SIZE and not self._stopped:
+                    stats = process_notifications(workers=self.workers)
+
+            except Exception:
+                logger.exception("timer loop error")
+                time.sleep(1)
+                self.wake()
+
 
 def start():
-    global scheduler
+    global scheduler, timer
 
-    if scheduler:
+    if scheduler or timer:
         return  # กัน start ซ้ำ
 
+    # lease ที่ค้างจาก process ก่อนหน้า (ตายระหว่างส่ง) -> ไม่ส่งซ้ำ
+    recover_expired_leases()
+
+    if SCHEDULER_MODE == "timer":
+        timer = TimerScheduler()
+        timer.start()
+        logger.info("notification timer scheduler started")
+        return
+
     scheduler = BackgroundScheduler(
         timezone=settings.TIME_ZONE
     )
@@ -18,11 +219,35 @@ def start():
     scheduler.add_job(
         process_notifications,
         trigger='interval',
-        seconds=15,  # ตรวจทุก 30 วิ
+        seconds=POLL_SECONDS,
         id='notification_engine',
         replace_existing=True,
         max_instances=1,
     )
 
+    # tick ก่อนหน้ายังไม่จบ (max_instances=1) / เลยเวลา -> APScheduler ข้ามรอบนี้
+    scheduler.add_listener(
+        lambda event: metrics.TICKS_SKIPPED.inc(),
+        EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED,
+    )
+
     scheduler.start()
-    print("✅ Notification scheduler started")
+    logger.info("notification scheduler started", extra={"poll_seconds": POLL_SECONDS})
+
+
+def notify_schedule_changed(notification=None):
+    """
+    เรียกหลัง create / edit / delete notification
+    - timer mode ใน process นี้ -> ปลุกให้คำนวณเวลาส่งใหม่ (หลัง commit)
+    - interval mode / engine อยู่คนละ process -> ไม่ต้องทำอะไร
+    """
+    if timer is None:
+        return
+
+    fire_at = getattr(notification, "next_fire_at", None)
+    notification_id = getattr(notification, "id", None)
+
+    if fire_at:
+        transaction.on_commit(lambda: timer.schedule(fire_at, notification_id))
+    else:
+        transaction.on_commit(timer.wake)
@@ -0,0 +1,65 @@
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+from notify.services import metrics
+
+logger = logging.getLogger("notify.engine")
+
+# =========================
+# Retry on "database is locked" (SQLite)
+# =========================
+# web กับ scheduler เขียนไฟล์เดียวกัน -> ถึงจะมี busy_timeout แล้ว
+# ก็ยังเจอ lock ได้ตอน checkpoint / transaction ยาว ๆ
+# engine ลองเขียนใหม่แทนที่จะทิ้งผลการส่งทั้ง batch
+
+LOCK_RETRIES = getattr(settings, "NOTIFY_DB_LOCK_RETRIES", 5)
+LOCK_BACKOFF = getattr(settings, "NOTIFY_DB_LOCK_BACKOFF", 0.05)
+LOCK_BACKOFF_CAP = 2.0
+
+LOCK_MESSAGES = ("database is locked", "database table is locked", "database is busy")
+
+
+def is_lock_error(exc: Exception) -> bool:
+    return isinstance(exc, OperationalError) and any(m in str(exc).lower() for m in LOCK_MESSAGES)
+
+
+def retry_on_lock(fn=None, *, retries=None, backoff=None):
+    """
+    decorator: ลองใหม่เมื่อเจอ "database is locked" (exponential backoff + jitter)
+
+    - ต้องเรียกนอก transaction.atomic() ของ caller เท่านั้น
+      (ลองใหม่ใน transaction ที่พังไปแล้วไม่ได้ -> โยน error ออกไปเลย)
+    - ฟังก์ชันที่ห่อต้องเขียนซ้ำได้ (idempotent / atomic ทั้งก้อน)
+    """
+    if fn is None:
+        return functools.partial(retry_on_lock, retries=retries, backoff=backoff)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        max_retries = LOCK_RETRIES if retries is None else retries
+        delay = LOCK_BACKOFF if backoff is None else backoff
+        attempt = 0
+
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError as e:
+                if not is_lock_error(e) or attempt >= max_retries or connection.in_atomic_block:
+                    raise
+
+                attempt += 1
+                metrics.DB_LOCK_RETRIES.inc()
+                wait = min(LOCK_BACKOFF_CAP, delay * 2 ** (attempt - 1))
+                wait = wait / 2 + random.uniform(0, wait / 2)
+                logger.warning(
+                    "database locked, retrying %s", fn.__name__,
+                    extra={"attempt": attempt, "wait_s": round(wait, 3)},
+                )
+                time.sleep(wait)
+
+    return wrapper
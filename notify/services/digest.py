@@ -0,0 +1,118 @@
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from notify.services.telegram_sender import DEFAULT_MESSAGE
+
+# =========================
+# Digest (รวมหลายรายการของ chat เดียวกันเป็นข้อความเดียว)
+# =========================
+
+# Telegram: sendMessage ยาวได้สูงสุด 4096 ตัวอักษร
+MAX_MESSAGE_CHARS = 4096
+
+# chat เดียวกันมีรายการถึงเวลาพร้อมกันตั้งแต่กี่รายการขึ้นไปถึงจะรวมเป็น digest
+DIGEST_MIN_ITEMS = getattr(settings, "NOTIFY_DIGEST_MIN_ITEMS", 2)
+
+
+@dataclass
+class Digest:
+    chat_id: str
+    items: list = field(default_factory=list)
+
+
+@dataclass
+class DigestMessage:
+    text: str
+    items: list = field(default_factory=list)
+
+
+def can_coalesce(item) -> bool:
+    """
+    รวมได้เฉพาะรายการที่ส่งหาเจ้าของคนเดียวและไม่มีไฟล์แนบ
+    (broadcast / ไฟล์แนบ -> ส่งตามปกติ)
+    """
+    n = item.notification
+    return (
+        n.target_type == "user"
+        and bool(n.user.telegram_chat_id)
+        and not n.attachments.all()
+    )
+
+
+def coalesce_items(items: list, min_items: int = DIGEST_MIN_ITEMS) -> list:
+    """
+    จัดกลุ่มรายการที่ถึงเวลาใน tick เดียวกันตาม telegram_chat_id
+    คืน list ที่แต่ละตัวเป็น DueItem (ส่งเดี่ยว) หรือ Digest (ส่งรวม)
+    """
+    jobs = []
+    by_chat: dict[str, Digest] = {}
+
+    for item in items:
+        if not can_coalesce(item):
+            jobs.append(item)
+            continue
+
+        chat_id = item.notification.user.telegram_chat_id
+        digest = by_chat.get(chat_id)
+        if digest is None:
+            digest = by_chat[chat_id] = Digest(chat_id=chat_id)
+            jobs.append(digest)
+        digest.items.append(item)
+
+    # chat ที่มีรายการน้อยกว่า min_items -> ส่งแบบเดิม
+    result = []
+    for job in jobs:
+        if isinstance(job, Digest) and len(job.items) < min_items:
+            result.extend(job.items)
+        else:
+            result.append(job)
+    return result
+
+
+def render_entry(item) -> str:
+    n = item.notification
+    return f"🔔 {n.title}\n{n.description or DEFAULT_MESSAGE}"
+
+
+def render_digest(digest: Digest, limit: int = MAX_MESSAGE_CHARS) -> list[DigestMessage]:
+    """
+    แปลง digest เป็นข้อความ (แบ่งหลายข้อความเมื่อยาวเกิน limit)
+    - แต่ละรายการอยู่ในข้อความเดียวกันทั้งก้อนถ้าเป็นไปได้
+    - รายการที่ยาวเกิน limit เอง -> ตัดเป็นหลายท่อน
+    """
+    header = f"📢 คุณมีการแจ้งเตือน {len(digest.items)} รายการ"
+    separator = "\n\n"
+
+    messages: list[DigestMessage] = []
+    current = DigestMessage(text=header)
+
+    for item in digest.items:
+        entry = render_entry(item)
+        sep = separator if current.text else ""
+
+        if len(current.text) + len(sep) + len(entry) <= limit:
+            current.text += sep + entry
+            current.items.append(item)
+            continue
+
+        if current.items:
+            messages.append(current)
+            current = DigestMessage(text="")
+
+        # รายการเดียวยาวเกินข้อความ -> ตัดเป็นท่อน
+        while entry:
+            sep = separator if current.text else ""
+            room = limit - len(current.text) - len(sep)
+            piece, entry = entry[:room], entry[room:]
+            current.text += sep + piece
+            current.items.append(item)
+
+            if entry:
+                messages.append(current)
+                current = DigestMessage(text="")
+
+    if current.items:
+        messages.append(current)
+
+    return messages
@@ -0,0 +1,293 @@
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from notify.services.rate_limiter import TokenBucket
+
+# =========================
+# Fake Telegram Bot API (load / chaos test)
+# =========================
+# รองรับ path เดียวกับ telegram_sender: /bot<TOKEN>/<method>
+# - sendMessage / sendPhoto / sendDocument / sendMediaGroup
+# - latency จำลอง, 429 + retry_after, 5xx, timeout, per-chat rate limit
+# - GET /stats -> จำนวน request แยกตาม method / status (JSON)
+
+METHODS = {"sendMessage", "sendPhoto", "sendDocument", "sendMediaGroup"}
+
+
+def parse_latency(spec: str):
+    """
+    latency distribution (หน่วย ms) -> function ที่คืนวินาที
+    - "0" / "fixed:20"
+    - "uniform:10-50"
+    - "exp:20"             (ค่าเฉลี่ย 20ms)
+    - "lognormal:20,0.5"   (median 20ms, sigma 0.5 -> หางยาวแบบ network จริง)
+    """
+    kind, _, args = (spec or "0").partition(":")
+    if not args:
+        kind, args = "fixed", kind
+
+    try:
+        if kind == "fixed":
+            value = float(args) / 1000
+            return lambda: value
+        if kind == "uniform":
+            low, high = (float(x) / 1000 for x in args.split("-"))
+            return lambda: random.uniform(low, high)
+        if kind == "exp":
+            mean = float(args) / 1000
+            return lambda: random.expovariate(1 / mean) if mean else 0.0
+        if kind == "lognormal":
+            median, sigma = (float(x) for x in args.split(","))
+            mu = math.log(median / 1000)
+            return lambda: random.lognormvariate(mu, sigma)
+    except ValueError:
+        pass
+
+    raise ValueError(f"latency spec ไม่ถูกต้อง: {spec!r}")
+
+
+@dataclass
+class FakeTelegramConfig:
+    latency: str = "0"
+    rate_429: float = 0.0       # สัดส่วน request ที่ตอบ 429 แบบสุ่ม
+    retry_after: int = 1
+    rate_5xx: float = 0.0
+    rate_timeout: float = 0.0   # สัดส่วน request ที่ค้างนาน timeout_seconds ก่อนตอบ
+    timeout_seconds: float = 30.0
+    chat_rate: float = 0.0      # msg/s ต่อ chat (0 = ไม่จำกัด), Telegram จริง ~1
+    chat_burst: float = 3.0
+    global_rate: float = 0.0    # msg/s ทั้ง bot (0 = ไม่จำกัด), Telegram จริง ~30
+
+
+@dataclass
+class FakeTelegramStats:
+    requests: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, method: str, status: int):
+        key = f"{method} {status}"
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.requests)
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # header + body เขียนแยกกัน -> กัน delayed ACK 40ms บน keep-alive
+
+    # ===== routing =====
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/stats":
+            self._reply(200, self.server.stats.snapshot())
+            return
+        self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        parts = self.path.split("?")[0].strip("/").split("/")
+        method = parts[-1] if len(parts) == 2 and parts[0].startswith("bot") else ""
+        if method not in METHODS:
+            self._api_error(method or "?", 404, "Not Found")
+            return
+
+        try:
+            params = self._parse_params(body)
+        except ValueError:
+            self._api_error(method, 400, "Bad Request: can't parse request")
+            return
+
+        chat_id = str(params.get("chat_id") or "")
+        if not chat_id:
+            self._api_error(method, 400, "Bad Request: chat_id is empty")
+            return
+
+        self.server.handle_api(self, method, chat_id, params)
+
+    # ===== request parsing =====
+
+    def _parse_params(self, body: bytes) -> dict:
+        content_type = self.headers.get("Content-Type", "")
+
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body
+            )
+            params = {}
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename() is None:
+                    params[name] = part.get_content().strip()
+                else:
+                    params[name] = {"filename": part.get_filename(), "size": len(part.get_payload(decode=True))}
+            return params
+
+        raise ValueError(content_type)
+
+    # ===== response =====
+
+    def _api_error(self, method, status, description, retry_after=None):
+        payload = {"ok": False, "error_code": status, "description": description}
+        if retry_after is not None:
+            payload["parameters"] = {"retry_after": retry_after}
+        self.server.stats.record(method, status)
+        self._reply(status, payload)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    """
+    ใช้ได้ทั้งรันเดี่ยว (`manage.py run_fake_telegram`) และฝังใน benchmark:
+
+        server = FakeTelegramServer(("127.0.0.1", 0), FakeTelegramConfig(latency="lognormal:30,0.4"))
+        server.start()
+        ...
+        server.shutdown()
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024  # backlog ของ listen() -- ค่า default 5 ทำให้ connection ถูก reset ตอนยิงพร้อมกันเยอะ ๆ
+
+    def __init__(self, address, config: FakeTelegramConfig | None = None):
+        super().__init__(address, FakeTelegramHandler)
+        self.config = config or FakeTelegramConfig()
+        self.stats = FakeTelegramStats()
+        self.latency = parse_latency(self.config.latency)
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._global_bucket = (
+            TokenBucket(self.config.global_rate, self.config.global_rate)
+            if self.config.global_rate else None
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="fake-telegram", daemon=True)
+        thread.start()
+        return thread
+
+    # ===== simulated Bot API =====
+
+    def handle_api(self, handler: FakeTelegramHandler, method: str, chat_id: str, params: dict):
+        cfg = self.config
+
+        wait = self._rate_limit_wait(chat_id)
+        if wait > 0:
+            handler._api_error(
+                method, 429, f"Too Many Requests: retry after {math.ceil(wait)}",
+                retry_after=math.ceil(wait),
+            )
+            return
+
+        roll = random.random()
+        if roll < cfg.rate_429:
+            handler._api_error(
+                method, 429, f"Too Many Requests: retry after {cfg.retry_after}",
+                retry_after=cfg.retry_after,
+            )
+            return
+        roll -= cfg.rate_429
+
+        if roll < cfg.rate_5xx:
+            handler._api_error(method, 502, "Bad Gateway")
+            return
+        roll -= cfg.rate_5xx
+
+        delay = self.latency()
+        if roll < cfg.rate_timeout:
+            delay = cfg.timeout_seconds
+        if delay > 0:
+            time.sleep(delay)
+
+        self.stats.record(method, 200)
+        handler._reply(200, {"ok": True, "result": self._result(method, chat_id, params)})
+
+    def _rate_limit_wait(self, chat_id: str) -> float:
+        cfg = self.config
+        if not cfg.chat_rate and self._global_bucket is None:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            buckets = [self._global_bucket] if self._global_bucket else []
+
+            if cfg.chat_rate:
+                bucket = self._chat_buckets.get(chat_id)
+                if bucket is None:
+                    bucket = self._chat_buckets[chat_id] = TokenBucket(cfg.chat_rate, cfg.chat_burst)
+                buckets.append(bucket)
+
+            wait = max(b.wait_time(now) for b in buckets)
+            if wait <= 0:
+                for b in buckets:
+                    b.consume()
+            return wait
+
+    def _message(self, chat_id: str) -> dict:
+        return {
+            "message_id": next(self._ids),
+            "chat": {"id": chat_id},
+            "date": int(time.time()),
+        }
+
+    def _file(self, kind: str) -> dict:
+        file_id = f"fake-{kind}-{next(self._ids)}"
+        if kind == "photo":
+            return {"photo": [{"file_id": file_id, "file_size": 1}]}
+        return {"document": {"file_id": file_id, "file_size": 1}}
+
+    def _result(self, method: str, chat_id: str, params: dict):
+        if method == "sendMessage":
+            return {**self._message(chat_id), "text": params.get("text", "")}
+
+        if method == "sendPhoto":
+            return {**self._message(chat_id), **self._file("photo")}
+
+        if method == "sendDocument":
+            return {**self._message(chat_id), **self._file("document")}
+
+        # sendMediaGroup -> 1 message ต่อ media
+        try:
+            media = params.get("media") or "[]"
+            media = json.loads(media) if isinstance(media, str) else media
+        except ValueError:
+            media = []
+        return [
+            {**self._message(chat_id), **self._file(item.get("type", "document"))}
+            for item in media
+        ]
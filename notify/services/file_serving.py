@@ -0,0 +1,151 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+# =========================
+# Attachment Serving (/media/)
+# =========================
+# view ตรวจสิทธิ์แล้วเรียก serve_file() -> ส่งไฟล์ได้ 2 แบบ
+# - NOTIFY_MEDIA_SENDFILE = "nginx"  : ตอบแค่ header X-Accel-Redirect แล้ว nginx ส่งไฟล์เอง (รองรับ Range เอง)
+#                          "apache" : X-Sendfile (mod_xsendfile / lighttpd)
+#   -> worker คืนทันที ไม่ต้องถือ thread ไว้ตลอดการส่ง PDF / รูปขนาดใหญ่
+# - "" (default)                    : FileResponse
+#   ไฟล์ทั้งไฟล์ -> wsgi.file_wrapper (gunicorn ใช้ sendfile() แบบ zero-copy)
+#   Range: bytes=a-b -> 206 ส่งเฉพาะช่วงที่ขอ (PDF viewer / ดาวน์โหลดต่อ)
+
+SENDFILE_BACKEND = getattr(settings, "NOTIFY_MEDIA_SENDFILE", "")
+ACCEL_PREFIX = getattr(settings, "NOTIFY_MEDIA_ACCEL_PREFIX", "/protected-media/")
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int):
+    """
+    Range แบบช่วงเดียว -> (start, end) รวมปลาย
+    รูปแบบไม่รองรับ (หลายช่วง / ผิดรูปแบบ) -> None (ส่งทั้งไฟล์ตาม RFC 9110)
+    ช่วงที่ไม่มีอยู่จริงคืน start > end ให้ผู้เรียกตอบ 416
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # bytes=-n -> n byte สุดท้าย
+        suffix = int(last)
+        if not suffix:
+            return size, size - 1
+        return max(size - suffix, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    return start, end
+
+
+def if_range_matches(request, etag: str, last_modified: int) -> bool:
+    """
+    If-Range: ไฟล์ยังเป็นตัวเดิม -> ส่งเฉพาะช่วงได้ / เปลี่ยนแล้ว -> ส่งทั้งไฟล์
+    """
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+class RangeFile:
+    """
+    file object ที่อ่านได้ไม่เกิน length byte (ไม่มี fileno -> server ส่งด้วยการ read ไม่ใช้ sendfile ทั้งไฟล์)
+    """
+
+    def __init__(self, f, length: int):
+        self.f = f
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def serve_file(request, root, relative_path: str, filename: str = ""):
+    """
+    root / relative_path ต้องผ่านการตรวจสิทธิ์และ safe_join มาแล้ว
+    """
+    full_path = os.path.join(root, relative_path)
+    stat = os.stat(full_path)
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = f'"{last_modified:x}-{size:x}"'
+
+    filename = filename or os.path.basename(relative_path)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    # If-None-Match / If-Modified-Since -> 304 โดยไม่ต้องเปิดไฟล์
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    if SENDFILE_BACKEND == "nginx":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = ACCEL_PREFIX.rstrip("/") + "/" + quote(relative_path)
+    elif SENDFILE_BACKEND == "apache":
+        response = HttpResponse(content_type=content_type)
+        # header ของ WSGI เป็น latin-1 -> ส่ง byte UTF-8 ของ path ตรง ๆ (ชื่อไฟล์ภาษาไทย)
+        response["X-Sendfile"] = full_path.encode().decode("latin-1")
+    else:
+        response = _file_response(request, full_path, size, content_type, filename, etag, last_modified)
+        if response.status_code == 416:
+            return response
+
+    if response.get("Content-Disposition") is None:
+        response["Content-Disposition"] = content_disposition_header(False, filename)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _file_response(request, full_path, size, content_type, filename, etag, last_modified):
+    byte_range = None
+    header = request.headers.get("Range")
+    if header and request.method == "GET" and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(header, size)
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type, filename=filename)
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    start, end = byte_range
+    if start > end or start >= size:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    f = open(full_path, "rb")
+    f.seek(start)
+    response = FileResponse(RangeFile(f, end - start + 1), status=206, content_type=content_type, filename=filename)
+    response["Content-Length"] = end - start + 1
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,57 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from notify.models import User
+from notify.services.db_retry import retry_on_lock
+
+# =========================
+# Per-user Fragment Cache (dashboard)
+# =========================
+# เก็บ HTML ของตาราง notification ที่ render แล้ว
+# key = user + users.dashboard_version + query string (หน้า/cursor)
+# - notification ของ user เปลี่ยน -> bump dashboard_version -> key ใหม่ (ไม่ต้องไล่ลบของเก่า)
+# - version อยู่ใน DB (โหลดมากับ request.user อยู่แล้ว) -> web หลาย process / engine แยก process เห็นตรงกัน
+#   cache backend จะเป็น locmem (ต่อ process) / file / db ก็ได้
+# - csrf_token ใน fragment เป็น placeholder แล้วแทนที่ด้วย token ของ request ตอนส่งออก
+
+FRAGMENT_CACHE_SECONDS = getattr(settings, "NOTIFY_FRAGMENT_CACHE_SECONDS", 300)
+FRAGMENT_CACHE_ALIAS = getattr(settings, "NOTIFY_FRAGMENT_CACHE_ALIAS", "default")
+
+CSRF_PLACEHOLDER = "__NOTIFY_CSRF_TOKEN__"
+
+
+def dashboard_key(user, query_string: str = "") -> str:
+    params = hashlib.sha1(query_string.encode()).hexdigest()[:16]
+    return f"notify:dashboard:{user.id}:v{user.dashboard_version}:{params}"
+
+
+def get_fragment(request, key: str):
+    html = caches[FRAGMENT_CACHE_ALIAS].get(key)
+    if html is None:
+        return None
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def render_fragment(request, template_name: str, context: dict, key: str):
+    """
+    render แล้วเก็บลง cache (csrf เป็น placeholder) คืน HTML พร้อม token จริงของ request นี้
+    """
+    html = render_to_string(template_name, {**context, "csrf_token": CSRF_PLACEHOLDER})
+    caches[FRAGMENT_CACHE_ALIAS].set(key, html, FRAGMENT_CACHE_SECONDS)
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+@retry_on_lock
+def bump_dashboard_version(*user_ids):
+    """
+    UPDATE เดียวต่อครั้ง (engine เรียกครั้งเดียวต่อ chunk ที่ flush)
+    """
+    ids = {uid for uid in user_ids if uid}
+    if ids:
+        User.objects.filter(id__in=ids).update(dashboard_version=F("dashboard_version") + 1)
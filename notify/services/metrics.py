@@ -0,0 +1,208 @@
+import bisect
+import hmac
+import threading
+
+# =========================
+# In-process Metrics Registry
+# =========================
+# counter / histogram แบบเบา ๆ (ไม่ต้องพึ่ง prometheus_client)
+# - thread-safe: dispatch worker หลายตัวเรียกพร้อมกันได้
+# - render() -> Prometheus text format (ใช้กับ /metrics)
+# - ค่าเป็นของ process นี้เท่านั้น (web กับ run_notify_worker แยกกัน)
+
+# วินาที
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LAG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 15, 30, 60, 120, 300, 900, 3600)
+SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple, object] = {}
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {child.value:g}")
+        return lines
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # ช่องสุดท้าย = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, child in sorted(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total, count = child.sum, child.count
+
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _label_str(self.labelnames + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = _label_str(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def bearer_token_matches(authorization: str, token: str) -> bool:
+    """
+    header Authorization: Bearer <token> ตรงกับ token ที่ตั้งไว้
+    token ว่าง = ปิดการเข้าด้วย token (คืน False เสมอ)
+    """
+    if not token:
+        return False
+    scheme, _, value = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+    return hmac.compare_digest(value.strip().encode(), token.encode())
+
+
+registry = Registry()
+
+# ===== Engine =====
+TICK_DURATION = registry.histogram(
+    "notify_tick_duration_seconds", "Duration of one engine tick",
+)
+DUE_ITEMS = registry.histogram(
+    "notify_due_items", "Number of due notifications found per tick", buckets=SIZE_BUCKETS,
+)
+TICKS = registry.counter("notify_ticks_total", "Engine ticks run")
+TICKS_SKIPPED = registry.counter(
+    "notify_ticks_skipped_total", "Scheduled ticks skipped because the previous tick was still running",
+)
+OUTCOMES = registry.counter(
+    "notify_outcomes_total", "Per-notification send outcomes", ("outcome",),
+)
+RETRIES = registry.counter("notify_retries_total", "Failed sends scheduled for retry")
+SCHEDULE_LAG = registry.histogram(
+    "notify_schedule_lag_seconds", "Actual send time minus scheduled event_at", buckets=LAG_BUCKETS,
+)
+DB_LOCK_RETRIES = registry.counter(
+    "notify_db_lock_retries_total", "Engine writes retried after SQLite reported the database as locked",
+)
+
+# ===== Telegram sender =====
+SEND_LATENCY = registry.histogram(
+    "telegram_request_duration_seconds", "Bot API request latency", ("endpoint",),
+)
+HTTP_RESPONSES = registry.counter(
+    "telegram_responses_total", "Bot API responses by HTTP status (error = no response)",
+    ("endpoint", "status"),
+)
+
+# ===== Logging =====
+LOG_DROPPED = registry.counter(
+    "notify_log_dropped_total", "Log records dropped because the log queue was full",
+)
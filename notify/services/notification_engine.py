@@ -1,12 +1,80 @@
+import logging
+import os
+import random
+import socket
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, close_old_connections
+from django.db.models import Case, DateTimeField, Q, Value, When
 
-from notify.models import Notification
-from notify.services.telegram_sender import send_telegram_message
+from notify.log import log_context, truncate
+from notify.models import Notification, NotificationDelivery, User
+from notify.services import metrics
+from notify.services.fragment_cache import bump_dashboard_version
+from notify.services import stats as notification_stats
+from notify.services.db_retry import retry_on_lock
+from notify.services.digest import Digest, coalesce_items, render_digest
+from notify.services.rate_limiter import RetryAfter
+from notify.services.telegram_sender import (
+    LOG_BODY_CHARS,
+    SendResult,
+    send_message,
+    send_notification,
+)
 
-MAX_RETRY = 2  # retry เพิ่มอีก 2 รอบ (รวมส่งจริง = 3)
+logger = logging.getLogger("notify.engine")
+
+MAX_RETRY = getattr(settings, "NOTIFY_MAX_RETRY", 2)  # retry เพิ่มอีก 2 รอบ (รวมส่งจริง = 3)
+
+# ส่งไม่สำเร็จ -> retry แบบ exponential backoff + jitter
+# retry ครั้งที่ n รอประมาณ BASE * 2^(n-1) วินาที (ไม่เกิน CAP)
+RETRY_BACKOFF_BASE = getattr(settings, "NOTIFY_RETRY_BACKOFF_BASE", 60)
+RETRY_BACKOFF_CAP = getattr(settings, "NOTIFY_RETRY_BACKOFF_CAP", 3600)
+
+# ผลของการส่ง 1 รายการ
+SUCCESS = "success"
+FAILURE = "failure"
+DEFERRED = "deferred"  # ติด rate limit -> เลื่อนส่ง ไม่นับ retry
+SKIPPED = "skipped"    # claim ไม่สำเร็จ (ถูกแก้ไข/ถูกหยิบไปแล้ว)
+
+OUTCOME_RANK = {SUCCESS: 0, DEFERRED: 1, FAILURE: 2}
+
+# จำนวน notification สูงสุดที่หยิบมาส่งต่อ 1 tick (ที่เหลือไปรอบถัดไป)
+DUE_BATCH_SIZE = getattr(settings, "NOTIFY_DUE_BATCH_SIZE", 500)
+
+# จำนวนรายการที่ส่งพร้อมกันสูงสุด (1 = ส่งทีละรายการแบบเดิม)
+DISPATCH_WORKERS = getattr(settings, "NOTIFY_DISPATCH_WORKERS", 1)
+
+# จำนวนแถวต่อ 1 statement ตอน claim
+STATUS_FLUSH_SIZE = getattr(settings, "NOTIFY_STATUS_FLUSH_SIZE", 500)
+
+# จำนวนผลต่อ 1 transaction ตอนบันทึกสถานะ (StatusBatch)
+STATUS_WRITE_CHUNK = getattr(settings, "NOTIFY_STATUS_WRITE_CHUNK", 100)
+
+# อายุ lease ของรายการที่ claim ไป (ต้องนานกว่าเวลาส่ง 1 tick)
+LEASE_SECONDS = getattr(settings, "NOTIFY_LEASE_SECONDS", 300)
+
+# broadcast: ดึงผู้รับจาก DB ทีละกี่ chat (ไม่โหลด user ทั้งหมดเข้า memory)
+FANOUT_CHUNK_SIZE = getattr(settings, "NOTIFY_FANOUT_CHUNK_SIZE", 200)
+
+# รวมหลายรายการของ chat เดียวกันใน tick เดียวเป็นข้อความ digest (ลด sendMessage / per-chat limit)
+COALESCE = getattr(settings, "NOTIFY_COALESCE", False)
+
+# field ที่เคลียร์เมื่อบันทึกผลเสร็จ (ปล่อย lease)
+RELEASE_FIELDS = ["sending_event_at", "send_started_at", "lease_owner", "lease_expires_at"]
+
+
+def get_worker_id() -> str:
+    """
+    ชื่อ engine worker (ต้องไม่ซ้ำกันระหว่าง process / host)
+    """
+    return getattr(settings, "NOTIFY_WORKER_ID", "") or f"{socket.gethostname()}:{os.getpid()}"
 
 
 @dataclass
@@ -16,6 +84,245 @@ class DueItem:
     send_at: timezone.datetime
 
 
+@dataclass
+class TickStats:
+    """
+    สรุปผล 1 tick ของ engine (ใช้ดู throughput เพื่อปรับขนาด worker pool)
+    """
+    due: int = 0
+    success: int = 0
+    failure: int = 0
+    deferred: int = 0
+    skipped: int = 0
+    workers: int = 1
+    duration: float = 0.0
+
+    def record(self, outcome: str):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @property
+    def throughput(self) -> float:
+        return self.due / self.duration if self.duration else 0.0
+
+
+class StatusBatch:
+    """
+    เก็บการเปลี่ยนสถานะของ notification ใน 1 tick แล้วเขียนเป็นก้อน (chunk ละ 1 transaction)
+    - 1 commit ต่อ chunk (STATUS_WRITE_CHUNK แถว) แทน 1 commit ต่อรายการ
+      chunk เล็ก -> ถือ write lock ของ SQLite สั้น ๆ และผลลง DB เร็ว (ไม่รอจบ tick)
+    - แต่ละแถวเป็น UPDATE ... WHERE id = ? AND lease_owner = ? AND lease_expires_at = ?
+      เขียนเฉพาะ field ที่ handler เปลี่ยน -> lease หลุด / ถูกแก้ไขระหว่างส่ง จะไม่ถูกเขียนทับ
+      (bulk_update แบบ CASE ทุก field ไม่เร็วกว่าบน SQLite และเขียนทับการแก้ไขจาก view)
+    - NotificationDelivery ของ tick เขียนด้วย bulk_create
+    - thread-safe: dispatch worker หลายตัวเรียก add() พร้อมกันได้
+    - SQLite "database is locked" -> ลองเขียน chunk นั้นใหม่ (retry_on_lock)
+    - delta ของ notification_stats เขียนตามหลัง chunk เฉพาะแถวที่บันทึกจริง
+    - bump dashboard_version ของเจ้าของแถวใน chunk (UPDATE เดียว)
+    """
+
+    def __init__(self, chunk_size: int = STATUS_WRITE_CHUNK):
+        self.chunk_size = chunk_size
+        self.statements = 0
+        # id -> (notification, fields ที่เปลี่ยน, lease ตอนได้ผล)
+        self._pending: dict[int, tuple[Notification, set, tuple | None]] = {}
+        self._stats: dict[int, Counter] = {}
+        self._deliveries: list[NotificationDelivery] = []
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        notification: Notification,
+        fields: list[str],
+        stat_deltas: Counter | None = None,
+        lease: tuple | None = None,
+    ):
+        with self._lock:
+            previous = self._pending.get(notification.id)
+            if previous is not None:
+                fields = previous[1] | set(fields)
+                lease = previous[2]
+            self._pending[notification.id] = (notification, set(fields), lease if lease and lease[0] else None)
+            if stat_deltas:
+                self._stats.setdefault(notification.id, Counter()).update(stat_deltas)
+            if len(self._pending) >= self.chunk_size:
+                self._flush_locked()
+
+    def add_delivery(self, delivery: NotificationDelivery):
+        with self._lock:
+            self._deliveries.append(delivery)
+            if len(self._deliveries) >= self.chunk_size:
+                self._flush_deliveries_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+            self._flush_deliveries_locked()
+
+    def flush_deliveries(self):
+        with self._lock:
+            self._flush_deliveries_locked()
+
+    def _flush_deliveries_locked(self):
+        if not self._deliveries:
+            return
+
+        deliveries = self._deliveries
+        self._deliveries = []
+
+        # notification ถูกลบระหว่างส่ง -> เก็บประวัติไว้แบบไม่มี FK (เหมือน on_delete=SET_NULL)
+        existing = set(
+            Notification.objects
+            .filter(id__in={d.notification_id for d in deliveries})
+            .values_list("id", flat=True)
+        )
+        for d in deliveries:
+            if d.notification_id not in existing:
+                d.notification = None
+
+        retry_on_lock(NotificationDelivery.objects.bulk_create)(deliveries, batch_size=self.chunk_size)
+        self.statements += 1
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+
+        entries = list(self._pending.values())
+        self._pending.clear()
+
+        for i in range(0, len(entries), self.chunk_size):
+            chunk = entries[i:i + self.chunk_size]
+
+            written = self._write_chunk(chunk)
+            self.statements += 1
+
+            for n, _, _ in chunk:
+                if n.id not in written:
+                    logger.warning("lease lost, result not recorded", extra={"notification_id": n.id})
+
+            if not written:
+                continue
+
+            deltas = Counter()
+            for nid in written:
+                deltas.update(self._stats.pop(nid, {}))
+            notification_stats.apply_deltas(deltas)
+            bump_dashboard_version(*{n.user_id for n, _, _ in chunk if n.id in written})
+
+        # แถวที่ lease หลุด (ไม่ได้เขียน) -> ทิ้ง delta ไปด้วย
+        self._stats.clear()
+
+    @retry_on_lock
+    def _write_chunk(self, chunk: list[tuple]) -> set[int]:
+        """
+        คืน id ที่เขียนได้จริง (lease ยังตรง owner + expires_at)
+        ลองใหม่ทั้ง chunk เมื่อ database is locked (transaction rollback -> เริ่มนับใหม่)
+        """
+        written = set()
+        with transaction.atomic():
+            for n, fields, lease in chunk:
+                row = Notification.objects.filter(id=n.id)
+                if lease:
+                    row = row.filter(lease_owner=lease[0], lease_expires_at=lease[1])
+                if row.update(**{field: getattr(n, field) for field in fields}):
+                    written.add(n.id)
+        return written
+
+
+def record_delivery(
+    item: DueItem,
+    outcome: str,
+    result: SendResult | None = None,
+    attempt: int = 1,
+    batch: StatusBatch | None = None,
+):
+    """
+    เพิ่มแถวประวัติการส่งลง NotificationDelivery (append-only)
+    """
+    result = result or SendResult()
+    delivery = NotificationDelivery(
+        notification=item.notification,
+        chat_id=result.chat_id,
+        event_at=item.event_at,
+        attempt=attempt,
+        outcome=outcome,
+        sent_at=timezone.now(),
+        http_status=result.http_status,
+        latency_ms=round(result.latency_ms) if result.latency_ms else None,
+        error=result.error,
+        telegram_message_id=result.message_id,
+        worker=item.notification.lease_owner or "",
+    )
+
+    lag = (delivery.sent_at - item.event_at).total_seconds()
+    if outcome == SUCCESS:
+        metrics.SCHEDULE_LAG.observe(max(0.0, lag))
+
+    logger.log(
+        logging.DEBUG if outcome == SUCCESS else logging.INFO,
+        "delivery %s", outcome,
+        extra={
+            "notification_id": item.notification.id,
+            "chat_id": result.chat_id,
+            "latency_ms": delivery.latency_ms,
+            "outcome": outcome,
+            "attempt": attempt,
+            "endpoint": result.endpoint,
+            "http_status": result.http_status,
+            "lag_s": round(lag, 3),
+            "error": truncate(result.error, LOG_BODY_CHARS),
+        },
+    )
+
+    if batch is not None:
+        batch.add_delivery(delivery)
+    else:
+        retry_on_lock(delivery.save)()
+
+
+def release_lease(notification: Notification) -> tuple:
+    """
+    ปล่อย lease ใน memory (ยังไม่ save) คืน (lease_owner, lease_expires_at) เดิม
+    ใช้เป็นเงื่อนไขตอนเขียนผล (lease ต้องยังเป็นของเราอยู่)
+    - view แก้ไข notification ที่ engine ถืออยู่ -> ผลของรอบเก่าถูกทิ้ง ไม่เขียนทับ
+    """
+    lease = (notification.lease_owner, notification.lease_expires_at)
+    notification.sending_event_at = None
+    notification.send_started_at = None
+    notification.lease_owner = None
+    notification.lease_expires_at = None
+    return lease
+
+
+def _persist(
+    notification: Notification,
+    fields: list[str],
+    batch: StatusBatch | None,
+    stat_deltas: Counter | None = None,
+    lease: tuple | None = None,
+):
+    """
+    มี batch -> รอ flush ตอนจบ tick / ไม่มี -> save ทันที
+    lease = (owner, expires_at) -> เขียนเฉพาะเมื่อแถวยังถือ lease นี้อยู่
+    """
+    if batch is not None:
+        batch.add(notification, fields, stat_deltas, lease)
+    else:
+        if lease and lease[0]:
+            written = retry_on_lock(
+                Notification.objects
+                .filter(id=notification.id, lease_owner=lease[0], lease_expires_at=lease[1])
+                .update
+            )(**{field: getattr(notification, field) for field in fields})
+            if not written:
+                logger.warning("lease lost, result not recorded", extra={"notification_id": notification.id})
+                return
+        else:
+            retry_on_lock(notification.save)(update_fields=fields)
+        if stat_deltas:
+            notification_stats.apply_deltas(stat_deltas)
+        bump_dashboard_version(notification.user_id)
+
+
 def get_event_at(n: Notification):
     """
     one_time  -> event_datetime
@@ -26,17 +333,37 @@ def get_event_at(n: Notification):
     return n.start_datetime
 
 
-def build_due_items(now=None) -> list[DueItem]:
+def compute_next_fire_at(n: Notification):
+    """
+    เวลาที่ engine ต้องหยิบ notification นี้ไปส่ง (ค่าที่เก็บใน next_fire_at)
+    - None = ไม่ต้องส่งแล้ว (success / failure / รอบนี้ส่งไปแล้ว)
+    """
+    if n.status != "pending":
+        return None
+
+    event_at = get_event_at(n)
+    if not event_at or n.last_sent_event_at == event_at:
+        return None
+
+    return event_at
+
+
+def build_due_items(now=None, limit=None) -> list[DueItem]:
     """
     สร้างรายการ notification ที่ถึงเวลาส่ง
+
+    ใช้ index (status, next_fire_at) -> query เฉพาะแถวที่ถึงเวลาแล้ว
+    ไม่ต้องโหลด pending ทั้งตารางมาเช็คใน Python
     """
     now = now or timezone.now()
+    limit = limit or DUE_BATCH_SIZE
 
     qs = (
         Notification.objects
-        .filter(status="pending")
+        .filter(status="pending", next_fire_at__lte=now, sending_event_at__isnull=True)
         .select_related("user")
-        .order_by("-created_at")
+        .prefetch_related("attachments")
+        .order_by("next_fire_at")[:limit]
     )
 
     due: list[DueItem] = []
@@ -46,56 +373,625 @@ def build_due_items(now=None) -> list[DueItem]:
         if not event_at:
             continue
 
-        # ส่งเฉพาะรอบที่ยังไม่เคยส่ง
-        if event_at <= now and n.last_sent_event_at != event_at:
-            due.append(DueItem(
-                notification=n,
-                event_at=event_at,
-                send_at=event_at
-            ))
+        # กันกรณี next_fire_at ค้าง (ส่งรอบนี้ไปแล้ว)
+        if n.last_sent_event_at == event_at:
+            continue
+
+        due.append(DueItem(
+            notification=n,
+            event_at=event_at,
+            send_at=n.next_fire_at
+        ))
 
     return due
 
 
-def process_notifications():
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_dispatch_executor(workers: int) -> ThreadPoolExecutor:
+    """
+    thread pool สำหรับส่งแบบ concurrent (สร้างครั้งเดียว ใช้ซ้ำทุก tick)
+    - thread ใน pool ถือ DB connection ของตัวเองต่อเนื่อง
+    """
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=True)
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="notify-dispatch",
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown_dispatch_executor():
+    """
+    รอให้งานที่กำลังส่งใน pool เสร็จแล้วปิด pool (ใช้ตอน worker ปิดตัว)
+    """
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+            _executor_workers = 0
+
+
+def _dispatch_in_worker(job, batch: StatusBatch) -> list[str]:
+    # เหมือน request cycle ของ Django: ทิ้ง connection ที่หมดอายุ/เสียก่อนใช้งาน
+    close_old_connections()
+    return process_job(job, batch)
+
+
+def process_job(job, batch: StatusBatch | None = None) -> list[str]:
+    """
+    job = DueItem (ส่งเดี่ยว) หรือ Digest (ส่งรวม) -> คืน outcome ต่อรายการ
+    """
+    try:
+        if isinstance(job, Digest):
+            with log_context(chat_id=job.chat_id):
+                return process_digest(job, batch)
+
+        with log_context(notification_id=job.notification.id):
+            return [process_due_item(job, batch)]
+    except Exception:
+        logger.exception("worker error on %s", job_label(job))
+        return fail_job(job, batch)
+
+
+def fail_job(job, batch: StatusBatch | None = None) -> list[str]:
+    """
+    job ล้มกลางทางด้วย exception -> รายการที่ยังไม่ได้บันทึกผลถือเป็น failure (retry ตาม backoff)
+    ไม่ปล่อยให้ lease หมดอายุเอง (recover_expired_leases จะนับว่าส่งแล้วทั้งที่อาจยังไม่ได้ส่ง)
+    """
+    items = job.items if isinstance(job, Digest) else [job]
+    for item in items:
+        # handle_* ปล่อย lease ใน memory แล้ว = บันทึกผลไปแล้ว
+        if item.notification.lease_owner:
+            handle_failure(item.notification, batch)
+    return [FAILURE] * job_size(job)
+
+
+def job_size(job) -> int:
+    return len(job.items) if isinstance(job, Digest) else 1
+
+
+def job_label(job) -> str:
+    if isinstance(job, Digest):
+        return f"digest chat {job.chat_id}"
+    return f"notification {job.notification.id}"
+
+
+def process_notifications(workers=None) -> TickStats:
+    """
+    1 tick ของ engine
+
+    1) claim   : UPDATE เดียว (ต่อ chunk) mark sending_event_at ของทุกรายการที่ถึงเวลา
+    2) send    : mark send_started_at ทีละรายการก่อนยิง แล้วยิง Telegram โดยไม่มี transaction เปิดอยู่
+                 (ทีละรายการ หรือผ่าน thread pool)
+    3) record  : เก็บผลลง StatusBatch เขียนทีละ chunk (ครบ chunk ระหว่าง tick / ที่เหลือตอนจบ tick)
+                 (sending_event_at ถูกเคลียร์พร้อมกัน)
+
+    claim ทำผ่าน lease (lease_owner + lease_expires_at) -> รันหลาย worker พร้อมกันได้
+    แต่ละแถวถูกส่งโดย worker เดียว
+
+    ถ้า process ตายระหว่าง 1) กับ flush แถวจะค้าง lease ไว้จนหมดอายุ
+    -> recover_expired_leases() ของ worker ถัดไปเก็บกวาด:
+       ยังไม่เริ่มส่ง -> ส่งใหม่ / เริ่มส่งแล้ว -> ไม่ส่งซ้ำ
+    """
+    started = time.monotonic()
     now = timezone.now()
+
+    recover_expired_leases(now=now)
     due_items = build_due_items(now=now)
 
-    print(f"[ENGINE] Found {len(due_items)} due notifications")
+    workers = max(1, workers or DISPATCH_WORKERS)
+    stats = TickStats(due=len(due_items), workers=workers)
+
+    logger.debug("due notifications found", extra={"due": len(due_items)})
+
+    # ===== 1) claim =====
+    worker_id = get_worker_id()
+    claimed = claim_due_items(due_items, worker_id=worker_id, now=now)
+    stats.skipped = len(due_items) - len(claimed)
+
+    batch = StatusBatch()
+
+    # ===== 1.5) coalesce (optional) =====
+    jobs = coalesce_items(claimed) if COALESCE else claimed
+
+    try:
+        # ===== 2) send + 3) record =====
+        if workers > 1 and len(jobs) > 1:
+            # max in-flight = ขนาด pool
+            executor = get_dispatch_executor(workers)
+            futures = {
+                executor.submit(_dispatch_in_worker, job, batch): job
+                for job in jobs
+            }
+            for future, job in futures.items():
+                try:
+                    outcomes = future.result()
+                except Exception:
+                    logger.exception("worker error on %s", job_label(job))
+                    outcomes = fail_job(job, batch)
+
+                for outcome in outcomes:
+                    stats.record(outcome)
+        else:
+            for job in jobs:
+                for outcome in process_job(job, batch):
+                    stats.record(outcome)
+    finally:
+        batch.flush()
+
+    stats.duration = time.monotonic() - started
+    record_tick_metrics(stats)
+    notification_stats.recompute_if_stale()
+
+    if stats.due:
+        logger.info(
+            "tick done: %d items in %.2fs", stats.due, stats.duration,
+            extra={
+                "due": stats.due,
+                "success": stats.success,
+                "failure": stats.failure,
+                "deferred": stats.deferred,
+                "skipped": stats.skipped,
+                "workers": stats.workers,
+                "duration_s": round(stats.duration, 3),
+                "items_per_s": round(stats.throughput, 1),
+                "status_writes": batch.statements,
+            },
+        )
+
+    return stats
 
-    for item in due_items:
-        print(f"[ENGINE] Processing notification {item.notification.id}")
-        process_due_item(item)
 
+def record_tick_metrics(stats: TickStats):
+    # ต่อ tick ไม่ใช่ต่อรายการ -> overhead ต่ำ
+    metrics.TICKS.inc()
+    metrics.TICK_DURATION.observe(stats.duration)
+    metrics.DUE_ITEMS.observe(stats.due)
 
-@transaction.atomic
-def process_due_item(item: DueItem):
+    for outcome in (SUCCESS, FAILURE, DEFERRED, SKIPPED):
+        count = getattr(stats, outcome)
+        if count:
+            metrics.OUTCOMES.labels(outcome).inc(count)
+
+
+def process_due_item(item: DueItem, batch: StatusBatch | None = None) -> str:
+    """
+    ส่งรายการที่ claim แล้ว (ไม่มี transaction เปิดค้างระหว่างรอ network)
+    แล้วบันทึกผลลง batch (หรือ save ทันทีถ้าไม่ส่ง batch มา)
+    - target_type = user -> ส่งหาเจ้าของ
+    - อื่น ๆ -> fan_out() ไปทุกผู้รับ
+    """
+    n = item.notification
+
+    if n.id not in mark_send_started([n]):
+        return SKIPPED
+
+    if n.target_type == "user":
+        outcome, retry_after = send_to_chat(item, None, batch)
+    else:
+        outcome, retry_after = fan_out(item, batch)
+
+    if outcome == SKIPPED:
+        return SKIPPED
+    if outcome == SUCCESS:
+        handle_success(item, batch)
+    elif outcome == DEFERRED:
+        handle_deferral(n, retry_after, batch)
+    else:
+        handle_failure(n, batch)
+
+    return outcome
+
+
+def process_digest(digest: Digest, batch: StatusBatch | None = None) -> list[str]:
+    """
+    ส่งหลายรายการของ chat เดียวกันเป็นข้อความ digest (แบ่งตาม 4096 ตัวอักษร)
+    แล้วบันทึกผลแยกต่อ notification
+
+    - ข้อความที่มีรายการนั้นส่งไม่สำเร็จ -> รายการนั้น failure
+    - ติด rate limit กลางทาง -> รายการที่ยังส่งไม่ครบ deferred
+    """
+    started = mark_send_started([item.notification for item in digest.items])
+    skipped = [SKIPPED for item in digest.items if item.notification.id not in started]
+    digest = Digest(
+        chat_id=digest.chat_id,
+        items=[item for item in digest.items if item.notification.id in started],
+    )
+    if not digest.items:
+        return skipped
+
+    logger.debug("sending digest", extra={"chat_id": digest.chat_id, "items": len(digest.items)})
+
+    outcomes: dict[int, str] = {}
+    results: dict[int, SendResult] = {}
+    retry_after = 0
+    deferred_result = None
+
+    for message in render_digest(digest):
+        ids = {id(item) for item in message.items}
+
+        if deferred_result is not None:
+            result, outcome = deferred_result, DEFERRED
+        else:
+            try:
+                result = send_message(digest.chat_id, message.text)
+                outcome = SUCCESS if result.ok else FAILURE
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                result = SendResult(chat_id=e.chat_id, http_status=e.http_status, error=str(e))
+                deferred_result, outcome = result, DEFERRED
+
+        # รายการที่ถูกตัดข้ามหลายข้อความ -> ใช้ผลที่แย่ที่สุด (failure > deferred > success)
+        for key in ids:
+            if key not in outcomes or OUTCOME_RANK[outcome] > OUTCOME_RANK[outcomes[key]]:
+                outcomes[key] = outcome
+                results[key] = result
+
+    final = []
+    for item in digest.items:
+        n = item.notification
+        outcome = outcomes.get(id(item), FAILURE)
+        record_delivery(item, outcome, results.get(id(item)), n.retry_count + 1, batch)
+
+        if outcome == SUCCESS:
+            handle_success(item, batch)
+        elif outcome == DEFERRED:
+            handle_deferral(n, retry_after, batch)
+        else:
+            handle_failure(n, batch)
+        final.append(outcome)
+
+    return final + skipped
+
+
+def send_to_chat(item: DueItem, chat_id=None, batch: StatusBatch | None = None) -> tuple[str, float]:
+    """
+    ส่ง 1 ครั้งไป 1 chat + บันทึก NotificationDelivery
+    คืน (outcome, retry_after)
+    """
     n = item.notification
+    retry_after = 0
 
     try:
-        success = send_telegram_message(n)
-        if success:
-            handle_success(item)
+        result = send_notification(n, chat_id=chat_id)
+        outcome = SUCCESS if result.ok else FAILURE
+    except RetryAfter as e:
+        outcome = DEFERRED
+        retry_after = e.retry_after
+        result = SendResult(chat_id=e.chat_id, http_status=e.http_status, error=str(e))
+    except Exception as e:
+        outcome = FAILURE
+        result = SendResult(chat_id=chat_id, error=str(e)[:500])
+
+    record_delivery(item, outcome, result, n.retry_count + 1, batch)
+    return outcome, retry_after
+
+
+def get_recipients(n: Notification):
+    """
+    queryset ของผู้รับตาม target_type (ยังไม่ execute)
+    """
+    qs = User.objects.filter(is_active=True)
+
+    if n.target_type == "department":
+        qs = qs.filter(department=n.target_department)
+    elif n.target_type == "group":
+        # group ถูกลบ (SET_NULL) -> ไม่มีผู้รับ
+        if n.target_group_id is None:
+            return qs.none()
+        qs = qs.filter(groups=n.target_group_id)
+    elif n.target_type == "user":
+        qs = qs.filter(id=n.user_id)
+
+    return qs.exclude(telegram_chat_id__isnull=True).exclude(telegram_chat_id="")
+
+
+def iter_recipient_chunks(n: Notification, chunk_size: int = FANOUT_CHUNK_SIZE):
+    """
+    stream chat_id ของผู้รับทีละ chunk แบบ keyset (WHERE chat_id > last ORDER BY chat_id)
+    - distinct chat_id -> user ที่ใช้ chat เดียวกันได้ข้อความครั้งเดียว
+    """
+    qs = (
+        get_recipients(n)
+        .order_by("telegram_chat_id")
+        .values_list("telegram_chat_id", flat=True)
+        .distinct()
+    )
+
+    last = None
+    while True:
+        page = qs if last is None else qs.filter(telegram_chat_id__gt=last)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def fan_out(item: DueItem, batch: StatusBatch | None = None) -> tuple[str, float]:
+    """
+    ส่ง broadcast (department / group / all) ทีละ chunk ของผู้รับ
+
+    - chat ที่ส่งสำเร็จแล้วในรอบนี้ (NotificationDelivery success ของ event_at เดียวกัน) ข้ามไป
+      -> retry รอบหลังส่งเฉพาะ chat ที่ล้มเหลว
+    - ต่อ lease ทุก chunk (broadcast ใหญ่อาจใช้เวลานานกว่า LEASE_SECONDS)
+      ต่อไม่สำเร็จ (lease หลุด) -> หยุดส่ง คืน SKIPPED (ผู้ที่ถือ lease อยู่เป็นคนบันทึกผล)
+
+    ผลรวม: มี failure -> FAILURE / ไม่มี failure แต่ติด rate limit -> DEFERRED / ครบ -> SUCCESS
+    """
+    n = item.notification
+    failed = deferred = sent = 0
+    retry_after = 0
+
+    for chunk in iter_recipient_chunks(n):
+        delivered = set(
+            NotificationDelivery.objects
+            .filter(notification=n, event_at=item.event_at, outcome="success", chat_id__in=chunk)
+            .values_list("chat_id", flat=True)
+        )
+
+        for chat_id in chunk:
+            if chat_id in delivered:
+                continue
+
+            outcome, wait = send_to_chat(item, chat_id, batch)
+            if outcome == SUCCESS:
+                sent += 1
+            elif outcome == DEFERRED:
+                deferred += 1
+                retry_after = max(retry_after, wait)
+            else:
+                failed += 1
+
+        # ผลของ chunk นี้ต้องลง DB ก่อน retry รอบหน้าจะมาเช็ค
+        if batch is not None:
+            batch.flush_deliveries()
+        if not renew_lease(n):
+            logger.warning("lease lost during fan-out, stopping", extra={"notification_id": n.id, "sent": sent})
+            return SKIPPED, 0
+
+    logger.info(
+        "fan-out done",
+        extra={
+            "notification_id": n.id,
+            "target_type": n.target_type,
+            "sent": sent,
+            "failed": failed,
+            "deferred": deferred,
+        },
+    )
+
+    if failed:
+        return FAILURE, 0
+    if deferred:
+        return DEFERRED, retry_after
+    return SUCCESS, 0
+
+
+def mark_send_started(notifications: list[Notification]) -> set[int]:
+    """
+    ตั้ง send_started_at ก่อนยิง request แรก (แยก "claim แล้ว" กับ "เริ่มส่งแล้ว")
+    - worker ตายก่อนจุดนี้ -> recover_expired_leases ปล่อยให้ส่งใหม่ (ยังไม่เคยส่ง)
+    - worker ตายหลังจุดนี้ -> ไม่รู้ว่า Telegram ได้รับหรือยัง -> ไม่ส่งซ้ำ (at-most-once)
+    ต่อ lease ไปพร้อมกัน (รายการท้ายคิวของ tick ใหญ่ไม่หมดอายุระหว่างรอ)
+    คืน id ที่ส่งต่อได้ (lease หลุด / ถูกแก้ไข / ถูกเก็บกวาดระหว่างรอคิว -> ไม่ส่ง)
+    """
+    # ไม่ได้ claim ผ่าน lease (เรียกตรง) -> ส่งได้เลย
+    started = {n.id for n in notifications if not n.lease_owner}
+    leased = {n.id: n for n in notifications if n.lease_owner}
+    if not leased:
+        return started
+
+    owner = next(iter(leased.values())).lease_owner
+    started_at = timezone.now()
+    expires_at = started_at + timedelta(seconds=LEASE_SECONDS)
+
+    # lease เดิมต้องยังอยู่ครบ (owner + expires_at) -> worker อื่นที่เก็บกวาดไปแล้วจะเปลี่ยน expires_at
+    still_ours = Q()
+    for n in leased.values():
+        still_ours |= Q(id=n.id, lease_owner=n.lease_owner, lease_expires_at=n.lease_expires_at)
+
+    updated = retry_on_lock(
+        Notification.objects
+        .filter(still_ours)
+        .update
+    )(send_started_at=started_at, lease_expires_at=expires_at)
+
+    if updated == len(leased):
+        marked = set(leased)
+    else:
+        marked = set(
+            Notification.objects
+            .filter(id__in=leased.keys(), lease_owner=owner, lease_expires_at=expires_at)
+            .values_list("id", flat=True)
+        )
+
+    for nid, n in leased.items():
+        if nid in marked:
+            n.send_started_at = started_at
+            n.lease_expires_at = expires_at
         else:
-            handle_failure(n)
+            logger.warning("lease lost before send, skipping", extra={"notification_id": nid})
 
-    except Exception:
-        handle_failure(n)
+    return started | marked
+
+
+def renew_lease(n: Notification) -> bool:
+    """
+    ต่ออายุ lease (เงื่อนไข: ยังเป็น lease เดิม owner + expires_at ตรงกัน)
+    คืน False ถ้า lease หลุดไปแล้ว -> ห้ามส่งต่อ
+    """
+    if not n.lease_owner:
+        return True
+
+    expires_at = timezone.now() + timedelta(seconds=LEASE_SECONDS)
+    renewed = retry_on_lock(
+        Notification.objects
+        .filter(id=n.id, lease_owner=n.lease_owner, lease_expires_at=n.lease_expires_at)
+        .update
+    )(lease_expires_at=expires_at)
+    if renewed:
+        n.lease_expires_at = expires_at
+    return bool(renewed)
+
+
+def claim_due_items(items: list[DueItem], worker_id=None, now=None) -> list[DueItem]:
+    """
+    claim ด้วย conditional UPDATE (1 statement ต่อ chunk):
+    ตั้ง sending_event_at + lease_owner + lease_expires_at เฉพาะแถวที่ยังไม่มีใครถือ
+
+    UPDATE ... WHERE sending_event_at IS NULL เป็น atomic ระดับแถว
+    -> worker หลายตัวแย่งแถวเดียวกัน จะได้แค่ตัวเดียว
+    คืนเฉพาะรายการที่ claim สำเร็จ
+    """
+    worker_id = worker_id or get_worker_id()
+    now = now or timezone.now()
+
+    # expires_at ของรอบนี้ใช้เป็น token ตรวจว่าแถวไหนเป็นของเราจริง
+    expires_at = now + timedelta(seconds=LEASE_SECONDS)
+
+    claimed: list[DueItem] = []
+
+    for i in range(0, len(items), STATUS_FLUSH_SIZE):
+        chunk = {item.notification.id: item for item in items[i:i + STATUS_FLUSH_SIZE]}
+
+        unclaimed = Notification.objects.filter(
+            id__in=chunk.keys(),
+            status="pending",
+            sending_event_at__isnull=True,
+        )
+        retry_on_lock(unclaimed.update)(
+            sending_event_at=Case(
+                *[When(id=nid, then=Value(item.event_at)) for nid, item in chunk.items()],
+                output_field=DateTimeField(),
+            ),
+            lease_owner=worker_id,
+            lease_expires_at=expires_at,
+        )
+
+        # อ่านกลับว่าแถวไหน claim ได้จริง (worker อื่นได้ไป / ถูกแก้ไข/ลบระหว่างนั้น -> ไม่ได้)
+        rows = (
+            Notification.objects
+            .filter(id__in=chunk.keys(), lease_owner=worker_id, lease_expires_at=expires_at)
+            .values_list("id", "sending_event_at")
+        )
+        for nid, sending_event_at in rows:
+            item = chunk[nid]
+            if sending_event_at == item.event_at:
+                item.notification.sending_event_at = sending_event_at
+                item.notification.lease_owner = worker_id
+                item.notification.lease_expires_at = expires_at
+                claimed.append(item)
+
+    return claimed
+
+
+def recover_expired_leases(now=None) -> int:
+    """
+    lease หมดอายุ = worker ตายหลัง claim แต่ก่อนบันทึกผล
+    - send_started_at ว่าง (claim แล้วแต่ยังไม่ได้ยิง) -> ปล่อย lease ให้หยิบไปส่งใหม่ตาม next_fire_at เดิม
+    - broadcast ที่เริ่มส่งแล้ว -> ปล่อย lease เหมือนกัน ให้ fan_out ทำต่อ
+      (ข้าม chat ที่มี delivery success ของรอบนี้แล้ว ส่งซ้ำได้ไม่เกิน chunk ที่ค้างตอน worker ตาย)
+    - ส่งหาคนเดียวที่เริ่มส่งแล้ว -> ไม่รู้ว่า Telegram ได้รับไปแล้วหรือยัง -> ถือว่าส่งแล้ว (at-most-once) ไม่ส่งซ้ำ
+    คืนจำนวนแถวที่เก็บกวาด
+
+    ใช้ index lease_expires_at -> ถ้าไม่มีอะไรค้างก็เป็น query เปล่า ๆ ที่ถูกมาก
+    """
+    now = now or timezone.now()
 
+    qs = (
+        Notification.objects
+        .filter(lease_expires_at__lt=now, sending_event_at__isnull=False)
+        .select_related("user")
+    )
 
-def handle_success(item: DueItem):
+    batch = StatusBatch()
+    recovered = 0
+
+    for n in qs:
+        # กันชนกับ worker อื่นที่เก็บกวาดแถวเดียวกันพร้อมกัน
+        expires_at = now + timedelta(seconds=LEASE_SECONDS)
+        taken = retry_on_lock(
+            Notification.objects
+            .filter(id=n.id, lease_owner=n.lease_owner, lease_expires_at=n.lease_expires_at)
+            .update
+        )(lease_expires_at=expires_at)
+        if not taken:
+            continue
+        n.lease_expires_at = expires_at
+
+        if n.send_started_at is None:
+            logger.warning(
+                "lease expired before send -> releasing for resend",
+                extra={"notification_id": n.id, "worker": n.lease_owner, "event_at": n.sending_event_at},
+            )
+            lease = release_lease(n)
+            _persist(n, RELEASE_FIELDS, batch, lease=lease)
+            recovered += 1
+            continue
+
+        if n.target_type != "user":
+            logger.warning(
+                "broadcast lease expired mid fan-out -> releasing to resume",
+                extra={"notification_id": n.id, "worker": n.lease_owner, "event_at": n.sending_event_at},
+            )
+            lease = release_lease(n)
+            _persist(n, RELEASE_FIELDS, batch, lease=lease)
+            recovered += 1
+            continue
+
+        logger.warning(
+            "lease expired -> marking as sent, not resending",
+            extra={"notification_id": n.id, "worker": n.lease_owner, "event_at": n.sending_event_at},
+        )
+        item = DueItem(
+            notification=n,
+            event_at=n.sending_event_at,
+            send_at=n.sending_event_at,
+        )
+        record_delivery(
+            item,
+            "recovered",
+            SendResult(chat_id=n.user.telegram_chat_id, error="lease expired before result was recorded"),
+            n.retry_count + 1,
+            batch,
+        )
+        handle_success(item, batch)
+        recovered += 1
+
+    batch.flush()
+    return recovered
+
+
+def handle_success(item: DueItem, batch: StatusBatch | None = None):
     n = item.notification
+    lease = release_lease(n)
 
     # ===== one_time =====
     if n.event_type == "one_time":
+        deltas = notification_stats.status_deltas(n.status, "success")
         n.status = "success"
         n.last_sent_event_at = item.event_at
         n.retry_count = 0
-        n.save(update_fields=[
+        n.next_fire_at = None
+        _persist(n, [
             "status",
             "last_sent_event_at",
             "retry_count",
-        ])
+            "next_fire_at",
+        ] + RELEASE_FIELDS, batch, deltas, lease)
         return
 
     # ===== recurring =====
@@ -104,23 +1000,56 @@ def handle_success(item: DueItem):
 
     schedule_next_run(n)
     n.status = "pending"
+    n.next_fire_at = compute_next_fire_at(n)
 
-    n.save(update_fields=[
+    _persist(n, [
         "last_sent_event_at",
         "retry_count",
         "start_datetime",
         "status",
-    ])
+        "next_fire_at",
+    ] + RELEASE_FIELDS, batch, lease=lease)
 
 
-def handle_failure(notification: Notification):
+def handle_failure(notification: Notification, batch: StatusBatch | None = None):
+    lease = release_lease(notification)
+
     if notification.retry_count < MAX_RETRY:
         notification.retry_count += 1
-        notification.save(update_fields=["retry_count"])
+        metrics.RETRIES.inc()
+        # next_fire_at = เวลาที่จะลองใหม่ (build_due_items ไม่หยิบก่อนเวลานี้)
+        notification.next_fire_at = timezone.now() + timedelta(
+            seconds=compute_retry_backoff(notification.retry_count)
+        )
+        _persist(notification, ["retry_count", "next_fire_at"] + RELEASE_FIELDS, batch, lease=lease)
         return
 
+    deltas = notification_stats.status_deltas(notification.status, "failure")
     notification.status = "failure"
-    notification.save(update_fields=["status"])
+    notification.next_fire_at = None
+    _persist(notification, ["status", "next_fire_at"] + RELEASE_FIELDS, batch, deltas, lease)
+
+
+def compute_retry_backoff(retry_count: int) -> float:
+    """
+    เวลารอ (วินาที) ก่อน retry ครั้งที่ retry_count
+    equal jitter: ครึ่งหนึ่งคงที่ + ครึ่งหนึ่งสุ่ม -> ไม่รอสั้นเกินไป และไม่ retry พร้อมกันทั้งก้อน
+    """
+    delay = min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2 ** max(retry_count - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def handle_deferral(notification: Notification, retry_after: float, batch: StatusBatch | None = None):
+    """
+    ติด rate limit -> เลื่อน next_fire_at ออกไป (ไม่เพิ่ม retry_count)
+    """
+    lease = release_lease(notification)
+    notification.next_fire_at = timezone.now() + timedelta(seconds=retry_after)
+    _persist(notification, ["next_fire_at"] + RELEASE_FIELDS, batch, lease=lease)
+    logger.info(
+        "deferred by rate limit",
+        extra={"notification_id": notification.id, "retry_after": round(retry_after, 1)},
+    )
 
 
 def schedule_next_run(notification: Notification):
@@ -0,0 +1,192 @@
+import base64
+import json
+import math
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# =========================
+# Keyset (seek) Pagination
+# =========================
+# แทน Paginator (COUNT(*) + OFFSET ทุกหน้า):
+# - หน้าถัดไป = WHERE (created_at, id) < (ค่าแถวสุดท้ายของหน้านี้) ORDER BY created_at DESC, id DESC LIMIT n+1
+#   -> ใช้ index seek ตรงไปตำแหน่งนั้นเลย หน้าลึกแค่ไหนก็เร็วเท่าหน้าแรก
+# - จำนวนทั้งหมด (ใช้แสดง x/y) เก็บใน cache ไม่ COUNT(*) ทุก request
+# - เลขหน้าส่งต่อกันใน URL (ไม่ได้คำนวณจาก offset)
+
+COUNT_CACHE_SECONDS = getattr(settings, "NOTIFY_COUNT_CACHE_SECONDS", 60)
+
+COUNT_KEY_PREFIX = "notify:count"
+
+
+def _encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(token: str):
+    """
+    cursor ผิดรูปแบบ -> None (กลับไปหน้าแรก)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        first, pk = json.loads(raw)
+        value = parse_datetime(first)
+        if value is None or not isinstance(pk, int):
+            return None
+        return value, pk
+    except (ValueError, TypeError):
+        return None
+
+
+def count_key(name: str) -> str:
+    return f"{COUNT_KEY_PREFIX}:{name}"
+
+
+def cached_count(qs, name: str, timeout: int = COUNT_CACHE_SECONDS) -> int:
+    """
+    COUNT(*) ครั้งแรก แล้วเก็บใน cache (ค่าอาจคลาดเคลื่อนได้ไม่เกิน timeout วินาที)
+    """
+    return cache.get_or_set(count_key(name), qs.count, timeout)
+
+
+def invalidate_counts(*names: str):
+    cache.delete_many([count_key(name) for name in names])
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    number: int
+    num_pages: int
+    count: int
+    prefix: str = ""
+    next_cursor: str | None = None
+    previous_cursor: str | None = None
+    current: dict = field(default_factory=dict)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def _params(self, **params) -> str:
+        return urlencode({f"{self.prefix}{k}": v for k, v in params.items()})
+
+    @property
+    def next_params(self) -> str:
+        return self._params(after=self.next_cursor, page=self.number + 1)
+
+    @property
+    def previous_params(self) -> str:
+        return self._params(before=self.previous_cursor, page=self.number - 1)
+
+    @property
+    def current_params(self) -> str:
+        """
+        query string ของหน้าปัจจุบัน (ใช้คงตำแหน่งของตารางนี้ไว้ตอนเปลี่ยนหน้าอีกตาราง)
+        """
+        return urlencode(self.current)
+
+
+def keyset_page(
+    request,
+    qs,
+    per_page: int,
+    ordering=("-created_at", "-id"),
+    prefix: str = "",
+    count_name: str | None = None,
+) -> KeysetPage:
+    """
+    อ่านหน้าจาก query string:
+      ?{prefix}after=<cursor>   -> หน้าถัดไป (แถวที่เก่ากว่า cursor)
+      ?{prefix}before=<cursor>  -> หน้าก่อนหน้า (แถวที่ใหม่กว่า cursor)
+      ?{prefix}page=<n>         -> เลขหน้าสำหรับแสดงผลเท่านั้น
+
+    ordering = (field เวลา, pk) เรียงจากมากไปน้อย และต้องมี index คู่กันใน Meta.indexes
+    """
+    time_field, pk_field = (name.lstrip("-") for name in ordering)
+
+    after = request.GET.get(f"{prefix}after")
+    before = request.GET.get(f"{prefix}before")
+    cursor = _decode_cursor(after or before or "")
+    backwards = cursor is not None and not after
+
+    try:
+        number = max(1, int(request.GET.get(f"{prefix}page", 1)))
+    except ValueError:
+        number = 1
+
+    if cursor is None:
+        number = 1
+        window = qs.order_by(f"-{time_field}", f"-{pk_field}")
+    else:
+        value, pk = cursor
+        if backwards:
+            # `time >= value` ทำให้ SQLite seek ด้วย range บน index ได้ (OR อย่างเดียวจะ scan)
+            window = qs.filter(
+                Q(**{f"{time_field}__gt": value}) | Q(**{time_field: value, f"{pk_field}__gt": pk}),
+                **{f"{time_field}__gte": value},
+            ).order_by(time_field, pk_field)
+        else:
+            window = qs.filter(
+                Q(**{f"{time_field}__lt": value}) | Q(**{time_field: value, f"{pk_field}__lt": pk}),
+                **{f"{time_field}__lte": value},
+            ).order_by(f"-{time_field}", f"-{pk_field}")
+
+    rows = list(window[:per_page + 1])
+    if cursor is not None and not rows:
+        # cursor ชี้เลยขอบ (แถวถูกลบไปแล้ว) -> กลับไปหน้าแรก
+        cursor, backwards, number = None, False, 1
+        rows = list(qs.order_by(f"-{time_field}", f"-{pk_field}")[:per_page + 1])
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_previous, has_next = more, True
+        if not more:
+            number = 1
+    else:
+        has_previous, has_next = cursor is not None, more
+
+    def key(obj):
+        return _encode_cursor([getattr(obj, time_field), getattr(obj, pk_field)])
+
+    count = cached_count(qs, count_name) if count_name else qs.count()
+    num_pages = math.ceil(count / per_page) if count else 0
+    # count จาก cache อาจเก่า -> อย่าให้เลขหน้าเกินจำนวนหน้าที่แสดง
+    if rows:
+        num_pages = max(num_pages, number + (1 if has_next else 0))
+
+    current = {}
+    if cursor is not None:
+        current = {
+            f"{prefix}{'before' if backwards else 'after'}": before if backwards else after,
+            f"{prefix}page": number,
+        }
+
+    return KeysetPage(
+        object_list=rows,
+        number=number if rows else 0,
+        num_pages=num_pages if rows else 0,
+        count=count,
+        prefix=prefix,
+        next_cursor=key(rows[-1]) if rows and has_next else None,
+        previous_cursor=key(rows[0]) if rows and has_previous else None,
+        current=current,
+    )
@@ -0,0 +1,218 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# =========================
+# Rate Limit Config
+# =========================
+# Telegram: ~30 msg/s ต่อ bot และ ~1 msg/s ต่อ chat
+
+GLOBAL_RATE = getattr(settings, "TELEGRAM_GLOBAL_RATE", 30)
+GLOBAL_BURST = getattr(settings, "TELEGRAM_GLOBAL_BURST", 30)
+CHAT_RATE = getattr(settings, "TELEGRAM_CHAT_RATE", 1)
+CHAT_BURST = getattr(settings, "TELEGRAM_CHAT_BURST", 3)
+
+# ถ้าต้องรอนานกว่านี้ -> ไม่ block worker แต่ให้ engine เลื่อนไปส่งรอบหลัง
+MAX_WAIT = getattr(settings, "TELEGRAM_RATE_LIMIT_MAX_WAIT", 5)
+
+# จำนวน chat bucket สูงสุดก่อนเก็บกวาด bucket ที่ไม่ได้ใช้
+MAX_CHAT_BUCKETS = 10_000
+
+
+class RetryAfter(Exception):
+    """
+    ส่งตอนนี้ไม่ได้เพราะติด rate limit (429 จาก Telegram หรือ bucket ในเครื่อง)
+    -> ไม่ใช่ failure, ให้เลื่อนไปส่งใหม่หลัง retry_after วินาที
+    """
+
+    def __init__(self, retry_after: float, chat_id=None, http_status=None):
+        super().__init__(f"retry after {retry_after:.1f}s (chat_id={chat_id})")
+        self.retry_after = retry_after
+        self.chat_id = chat_id
+        self.http_status = http_status
+
+
+class TokenBucket:
+    """
+    token bucket: เติม rate token/วินาที เก็บได้สูงสุด capacity
+    (ไม่ thread-safe เอง ใช้ภายใต้ lock ของ RateLimiter)
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        # now อาจเก่ากว่าเวลาสร้าง bucket เล็กน้อย (caller อ่านนาฬิกาก่อน) -> ไม่หัก token
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_time(self, now: float, tokens: int = 1) -> float:
+        """เวลาที่ต้องรอจนกว่าจะได้ token อันที่ `tokens` (ยังไม่หัก token)"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= tokens else (tokens - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def min_wait(self, tokens: int) -> float:
+        """เวลาที่ต้องรอแม้ bucket เต็ม (ขอ token มากกว่า capacity)"""
+        return max(0.0, (tokens - self.capacity) / self.rate)
+
+    def consume(self, tokens: int = 1):
+        # ยอมให้ติดลบได้ = จองคิวล่วงหน้า (caller ต้องรอตาม wait_time)
+        self.tokens -= tokens
+
+    def refund(self, tokens: int):
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def block(self, now: float, seconds: float):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class RateLimiter:
+    """
+    global bucket (ทั้ง bot) + bucket แยกต่อ chat_id
+    thread-safe: ใช้ร่วมกันได้ระหว่าง dispatch worker หลายตัว
+    """
+
+    def __init__(
+        self,
+        global_rate=GLOBAL_RATE,
+        global_burst=GLOBAL_BURST,
+        chat_rate=CHAT_RATE,
+        chat_burst=CHAT_BURST,
+        max_wait=MAX_WAIT,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_wait = max_wait
+        self.chat_buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        # chat_id -> เวลาของ token ที่จองไว้ (ต่อ thread ที่ถือ reservation)
+        self._local = threading.local()
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        key = str(chat_id)
+        bucket = self.chat_buckets.get(key)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self.chat_buckets = {
+                    k: b for k, b in self.chat_buckets.items() if not b.is_idle(now)
+                }
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[key] = bucket
+        return bucket
+
+    def _reserved_slots(self) -> dict[str, list[float]]:
+        slots = getattr(self._local, "slots", None)
+        if slots is None:
+            slots = self._local.slots = {}
+        return slots
+
+    def acquire(self, chat_id) -> float:
+        """
+        รอจนกว่าจะส่งหา chat_id ได้ คืนเวลาที่รอไป (วินาที)
+        - มี reservation ของ chat นี้ใน thread นี้ -> ใช้ token ที่จองไว้ (ไม่ raise)
+          token ที่จองหมดแล้ว (เช่น upload ใหม่หลัง file_id ถูกปฏิเสธ) -> รอ ไม่ raise
+          (ข้อความออกไปแล้ว ถ้า raise -> engine เลื่อนแล้วส่งข้อความซ้ำ)
+        - ถ้าต้องรอเกิน max_wait -> raise RetryAfter (ไม่หัก token)
+        """
+        reserved = self._reserved_slots().get(str(chat_id))
+        if reserved:
+            wait = max(0.0, reserved.pop(0) - time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+            return wait
+
+        with self._lock:
+            now = time.monotonic()
+            chat_bucket = self._chat_bucket(chat_id, now)
+            wait = max(
+                self.global_bucket.wait_time(now),
+                chat_bucket.wait_time(now),
+            )
+
+            if wait > self.max_wait and reserved is None:
+                raise RetryAfter(wait, chat_id)
+
+            self.global_bucket.consume()
+            chat_bucket.consume()
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    @contextmanager
+    def reservation(self, chat_id, tokens: int):
+        """
+        จอง token ทั้งหมดที่การส่ง 1 ครั้งต้องใช้ (ข้อความ + ไฟล์แนบ) ก่อนยิง request แรก
+        - token สุดท้ายต้องรอเกิน max_wait -> raise RetryAfter ก่อนส่งอะไรออกไป
+          (ไม่เกิดกรณีข้อความออกไปแล้วแต่ไฟล์แนบติด limit -> เลื่อนแล้วส่งข้อความซ้ำ)
+          จองมากกว่า burst -> ยอมรอส่วนที่ bucket เต็มแล้วก็ยังต้องรอเพิ่ม (ไม่งั้นเลื่อนไม่จบ)
+        - api_post ภายใน block ใช้ token ที่จองไว้ตามลำดับ
+        - token ที่จองแต่ไม่ได้ใช้ (ส่งล้มกลางทาง) คืนให้ bucket
+        """
+        key = str(chat_id)
+
+        with self._lock:
+            now = time.monotonic()
+            chat_bucket = self._chat_bucket(chat_id, now)
+            waits = [
+                max(
+                    self.global_bucket.wait_time(now, i),
+                    chat_bucket.wait_time(now, i),
+                )
+                for i in range(1, tokens + 1)
+            ]
+            slots = [now + w for w in waits]
+
+            unavoidable = max(self.global_bucket.min_wait(tokens), chat_bucket.min_wait(tokens))
+            wait = waits[-1]
+            if wait > self.max_wait + unavoidable:
+                raise RetryAfter(wait - unavoidable, chat_id)
+
+            self.global_bucket.consume(tokens)
+            chat_bucket.consume(tokens)
+
+        reserved = self._reserved_slots()
+        reserved[key] = slots
+        try:
+            yield
+        finally:
+            unused = len(reserved.pop(key, []))
+            if unused:
+                with self._lock:
+                    self.global_bucket.refund(unused)
+                    self._chat_bucket(chat_id, time.monotonic()).refund(unused)
+
+    def penalize(self, chat_id, retry_after: float):
+        """
+        Telegram ตอบ 429 -> หยุดส่งหา chat นี้จนครบ retry_after
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._chat_bucket(chat_id, now).block(now, retry_after)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
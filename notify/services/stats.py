@@ -0,0 +1,167 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from notify.models import Notification, NotificationStat
+from notify.services.db_retry import retry_on_lock
+
+logger = logging.getLogger("notify.engine")
+
+# =========================
+# Aggregate Stats (admin dashboard)
+# =========================
+# เก็บจำนวน notification แยกตาม status / department / event_type ในตาราง notification_stats
+# - อ่าน: SELECT แถวไม่กี่สิบแถว ไม่ GROUP BY ตาราง notifications ทุกครั้งที่เปิด dashboard
+# - เขียน: +/- ตอน create / edit / delete (views) และตอน engine เปลี่ยนสถานะ
+# - recompute ทั้งหมดทุก RECOMPUTE_SECONDS (แก้ค่าที่เพี้ยน เช่น process ตายก่อนบันทึก delta)
+
+RECOMPUTE_SECONDS = getattr(settings, "NOTIFY_STATS_RECOMPUTE_SECONDS", 3600)
+
+# dimension -> field ที่ใช้ GROUP BY ตอน recompute
+GROUP_FIELDS = {
+    "status": "status",
+    "department": "user__department",
+    "event_type": "event_type",
+}
+
+_last_recompute = 0.0
+
+
+def keys_for(n: Notification) -> list[tuple[str, str]]:
+    """
+    (dimension, value) ที่ notification นี้ถูกนับอยู่
+    """
+    return [
+        ("status", n.status),
+        ("department", n.user.department),
+        ("event_type", n.event_type),
+    ]
+
+
+def status_deltas(old: str, new: str) -> Counter:
+    return Counter({("status", old): -1, ("status", new): 1})
+
+
+def diff(before: list, after: list) -> Counter:
+    deltas = Counter(after)
+    deltas.subtract(before)
+    return deltas
+
+
+@retry_on_lock
+def apply_deltas(deltas: Counter):
+    deltas = {key: d for key, d in deltas.items() if d}
+    if not deltas:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        for (dimension, value), delta in sorted(deltas.items()):
+            row = NotificationStat.objects.filter(dimension=dimension, value=value)
+            if not row.update(count=F("count") + delta, updated_at=now):
+                NotificationStat.objects.get_or_create(dimension=dimension, value=value)
+                row.update(count=F("count") + delta, updated_at=now)
+
+
+# ===== views =====
+
+def track_created(n: Notification):
+    apply_deltas(Counter(keys_for(n)))
+
+
+def track_changed(before: list, n: Notification):
+    apply_deltas(diff(before, keys_for(n)))
+
+
+def track_deleted(n: Notification):
+    apply_deltas(diff(keys_for(n), []))
+
+
+def count_queryset(qs) -> Counter:
+    """
+    GROUP BY ของ queryset (ใช้ก่อนลบทีละหลายแถว เช่นลบ user -> notification ถูกลบตาม)
+    """
+    counts = Counter()
+    for dimension, field in GROUP_FIELDS.items():
+        for value, count in qs.order_by().values_list(field).annotate(count=Count("id")):
+            counts[(dimension, value or "")] = count
+    return counts
+
+
+def track_deleted_queryset(qs):
+    apply_deltas(diff(count_queryset(qs), []))
+
+
+# ===== read =====
+
+def get_stats() -> dict[str, dict[str, int]]:
+    stats = {dimension: {} for dimension in GROUP_FIELDS}
+    for dimension, value, count in NotificationStat.objects.values_list("dimension", "value", "count"):
+        stats.setdefault(dimension, {})[value] = count
+    return stats
+
+
+def labelled(stats: dict, dimension: str, choices) -> list[tuple[str, int]]:
+    """
+    [(label, count), ...] ตามลำดับของ choices (ค่าที่ไม่มีใน choices ต่อท้าย)
+    """
+    counts = dict(stats.get(dimension, {}))
+    rows = [(label, counts.pop(code, 0)) for code, label in choices]
+    rows += [(code or "-", count) for code, count in sorted(counts.items()) if count]
+    return rows
+
+
+# ===== drift correction =====
+
+def recompute() -> Counter | None:
+    """
+    นับใหม่ทั้งหมดแล้วแทนที่ตาราง
+    - GROUP BY ทั้งตารางทำนอก transaction -> ไม่ถือ write lock ของ SQLite ระหว่าง scan
+      (web ที่เขียนพร้อมกันไม่ติด "database is locked")
+    - มี delta เข้ามาระหว่างนับ -> ผลนับอาจไม่รวม delta นั้น -> ไม่เขียนทับ คืน None (tick ถัดไปลองใหม่)
+    """
+    global _last_recompute
+
+    started = timezone.now()
+    counts = count_queryset(Notification.objects.all())
+    if not _replace_counts(counts, started):
+        logger.info("stats changed during recompute, retrying later")
+        return None
+
+    _last_recompute = time.monotonic()
+    return counts
+
+
+@retry_on_lock
+def _replace_counts(counts: Counter, started) -> bool:
+    with transaction.atomic():
+        # apply_deltas ตั้ง updated_at ทุกครั้ง (อยู่ใต้ write lock เดียวกัน -> ไม่มีช่องให้แทรก)
+        if NotificationStat.objects.filter(updated_at__gte=started).exists():
+            return False
+        NotificationStat.objects.all().delete()
+        NotificationStat.objects.bulk_create([
+            NotificationStat(dimension=dimension, value=value, count=count)
+            for (dimension, value), count in counts.items()
+        ])
+    return True
+
+
+def recompute_if_stale(seconds: float = RECOMPUTE_SECONDS) -> bool:
+    """
+    เรียกท้าย engine tick: recompute ครั้งแรกหลัง process เริ่ม แล้วทุก ๆ seconds วินาที
+    """
+    if not seconds:
+        return False
+    if _last_recompute and time.monotonic() - _last_recompute < seconds:
+        return False
+
+    try:
+        return recompute() is not None
+    except Exception:
+        logger.exception("stats recompute failed")
+        return False
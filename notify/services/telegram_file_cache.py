@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+
+from django.db import IntegrityError
+from django.utils import timezone
+
+from notify.models import TelegramFile
+
+# =========================
+# Telegram file_id cache
+# =========================
+# upload ครั้งแรก -> เก็บ file_id ไว้ตาม sha256 ของเนื้อไฟล์
+# ครั้งถัดไป -> ส่ง file_id แทน (ไม่ต้อง upload ซ้ำ)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# sha256 ต่อ (path, size, mtime) -> ไม่ต้องอ่านไฟล์ทั้งก้อนทุกครั้งที่ส่ง
+_digests: dict[tuple, str] = {}
+_digests_lock = threading.Lock()
+MAX_DIGESTS = 10_000
+
+
+def file_digest(file_path: str) -> str:
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_size, stat.st_mtime_ns)
+
+    digest = _digests.get(key)
+    if digest:
+        return digest
+
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _digests_lock:
+        if len(_digests) >= MAX_DIGESTS:
+            _digests.clear()
+        _digests[key] = digest
+    return digest
+
+
+def get_file_id(digest: str, kind: str) -> str | None:
+    return (
+        TelegramFile.objects
+        .filter(sha256=digest, kind=kind)
+        .values_list("file_id", flat=True)
+        .first()
+    )
+
+
+def get_file_ids(digests: list[str], kind: str) -> dict[str, str]:
+    return dict(
+        TelegramFile.objects
+        .filter(sha256__in=digests, kind=kind)
+        .values_list("sha256", "file_id")
+    )
+
+
+def remember_file_id(digest: str, kind: str, file_id: str, file_size=None):
+    updated = TelegramFile.objects.filter(sha256=digest, kind=kind).update(
+        file_id=file_id,
+        file_size=file_size,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        return
+
+    try:
+        TelegramFile.objects.create(sha256=digest, kind=kind, file_id=file_id, file_size=file_size)
+    except IntegrityError:
+        # worker อื่น upload ไฟล์เดียวกันพร้อมกัน -> ใช้ของใครก็ได้
+        pass
+
+
+def forget_file_id(digest: str, kind: str):
+    """Telegram ไม่รับ file_id นี้แล้ว -> ลบทิ้ง รอบหน้า upload ใหม่"""
+    TelegramFile.objects.filter(sha256=digest, kind=kind).delete()
+
+
+def extract_file_id(kind: str, resp_json: dict) -> tuple[str | None, int | None]:
+    """
+    file_id จาก response ของ sendPhoto / sendDocument
+    - photo: Telegram คืนหลายขนาด -> ใช้อันใหญ่สุด (ตัวสุดท้าย)
+    """
+    result = resp_json.get("result") or {}
+    media = result.get(kind)
+
+    if kind == "photo" and isinstance(media, list):
+        media = media[-1] if media else None
+
+    if not isinstance(media, dict):
+        return None, None
+    return media.get("file_id"), media.get("file_size")
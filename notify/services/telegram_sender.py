@@ -1,107 +1,363 @@
 import os
+import json
+import logging
 import mimetypes
+import random
+import threading
+import time
+from dataclasses import dataclass
+
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
+from notify.log import truncate
+from notify.services import metrics
+from notify.services.rate_limiter import RetryAfter, get_rate_limiter
+from notify.services.telegram_file_cache import (
+    extract_file_id,
+    file_digest,
+    forget_file_id,
+    get_file_id,
+    get_file_ids,
+    remember_file_id,
+)
+
 # =========================
 # Telegram Config
 # =========================
 
 BOT_TOKEN = getattr(settings, "TELEGRAM_BOT_TOKEN", "")
 
+# ชี้ไป fake server ได้ (`python manage.py run_fake_telegram`) สำหรับ load test
+API_BASE_URL = getattr(settings, "TELEGRAM_API_BASE_URL", "https://api.telegram.org").rstrip("/")
+
 BASE_URL = (
-    f"https://api.telegram.org/bot{BOT_TOKEN}"
+    f"{API_BASE_URL}/bot{BOT_TOKEN}"
     if BOT_TOKEN
     else None
 )
 
 DEFAULT_MESSAGE = "📢 คุณมีการแจ้งเตือนใหม่"
 
+logger = logging.getLogger("notify.telegram")
+
+# log: response body ยาวสุดกี่ตัวอักษร / สุ่มเก็บ body ของ request ที่สำเร็จกี่ % (0-1)
+LOG_BODY_CHARS = getattr(settings, "TELEGRAM_LOG_BODY_CHARS", 300)
+LOG_BODY_SAMPLE = getattr(settings, "TELEGRAM_LOG_BODY_SAMPLE", 0)
 
 # =========================
-# Main Sender
+# HTTP Session (connection pool + keep-alive)
 # =========================
 
-def send_telegram_message(notification) -> bool:
-    if not BOT_TOKEN or not BASE_URL:
-        print("[TG] ❌ Missing BOT_TOKEN")
-        return False
+POOL_SIZE = getattr(settings, "TELEGRAM_POOL_SIZE", 10)
 
-    user = notification.user
-    if not user.telegram_chat_id:
-        print("[TG] ❌ Missing chat_id")
-        return False
+# timeout = (connect, read) วินาที
+CONNECT_TIMEOUT = getattr(settings, "TELEGRAM_CONNECT_TIMEOUT", 5)
+TEXT_TIMEOUT = (CONNECT_TIMEOUT, getattr(settings, "TELEGRAM_TEXT_TIMEOUT", 10))
+FILE_TIMEOUT = (CONNECT_TIMEOUT, getattr(settings, "TELEGRAM_FILE_TIMEOUT", 20))
+
+# ไม่ใช้ proxy จาก environment (เหมือนเดิมที่ส่ง proxies=None ทุก request)
+NO_PROXIES = {"http": None, "https": None}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """
+    สร้าง requests.Session ที่มี connection pool
+    - keep-alive: ใช้ TCP/TLS connection เดิมซ้ำ ไม่ต้อง handshake ใหม่ทุกข้อความ
+    - pool_maxsize ควร >= NOTIFY_DISPATCH_WORKERS
+    - max_retries=0: การ retry เป็นหน้าที่ของ engine
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=pool_size,
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-    message_text = notification.description or DEFAULT_MESSAGE
 
+def get_session() -> requests.Session:
+    """
+    Session กลางของ module (สร้างครั้งแรกที่ใช้)
+    ใช้ร่วมกันได้หลาย thread: pool ของ urllib3 เป็น thread-safe
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def api_post(endpoint: str, chat_id, timeout=TEXT_TIMEOUT, **kwargs) -> requests.Response:
+    """
+    POST ไป Bot API ผ่าน rate limiter
+    - 429 -> raise RetryAfter (ให้ engine เลื่อนส่ง ไม่นับเป็น failure)
+    """
+    get_rate_limiter().acquire(chat_id)
+
+    started = time.perf_counter()
     try:
-        resp = requests.post(
-        f"{BASE_URL}/sendMessage",
-        json={
-            "chat_id": user.telegram_chat_id,
-            "text": message_text,
+        resp = get_session().post(
+            f"{BASE_URL}/{endpoint}",
+            timeout=timeout,
+            proxies=NO_PROXIES,
+            **kwargs,
+        )
+    except requests.RequestException:
+        metrics.HTTP_RESPONSES.labels(endpoint, "error").inc()
+        raise
+
+    elapsed = time.perf_counter() - started
+    metrics.SEND_LATENCY.labels(endpoint).observe(elapsed)
+    metrics.HTTP_RESPONSES.labels(endpoint, resp.status_code).inc()
+    log_response(endpoint, chat_id, resp, elapsed)
+
+    if resp.status_code == 429:
+        retry_after = parse_retry_after(resp)
+        get_rate_limiter().penalize(chat_id, retry_after)
+        logger.warning("rate limited (429)", extra={"chat_id": chat_id, "retry_after": retry_after})
+        raise RetryAfter(retry_after, chat_id, http_status=429)
+
+    return resp
+
+
+def log_response(endpoint: str, chat_id, resp: requests.Response, elapsed: float):
+    """
+    1 บรรทัดต่อ request
+    - สำเร็จ: DEBUG, body สุ่มเก็บตาม LOG_BODY_SAMPLE
+    - ไม่สำเร็จ: WARNING, body ตัดเหลือ LOG_BODY_CHARS เสมอ
+    """
+    ok = resp.status_code == 200
+    level = logging.DEBUG if ok else logging.WARNING
+    if not logger.isEnabledFor(level):
+        return
+
+    body = None
+    if not ok or (LOG_BODY_SAMPLE and random.random() < LOG_BODY_SAMPLE):
+        body = truncate(resp.text, LOG_BODY_CHARS)
+
+    logger.log(
+        level,
+        "%s -> %s", endpoint, resp.status_code,
+        extra={
+            "chat_id": chat_id,
+            "latency_ms": round(elapsed * 1000, 1),
+            "endpoint": endpoint,
+            "http_status": resp.status_code,
+            "body": body,
         },
-        timeout=10,
-        proxies={"http": None, "https": None},
     )
 
 
-        print("[TG] status:", resp.status_code)
-        print("[TG] response:", resp.text)
+def parse_retry_after(resp: requests.Response, default: float = 5) -> float:
+    """
+    อ่าน parameters.retry_after จาก body ของ 429
+    """
+    try:
+        retry_after = resp.json().get("parameters", {}).get("retry_after")
+    except ValueError:
+        retry_after = None
+
+    if retry_after is None:
+        retry_after = resp.headers.get("Retry-After", default)
+
+    try:
+        return max(float(retry_after), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+# =========================
+# Main Sender
+# =========================
+
+@dataclass
+class SendResult:
+    """
+    ผลการส่ง notification 1 ครั้ง (ข้อความ + ไฟล์แนบ) ไป 1 chat
+    ใช้บันทึกลง NotificationDelivery
+    """
+    ok: bool = False
+    chat_id: str | None = None
+    endpoint: str = ""
+    http_status: int | None = None
+    latency_ms: float = 0.0
+    message_id: int | None = None
+    error: str = ""
 
+    def add_response(self, endpoint: str, resp: requests.Response):
+        self.endpoint = endpoint
+        self.http_status = resp.status_code
+        self.latency_ms += resp.elapsed.total_seconds() * 1000
         if resp.status_code != 200:
-            return False
+            self.error = resp.text[:500]
+
+
+def send_telegram_message(notification) -> bool:
+    """
+    ส่งข้อความ (+ ไฟล์แนบ) ของ notification
+    - ติด rate limit -> raise RetryAfter
+    """
+    return send_notification(notification).ok
+
 
-        # =====================
-        # 2. Send File (optional)
-        # =====================
-        if notification.file:
-            file_ok = send_file_by_notification(
-                notification=notification,
-                chat_id=user.telegram_chat_id,
+def send_notification(notification, chat_id=None) -> SendResult:
+    """
+    เหมือน send_telegram_message แต่คืนรายละเอียด (status / latency / message_id)
+    - chat_id: ผู้รับ (broadcast) / None = เจ้าของ notification
+    - ติด rate limit -> raise RetryAfter
+    """
+    if not BOT_TOKEN or not BASE_URL:
+        logger.error("missing TELEGRAM_BOT_TOKEN")
+        return SendResult(chat_id=chat_id, error="Missing BOT_TOKEN")
+
+    chat_id = chat_id or notification.user.telegram_chat_id
+    if not chat_id:
+        logger.warning("missing chat_id", extra={"notification_id": notification.id})
+        return SendResult(error="Missing chat_id")
+
+    message_text = notification.description or DEFAULT_MESSAGE
+    result = SendResult(chat_id=chat_id)
+
+    # ไฟล์แนบหายก่อนส่ง -> ไม่ส่งอะไรเลย (ไม่ให้ข้อความออกไปแล้ว retry ส่งซ้ำ)
+    paths = attachment_paths(notification)
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        logger.error("attachment not found", extra={"chat_id": chat_id, "path": missing[0]})
+        result.error = "File not found"
+        return result
+
+    groups = group_media(paths)
+
+    try:
+        # ข้อความ + ไฟล์แนบทุกกลุ่ม จอง rate limit ทีเดียว (ติด limit -> RetryAfter ก่อน request แรก)
+        with get_rate_limiter().reservation(chat_id, 1 + len(groups)):
+            resp = api_post(
+                "sendMessage",
+                chat_id=chat_id,
+                json={
+                    "chat_id": chat_id,
+                    "text": message_text,
+                },
             )
-            if not file_ok:
-                print("[TG] ❌ File send failed")
-                return False
+            result.add_response("sendMessage", resp)
+            result.message_id = _message_id(resp)
 
-        print("[TG] ✅ Sent successfully")
-        return True
+            if resp.status_code != 200:
+                return result
+
+            # =====================
+            # 2. Send Files (optional)
+            # =====================
+            caption = notification.description or ""
+            for group in groups:
+                if len(group) == 1:
+                    endpoint, file_resp = _post_file(chat_id, group[0], caption)
+                else:
+                    endpoint, file_resp = _post_media_group(chat_id, group, caption)
+                result.add_response(endpoint, file_resp)
+
+                if file_resp.status_code != 200:
+                    return result
+
+                # caption แสดงครั้งเดียวพอ
+                caption = ""
+
+        result.ok = True
+        return result
+
+    except RetryAfter:
+        raise
 
     except Exception as e:
-        print("[TG] ❌ Exception:", str(e))
-        return False
+        logger.warning("send failed: %s", e, extra={"chat_id": chat_id})
+        result.error = str(e)[:500]
+        return result
+
+
+def _message_id(resp: requests.Response):
+    try:
+        return resp.json().get("result", {}).get("message_id")
+    except ValueError:
+        return None
 
 # =========================
 # Send Helpers
 # =========================
 
 def send_text(chat_id: str, text: str) -> bool:
-    response = requests.post(
-        f"{BASE_URL}/sendMessage",
+    response = api_post(
+        "sendMessage",
+        chat_id=chat_id,
         json={
             "chat_id": chat_id,
             "text": text,
         },
-        timeout=10,
     )
     return response.status_code == 200
 
-def send_file_by_notification(notification, chat_id: str) -> bool:
+def send_message(chat_id: str, text: str) -> SendResult:
     """
-    wrapper สำหรับ notification.file
+    เหมือน send_text แต่คืน SendResult (ใช้กับ digest)
+    - ติด rate limit -> raise RetryAfter
     """
-    if not notification.file:
-        return True
+    result = SendResult(chat_id=chat_id)
 
-    # file ใน DB = relative path
-    full_path = os.path.join(settings.MEDIA_ROOT, notification.file)
+    try:
+        resp = api_post(
+            "sendMessage",
+            chat_id=chat_id,
+            json={
+                "chat_id": chat_id,
+                "text": text,
+            },
+        )
+        result.add_response("sendMessage", resp)
+        result.message_id = _message_id(resp)
+        result.ok = resp.status_code == 200
+        if not result.ok:
+            result.error = resp.text[:500]
 
-    if not os.path.exists(full_path):
-        print(f"[TG] ❌ File not found: {full_path}")
-        return False
+    except RetryAfter:
+        raise
+
+    except Exception as e:
+        logger.warning("send failed: %s", e, extra={"chat_id": chat_id})
+        result.error = str(e)[:500]
+
+    return result
+
+def send_file_by_notification(notification, chat_id: str) -> bool:
+    """
+    wrapper สำหรับไฟล์แนบทั้งหมดของ notification
+    """
+    paths = attachment_paths(notification)
+
+    for path in paths:
+        if not os.path.exists(path):
+            logger.error("attachment not found", extra={"chat_id": chat_id, "path": path})
+            return False
 
     caption = notification.description or ""
-    return send_file(chat_id, full_path, caption)
+    for group in group_media(paths):
+        if len(group) == 1:
+            ok = send_file(chat_id, group[0], caption)
+        else:
+            _, response = _post_media_group(chat_id, group, caption)
+            ok = response.status_code == 200
+        if not ok:
+            return False
+        caption = ""
+
+    return True
 
 def send_file(chat_id: str, file_path: str, caption: str = "") -> bool:
     """
@@ -109,39 +365,205 @@ def send_file(chat_id: str, file_path: str, caption: str = "") -> bool:
     - image → sendPhoto
     - อื่น ๆ → sendDocument
     """
+    try:
+        _, response = _post_file(chat_id, file_path, caption)
+        return response.status_code == 200
+
+    except RetryAfter:
+        raise
 
+    except Exception as e:
+        logger.warning("file send failed: %s", e, extra={"chat_id": chat_id, "path": file_path})
+        return False
+
+# =========================
+# Attachments / Media Group
+# =========================
+
+# Telegram: sendMediaGroup รับได้ 2-10 ไฟล์ต่อครั้ง
+MEDIA_GROUP_SIZE = 10
+
+
+def attachment_paths(notification) -> list[str]:
+    # prefetch_related("attachments") -> ไม่ query ซ้ำ
+    return [
+        os.path.join(settings.MEDIA_ROOT, a.file)
+        for a in notification.attachments.all()
+    ]
+
+
+def media_kind(file_path: str) -> str:
     mime_type, _ = mimetypes.guess_type(file_path)
-    filename = os.path.basename(file_path)
+    return "photo" if mime_type and mime_type.startswith("image") else "document"
+
+
+def group_media(paths: list[str]) -> list[list[str]]:
+    """
+    แบ่งไฟล์เป็นกลุ่มละไม่เกิน MEDIA_GROUP_SIZE
+    - Telegram ไม่ให้ document ปนกับ photo ใน media group เดียวกัน -> แยกตามชนิด
+    - กลุ่มที่เหลือไฟล์เดียว -> ส่งด้วย sendPhoto / sendDocument ตามปกติ
+    """
+    by_kind: dict[str, list[str]] = {}
+    for path in paths:
+        by_kind.setdefault(media_kind(path), []).append(path)
+
+    groups = []
+    for kind_paths in by_kind.values():
+        for i in range(0, len(kind_paths), MEDIA_GROUP_SIZE):
+            groups.append(kind_paths[i:i + MEDIA_GROUP_SIZE])
+    return groups
+
+
+# ข้อความ error ของ Telegram เมื่อ file_id ใช้ไม่ได้แล้ว (400 ด้วยเหตุอื่น เช่น caption ยาวเกิน -> cache ยังใช้ได้)
+FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference", "file_id")
+
+
+def file_id_rejected(resp: requests.Response) -> bool:
+    if resp.status_code != 400:
+        return False
+    try:
+        description = resp.json().get("description") or ""
+    except ValueError:
+        description = resp.text
+    description = description.lower()
+    return any(error in description for error in FILE_ID_ERRORS)
+
+
+def _post_media_group(chat_id: str, paths: list[str], caption: str = "") -> tuple[str, requests.Response]:
+    """
+    ส่งหลายไฟล์ (ชนิดเดียวกัน) ใน request เดียว
+    - ไฟล์ที่มี file_id แล้ว -> ส่งแบบ reference / ที่เหลือ upload เป็น attach://
+    - Telegram ไม่รับ file_id -> ลบ cache ของกลุ่มนี้แล้ว upload ใหม่ทั้งกลุ่ม
+    """
+    kind = media_kind(paths[0])
+    digests = [file_digest(p) for p in paths]
+    cached = get_file_ids(digests, kind)
+
+    response = _send_media_group(chat_id, kind, paths, digests, cached, caption)
+
+    if cached and file_id_rejected(response):
+        logger.info("file_id rejected -> re-upload group", extra={"chat_id": chat_id, "files": len(paths)})
+        for digest in cached:
+            forget_file_id(digest, kind)
+        cached = {}
+        response = _send_media_group(chat_id, kind, paths, digests, cached, caption)
+
+    if response.status_code == 200:
+        try:
+            messages = response.json().get("result") or []
+        except ValueError:
+            messages = []
+
+        # result เรียงตาม media ที่ส่งไป
+        for digest, message in zip(digests, messages):
+            if digest in cached:
+                continue
+            new_file_id, file_size = extract_file_id(kind, {"result": message})
+            if new_file_id:
+                remember_file_id(digest, kind, new_file_id, file_size)
+
+    return "sendMediaGroup", response
 
-    if mime_type and mime_type.startswith("image"):
-        endpoint = "sendPhoto"
-        file_key = "photo"
-    else:
-        endpoint = "sendDocument"
-        file_key = "document"
+
+def _send_media_group(chat_id, kind, paths, digests, cached, caption) -> requests.Response:
+    media = []
+    files = {}
+    handles = []
 
     try:
-        with open(file_path, "rb") as f:
-            files = {
-                file_key: (filename, f)
-            }
-            data = {
+        for i, (path, digest) in enumerate(zip(paths, digests)):
+            item = {"type": kind}
+
+            if digest in cached:
+                item["media"] = cached[digest]
+            else:
+                key = f"file{i}"
+                f = open(path, "rb")
+                handles.append(f)
+                files[key] = (os.path.basename(path), f)
+                item["media"] = f"attach://{key}"
+
+            if i == 0 and caption:
+                item["caption"] = caption
+            media.append(item)
+
+        data = {
+            "chat_id": chat_id,
+            "media": json.dumps(media),
+        }
+
+        if files:
+            return api_post(
+                "sendMediaGroup",
+                chat_id=chat_id,
+                data=data,
+                files=files,
+                timeout=FILE_TIMEOUT,
+            )
+        return api_post("sendMediaGroup", chat_id=chat_id, data=data)
+
+    finally:
+        for f in handles:
+            f.close()
+
+
+def _post_file(chat_id: str, file_path: str, caption: str = "") -> tuple[str, requests.Response]:
+    """
+    ส่งไฟล์ 1 ครั้ง
+    - เคย upload เนื้อไฟล์นี้แล้ว -> ส่ง file_id (ไม่ upload ซ้ำ)
+    - Telegram ไม่รับ file_id -> ลบ cache แล้ว upload ใหม่
+    """
+    file_key = media_kind(file_path)
+    endpoint = "sendPhoto" if file_key == "photo" else "sendDocument"
+
+    digest = file_digest(file_path)
+    file_id = get_file_id(digest, file_key)
+
+    if file_id:
+        response = api_post(
+            endpoint,
+            chat_id=chat_id,
+            json={
                 "chat_id": chat_id,
                 "caption": caption,
-            }
+                file_key: file_id,
+            },
+        )
+        if not file_id_rejected(response):
+            return endpoint, response
 
-            response = requests.post(
-            f"{BASE_URL}/{endpoint}",
-            data=data,
-            files=files,
-            timeout=20,
-            proxies={"http": None, "https": None}
-            )
+        logger.info("file_id rejected -> re-upload", extra={"chat_id": chat_id, "path": file_path})
+        forget_file_id(digest, file_key)
 
+    response = _upload_file(endpoint, file_key, chat_id, file_path, caption)
 
-        print("[TG] file status:", response.status_code)
-        return response.status_code == 200
+    if response.status_code == 200:
+        try:
+            new_file_id, file_size = extract_file_id(file_key, response.json())
+        except ValueError:
+            new_file_id = None
+        if new_file_id:
+            remember_file_id(digest, file_key, new_file_id, file_size)
 
-    except Exception as e:
-        print("[TG] ❌ File exception:", str(e))
-        return False
+    return endpoint, response
+
+
+def _upload_file(endpoint: str, file_key: str, chat_id: str, file_path: str, caption: str = "") -> requests.Response:
+    filename = os.path.basename(file_path)
+
+    with open(file_path, "rb") as f:
+        files = {
+            file_key: (filename, f)
+        }
+        data = {
+            "chat_id": chat_id,
+            "caption": caption,
+        }
+
+        return api_post(
+            endpoint,
+            chat_id=chat_id,
+            data=data,
+            files=files,
+            timeout=FILE_TIMEOUT,
+        )
@@ -1,3 +1,882 @@
-from django.test import TestCase
+import re
+import shutil
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from notify import scheduler as notify_scheduler
+from notify import views
+from notify.models import (
+    Notification, NotificationAttachment, NotificationDelivery, NotificationStat, TelegramFile, User,
+)
+from notify.services import notification_engine as engine
+from notify.services import stats as notification_stats
+from notify.services import telegram_sender
+from notify.services.digest import Digest, coalesce_items, render_digest
+from notify.services.file_serving import parse_range
+from notify.services.fragment_cache import CSRF_PLACEHOLDER, bump_dashboard_version, dashboard_key
+from notify.services.metrics import bearer_token_matches
+from notify.services.pagination import invalidate_counts, keyset_page
+from notify.services.rate_limiter import RateLimiter, RetryAfter
+from notify.services.telegram_file_cache import file_digest, remember_file_id
+from notify.services.telegram_sender import SendResult
+
+
+# =====================
+# Helpers
+# =====================
+
+class FakeResponse:
+    """
+    response ของ Bot API ที่ api_post / SendResult ใช้ (status_code / elapsed / text / json)
+    """
+
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.elapsed = timedelta(milliseconds=5)
+        self.payload = payload or {"ok": True, "result": {"message_id": 1}}
+        self.text = str(self.payload)
+        self.headers = {}
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """
+    จด endpoint ที่ถูกยิงตามลำดับ (ตรวจว่าไม่มีการส่งซ้ำ)
+    responses = response ที่จะตอบตามลำดับ (หมดแล้วตอบ 200)
+    """
+
+    def __init__(self, responses=()):
+        self.calls = []
+        self.responses = list(responses)
+
+    def post(self, url, **kwargs):
+        self.calls.append(url.rsplit("/", 1)[-1])
+        return self.responses.pop(0) if self.responses else FakeResponse()
+
+
+class EngineTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="alice", password="x", department="FO", telegram_chat_id="1001",
+        )
+        self.now = timezone.now()
+
+    def make_notification(self, **kwargs):
+        event_at = kwargs.pop("event_datetime", self.now - timedelta(minutes=1))
+        fields = {
+            "user": self.user,
+            "title": "meeting",
+            "description": "room 3",
+            "event_type": "one_time",
+            "event_datetime": event_at,
+            "next_fire_at": event_at,
+        }
+        fields.update(kwargs)
+        return Notification.objects.create(**fields)
+
+    def claim(self, worker_id, now=None):
+        now = now or self.now
+        return engine.claim_due_items(engine.build_due_items(now=now), worker_id=worker_id, now=now)
+
+
+
+# =====================
+# Dispatch
+# =====================
+
+class DispatchErrorTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.notifications = [self.make_notification(title=f"n{i}") for i in range(2)]
+
+    def assert_retry_scheduled(self):
+        for n in self.notifications:
+            n.refresh_from_db()
+            self.assertEqual(n.status, "pending")
+            self.assertEqual(n.retry_count, 1)
+            self.assertGreater(n.next_fire_at, self.now)
+            self.assertIsNone(n.lease_owner)
+            self.assertIsNone(n.sending_event_at)
+
+    def test_pool_job_error_schedules_retry(self):
+        with mock.patch.object(engine, "process_job", side_effect=RuntimeError("boom")):
+            stats = engine.process_notifications(workers=2)
+
+        self.assertEqual(stats.failure, 2)
+        self.assert_retry_scheduled()
+
+    def test_serial_job_error_schedules_retry(self):
+        with mock.patch.object(engine, "process_due_item", side_effect=RuntimeError("boom")):
+            stats = engine.process_notifications(workers=1)
+
+        self.assertEqual(stats.failure, 2)
+        self.assert_retry_scheduled()
+
+    def test_error_after_result_does_not_overwrite_it(self):
+        [item] = self.claim("worker-a")[:1]
+        engine.handle_success(item)
+
+        self.assertEqual(engine.fail_job(item), [engine.FAILURE])
+        item.notification.refresh_from_db()
+        self.assertEqual(item.notification.status, "success")
+        self.assertEqual(item.notification.retry_count, 0)
+
+
+# =====================
+# Claim
+# =====================
+
+class ClaimTests(EngineTestCase):
+
+    def test_second_worker_gets_nothing(self):
+        n = self.make_notification()
+
+        # ทั้งสอง worker อ่านรายการที่ถึงเวลาได้ชุดเดียวกันก่อน claim
+        due_a = engine.build_due_items(now=self.now)
+        due_b = engine.build_due_items(now=self.now)
+
+        claimed_a = engine.claim_due_items(due_a, worker_id="worker-a", now=self.now)
+        claimed_b = engine.claim_due_items(due_b, worker_id="worker-b", now=self.now)
+
+        self.assertEqual([item.notification.id for item in claimed_a], [n.id])
+        self.assertEqual(claimed_b, [])
+
+        n.refresh_from_db()
+        self.assertEqual(n.lease_owner, "worker-a")
+        self.assertEqual(n.sending_event_at, n.event_datetime)
+        self.assertIsNone(n.send_started_at)
+
+    def test_claimed_row_is_not_due_again(self):
+        self.make_notification()
+        self.claim("worker-a")
+
+        self.assertEqual(engine.build_due_items(now=self.now), [])
+
+
+class StaleLeaseTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # worker-a claim ไว้แล้วหายไปจน lease หมดอายุ -> ถูกเก็บกวาด แล้ว worker-b หยิบรอบใหม่
+        claimed_at = self.now - timedelta(seconds=engine.LEASE_SECONDS + 60)
+        self.notification = self.make_notification(event_datetime=self.now - timedelta(hours=1))
+        [self.stale] = self.claim("worker-a", now=claimed_at)
+        engine.recover_expired_leases(now=self.now)
+        self.claim("worker-b")
+
+    def test_stale_worker_cannot_start_or_renew(self):
+        self.assertEqual(engine.mark_send_started([self.stale.notification]), set())
+        self.assertFalse(engine.renew_lease(self.stale.notification))
+
+    def test_stale_worker_result_is_dropped(self):
+        engine.handle_failure(self.stale.notification)
+
+        n = Notification.objects.get(id=self.notification.id)
+        self.assertEqual(n.lease_owner, "worker-b")
+        self.assertEqual(n.retry_count, 0)
+        self.assertIsNotNone(n.sending_event_at)
+
+
+# =====================
+# Lease recovery
+# =====================
+
+class RecoverExpiredLeaseTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # claim ไว้ตั้งแต่อดีต -> lease หมดอายุแล้ว ณ self.now
+        self.claimed_at = self.now - timedelta(seconds=engine.LEASE_SECONDS + 60)
+        event_at = self.now - timedelta(hours=1)
+        self.unstarted = self.make_notification(title="unstarted", event_datetime=event_at)
+        self.started = self.make_notification(title="started", event_datetime=event_at)
+        self.items = {item.notification.id: item for item in self.claim("worker-a", now=self.claimed_at)}
+
+        Notification.objects.filter(id=self.started.id).update(send_started_at=self.claimed_at)
+
+    def test_unstarted_row_is_released_for_resend(self):
+        self.assertEqual(engine.recover_expired_leases(now=self.now), 2)
+
+        self.unstarted.refresh_from_db()
+        self.assertEqual(self.unstarted.status, "pending")
+        self.assertIsNone(self.unstarted.sending_event_at)
+        self.assertIsNone(self.unstarted.lease_owner)
+        self.assertEqual(self.unstarted.next_fire_at, self.unstarted.event_datetime)
+        self.assertFalse(NotificationDelivery.objects.filter(notification=self.unstarted).exists())
+
+        due = engine.build_due_items(now=self.now)
+        self.assertEqual([item.notification.id for item in due], [self.unstarted.id])
+
+    def test_started_row_is_not_resent(self):
+        engine.recover_expired_leases(now=self.now)
+
+        self.started.refresh_from_db()
+        self.assertEqual(self.started.status, "success")
+        self.assertIsNone(self.started.next_fire_at)
+        self.assertIsNone(self.started.lease_owner)
+
+        delivery = NotificationDelivery.objects.get(notification=self.started)
+        self.assertEqual(delivery.outcome, "recovered")
+
+
+class BroadcastRecoveryTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i, chat_id in enumerate(("2001", "2002", "2003")):
+            User.objects.create_user(username=f"fo{i}", password="x", department="FO", telegram_chat_id=chat_id)
+
+        # worker-a ตายหลังส่งถึง chat แรก (+ เจ้าของ 1001) ของ broadcast ไปแล้ว
+        claimed_at = self.now - timedelta(seconds=engine.LEASE_SECONDS + 60)
+        self.notification = self.make_notification(
+            target_type="department", target_department="FO", event_datetime=self.now - timedelta(hours=1),
+        )
+        [self.item] = self.claim("worker-a", now=claimed_at)
+        Notification.objects.filter(id=self.notification.id).update(send_started_at=claimed_at)
+        for chat_id in ("1001", "2001"):
+            engine.record_delivery(self.item, engine.SUCCESS, SendResult(ok=True, chat_id=chat_id))
+
+    def test_broadcast_resumes_remaining_recipients(self):
+        engine.recover_expired_leases(now=self.now)
+
+        n = Notification.objects.get(id=self.notification.id)
+        self.assertEqual(n.status, "pending")
+        self.assertIsNone(n.lease_owner)
+        self.assertFalse(NotificationDelivery.objects.filter(outcome="recovered").exists())
+
+        sent = []
+
+        def fake_send(notification, chat_id=None):
+            sent.append(chat_id)
+            return SendResult(ok=True, chat_id=chat_id)
+
+        with mock.patch.object(engine, "send_notification", side_effect=fake_send):
+            stats = engine.process_notifications(workers=1)
+
+        self.assertEqual(stats.success, 1)
+        self.assertEqual(sent, ["2002", "2003"])
+        n.refresh_from_db()
+        self.assertEqual(n.status, "success")
+
+
+# =====================
+# Edit / delete during send
+# =====================
+
+class EditDuringSendTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.notification = self.make_notification()
+        [self.item] = self.claim("worker-a")
+        engine.mark_send_started([self.item.notification])
+
+    def edit(self, **changes):
+        # เหมือน edit_notification: ปล่อย lease ก่อน save
+        n = Notification.objects.get(id=self.notification.id)
+        for field, value in changes.items():
+            setattr(n, field, value)
+        engine.release_lease(n)
+        n.next_fire_at = engine.compute_next_fire_at(n)
+        n.save()
+        return n
+
+    def test_edit_is_not_overwritten_by_result(self):
+        new_event_at = self.now + timedelta(hours=1)
+        self.edit(title="moved", event_datetime=new_event_at)
+
+        batch = engine.StatusBatch()
+        engine.handle_success(self.item, batch)
+        batch.flush()
+
+        n = Notification.objects.get(id=self.notification.id)
+        self.assertEqual(n.title, "moved")
+        self.assertEqual(n.status, "pending")
+        self.assertEqual(n.next_fire_at, new_event_at)
+        self.assertIsNone(n.last_sent_event_at)
+
+    def test_edit_is_not_overwritten_without_batch(self):
+        new_event_at = self.now + timedelta(hours=1)
+        self.edit(event_datetime=new_event_at)
+
+        engine.handle_failure(self.item.notification)
+
+        n = Notification.objects.get(id=self.notification.id)
+        self.assertEqual(n.retry_count, 0)
+        self.assertEqual(n.next_fire_at, new_event_at)
+
+    def test_delete_keeps_delivery_history(self):
+        Notification.objects.filter(id=self.notification.id).delete()
+
+        batch = engine.StatusBatch()
+        engine.record_delivery(self.item, engine.SUCCESS, batch=batch)
+        engine.handle_success(self.item, batch)
+        batch.flush()
+
+        self.assertFalse(Notification.objects.filter(id=self.notification.id).exists())
+        delivery = NotificationDelivery.objects.get()
+        self.assertIsNone(delivery.notification_id)
+        self.assertEqual(delivery.outcome, engine.SUCCESS)
+
+
+class SenderTestCase(EngineTestCase):
+    """
+    notification ที่มีไฟล์แนบ 1 ไฟล์ + Bot API ปลอม (ไม่ออก network)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        with open(f"{self.media_root}/agenda.pdf", "wb") as f:
+            f.write(b"%PDF-1.4")
+
+        self.notification = self.make_notification()
+        NotificationAttachment.objects.create(notification=self.notification, file="agenda.pdf")
+
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.session = FakeSession()
+        self.patch(telegram_sender, "BOT_TOKEN", "x")
+        self.patch(telegram_sender, "BASE_URL", "http://telegram.test/botx")
+        self.patch(telegram_sender, "get_session", return_value=self.session)
+
+    def patch(self, target, name, new=mock.DEFAULT, **kwargs):
+        patcher = mock.patch.object(target, name, new, **kwargs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use_limiter(self, limiter):
+        self.patch(telegram_sender, "get_rate_limiter", return_value=limiter)
+
+
+# =====================
+# Rate limit
+# =====================
+
+class ReservationTests(TestCase):
+
+    def test_total_wait_is_bounded(self):
+        limiter = RateLimiter(chat_rate=1, chat_burst=2, max_wait=1.5)
+        limiter.acquire("1001")
+        limiter.acquire("1001")
+
+        # token แรกรอแค่ 1s แต่ token สุดท้ายต้องรอ 3s (bucket เต็มแล้วยังต้องรอ 1s) -> เลื่อนทั้งก้อน
+        with self.assertRaises(RetryAfter):
+            with limiter.reservation("1001", 3):
+                pass
+        self.assertGreater(limiter.chat_buckets["1001"].tokens, -0.1)
+
+    def test_reservation_larger_than_burst_is_allowed(self):
+        limiter = RateLimiter(chat_rate=100, chat_burst=1, max_wait=0)
+
+        with limiter.reservation("1001", 3):
+            pass
+
+    def test_unused_tokens_are_refunded(self):
+        limiter = RateLimiter(chat_rate=0.01, chat_burst=3, max_wait=0)
+
+        with limiter.reservation("1001", 3):
+            limiter.acquire("1001")
+
+        self.assertAlmostEqual(limiter.chat_buckets["1001"].tokens, 2, places=2)
+
+    def test_extra_call_inside_reservation_waits(self):
+        limiter = RateLimiter(chat_rate=50, chat_burst=1, max_wait=0)
+
+        with limiter.reservation("1001", 1):
+            limiter.acquire("1001")
+            # เกินที่จองไว้ (upload ใหม่) -> รอ ไม่ raise
+            self.assertGreater(limiter.acquire("1001"), 0)
+
+        with self.assertRaises(RetryAfter):
+            limiter.acquire("1001")
+
+
+class FileIdTests(SenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.use_limiter(RateLimiter(chat_rate=1000, chat_burst=10))
+        self.digest = file_digest(f"{self.media_root}/agenda.pdf")
+        remember_file_id(self.digest, "document", "cached-id")
+
+    def test_rejected_file_id_is_reuploaded(self):
+        self.session.responses = [
+            FakeResponse(),
+            FakeResponse(400, {"ok": False, "description": "Bad Request: wrong file identifier/HTTP URL specified"}),
+        ]
+
+        self.assertTrue(telegram_sender.send_notification(self.notification).ok)
+        self.assertEqual(self.session.calls, ["sendMessage", "sendDocument", "sendDocument"])
+        self.assertFalse(TelegramFile.objects.filter(file_id="cached-id").exists())
+
+    def test_other_bad_request_keeps_file_id(self):
+        self.session.responses = [
+            FakeResponse(),
+            FakeResponse(400, {"ok": False, "description": "Bad Request: message caption is too long"}),
+        ]
+
+        self.assertFalse(telegram_sender.send_notification(self.notification).ok)
+        self.assertEqual(self.session.calls, ["sendMessage", "sendDocument"])
+        self.assertTrue(TelegramFile.objects.filter(file_id="cached-id").exists())
+
+
+class DeferralTests(SenderTestCase):
+
+    def run_once(self):
+        [item] = self.claim("worker-a", now=timezone.now())
+        return engine.process_due_item(item)
+
+    def test_deferred_before_any_request(self):
+        # chat นี้ใช้ token หมดแล้ว -> ต้องรอเกิน max_wait
+        limiter = RateLimiter(chat_rate=0.01, chat_burst=1, max_wait=1)
+        limiter.acquire(self.user.telegram_chat_id)
+        self.use_limiter(limiter)
+
+        self.assertEqual(self.run_once(), engine.DEFERRED)
+        self.assertEqual(self.session.calls, [])
+
+        n = Notification.objects.get(id=self.notification.id)
+        self.assertEqual(n.status, "pending")
+        self.assertEqual(n.retry_count, 0)
+        self.assertGreater(n.next_fire_at, self.now)
+        self.assertIsNone(n.lease_owner)
+
+    def test_resend_after_deferral_sends_each_request_once(self):
+        limiter = RateLimiter(chat_rate=0.01, chat_burst=1, max_wait=1)
+        limiter.acquire(self.user.telegram_chat_id)
+        self.use_limiter(limiter)
+        self.run_once()
+
+        # ครบเวลาที่เลื่อนไว้ + limit ว่างแล้ว
+        Notification.objects.filter(id=self.notification.id).update(next_fire_at=self.now)
+        self.use_limiter(RateLimiter(chat_rate=1000, chat_burst=10))
+
+        self.assertEqual(self.run_once(), engine.SUCCESS)
+        self.assertEqual(self.session.calls, ["sendMessage", "sendDocument"])
+
+        outcomes = list(
+            NotificationDelivery.objects
+            .filter(notification=self.notification)
+            .order_by("id")
+            .values_list("outcome", flat=True)
+        )
+        self.assertEqual(outcomes, [engine.DEFERRED, engine.SUCCESS])
+
+        n = Notification.objects.get(id=self.notification.id)
+        self.assertEqual(n.status, "success")
+
+
+# =====================
+# Digest
+# =====================
+
+def digest_item(title, description="", chat_id="1001", attachments=(), target_type="user"):
+    notification = SimpleNamespace(
+        title=title,
+        description=description,
+        target_type=target_type,
+        user=SimpleNamespace(telegram_chat_id=chat_id),
+        attachments=SimpleNamespace(all=lambda: list(attachments)),
+    )
+    return SimpleNamespace(notification=notification)
+
+
+class CoalesceTests(SimpleTestCase):
+
+    def test_same_chat_items_become_one_digest(self):
+        a, b, other = digest_item("a"), digest_item("b"), digest_item("c", chat_id="2002")
+
+        jobs = coalesce_items([a, other, b])
+
+        self.assertEqual(len(jobs), 2)
+        self.assertIsInstance(jobs[0], Digest)
+        self.assertEqual(jobs[0].items, [a, b])
+        self.assertIs(jobs[1], other)
+
+    def test_attachments_and_broadcasts_are_sent_alone(self):
+        items = [
+            digest_item("a", attachments=["file"]),
+            digest_item("b", target_type="department"),
+            digest_item("c"),
+        ]
+
+        self.assertEqual(coalesce_items(items), items)
+
+
+class RenderDigestTests(SimpleTestCase):
+
+    def test_items_fit_in_one_message(self):
+        items = [digest_item("a", "first"), digest_item("b", "second")]
+
+        [message] = render_digest(Digest(chat_id="1001", items=items))
+
+        self.assertIn("2 รายการ", message.text)
+        self.assertIn("🔔 a\nfirst", message.text)
+        self.assertIn("🔔 b\nsecond", message.text)
+        self.assertEqual(message.items, items)
+
+    def test_split_keeps_each_item_whole(self):
+        items = [digest_item(f"item {i}", "x" * 40) for i in range(5)]
+
+        messages = render_digest(Digest(chat_id="1001", items=items), limit=120)
+
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertLessEqual(len(message.text), 120)
+        self.assertEqual([item for m in messages for item in m.items], items)
+
+    def test_oversized_item_is_cut_into_pieces(self):
+        item = digest_item("big", "y" * 250)
+
+        messages = render_digest(Digest(chat_id="1001", items=[item]), limit=100)
+
+        self.assertGreater(len(messages), 2)
+        for message in messages:
+            self.assertLessEqual(len(message.text), 100)
+            self.assertEqual(message.items, [item])
+        self.assertEqual("".join(m.text for m in messages).count("y"), 250)
+
+
+# =====================
+# Timer scheduler
+# =====================
+
+class TimerWatchTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.timer = notify_scheduler.TimerScheduler(watch_seconds=5)
+        self.later = self.make_notification(event_datetime=self.now + timedelta(hours=2))
+        self.timer.load()
+
+    def test_watch_picks_up_row_created_by_other_process(self):
+        # web อีก process สร้างรายการที่ถึงเวลาก่อน (ไม่มี on_commit มาปลุก)
+        sooner = self.make_notification(event_datetime=self.now + timedelta(minutes=5))
+
+        self.timer.watch()
+
+        self.assertEqual(self.timer._heap[0], (sooner.next_fire_at, sooner.id))
+
+    def test_watch_ignores_later_rows(self):
+        self.make_notification(event_datetime=self.now + timedelta(hours=3))
+
+        self.timer.watch()
+
+        self.assertEqual(self.timer._heap, [(self.later.next_fire_at, self.later.id)])
+
+
+# =====================
+# Stats
+# =====================
+
+class StatsRecomputeTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_notification()
+        self.make_notification(status="success")
+
+    def test_recompute_replaces_drifted_counts(self):
+        NotificationStat.objects.create(dimension="status", value="pending", count=99)
+
+        notification_stats.recompute()
+
+        stats = notification_stats.get_stats()
+        self.assertEqual(stats["status"], {"pending": 1, "success": 1})
+        self.assertEqual(stats["department"], {"FO": 2})
+
+    def test_delta_during_scan_is_not_overwritten(self):
+        NotificationStat.objects.create(dimension="status", value="pending", count=1)
+        count_queryset = notification_stats.count_queryset
+
+        def count_with_concurrent_write(qs):
+            counts = count_queryset(qs)
+            # web สร้าง notification ระหว่าง GROUP BY
+            notification_stats.apply_deltas(Counter({("status", "pending"): 1}))
+            return counts
+
+        with mock.patch.object(notification_stats, "count_queryset", side_effect=count_with_concurrent_write):
+            self.assertIsNone(notification_stats.recompute())
+
+        self.assertEqual(notification_stats.get_stats()["status"], {"pending": 2})
+
+
+# =====================
+# Keyset pagination
+# =====================
+
+class KeysetPageTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.factory = RequestFactory()
+        # 7 แถว โดย 2 แถวมี created_at เท่ากัน -> ต้องเรียงต่อด้วย id
+        self.rows = [self.make_notification(title=f"n{i}") for i in range(7)]
+        for i, n in enumerate(self.rows):
+            created = self.now - timedelta(minutes=min(i, 5))
+            Notification.objects.filter(pk=n.pk).update(created_at=created)
+        self.qs = Notification.objects.all()
+        self.expected = list(self.qs.order_by("-created_at", "-id"))
+
+    def page(self, **params):
+        return keyset_page(self.factory.get("/", params), self.qs, 3)
+
+    def test_walk_forward_and_back(self):
+        first = self.page()
+        second = self.page(**QueryDict(first.next_params).dict())
+        third = self.page(after=second.next_cursor, page=3)
+
+        self.assertEqual((first.number, first.num_pages, first.count), (1, 3, 7))
+        self.assertFalse(first.has_previous)
+        self.assertEqual(list(first) + list(second) + list(third), self.expected)
+        self.assertFalse(third.has_next)
+
+        back = self.page(before=second.previous_cursor, page=1)
+
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(back.number, 1)
+        self.assertFalse(back.has_previous)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        page = self.page(after="not-a-cursor", page=4)
+
+        self.assertEqual(page.number, 1)
+        self.assertEqual(list(page), self.expected[:3])
+
+    def test_count_is_cached_until_invalidated(self):
+        request = self.factory.get("/")
+        self.assertEqual(keyset_page(request, self.qs, 3, count_name="all").count, 7)
+
+        self.make_notification()
+        self.assertEqual(keyset_page(request, self.qs, 3, count_name="all").count, 7)
+
+        invalidate_counts("all")
+        self.assertEqual(keyset_page(request, self.qs, 3, count_name="all").count, 8)
+
+
+# =====================
+# Dashboard fragment cache
+# =====================
+
+class DashboardFragmentCacheTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def dashboard(self):
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_key_changes_when_version_is_bumped(self):
+        before = dashboard_key(self.user, "page=2")
+
+        bump_dashboard_version(self.user.id)
+        self.user.refresh_from_db()
+
+        self.assertNotEqual(dashboard_key(self.user, "page=2"), before)
+        self.assertNotEqual(dashboard_key(self.user, "page=3"), dashboard_key(self.user, "page=2"))
+
+    def test_cached_table_is_served_until_bumped(self):
+        self.make_notification(title="first meeting")
+        self.assertIn("first meeting", self.dashboard())
+
+        # เขียนตรงลง DB (ไม่ bump) -> ยังได้ตารางเดิมจาก cache
+        self.make_notification(title="second meeting")
+        self.assertNotIn("second meeting", self.dashboard())
+
+        bump_dashboard_version(self.user.id)
+        self.assertIn("second meeting", self.dashboard())
+
+    def test_csrf_token_is_filled_per_request(self):
+        self.make_notification(title="first meeting")
+
+        tokens = [
+            re.findall(r'name="csrfmiddlewaretoken" value="([^"]+)"', self.dashboard())
+            for _ in range(2)
+        ]
+
+        # ครั้งที่สองมาจาก cache แต่ token ต้อง mask ใหม่ต่อ request ไม่ใช่ placeholder / ของ request ก่อน
+        self.assertTrue(tokens[1])
+        self.assertNotIn(CSRF_PLACEHOLDER, tokens[1])
+        self.assertNotEqual(tokens[0], tokens[1])
+
+
+# =====================
+# Views
+# =====================
+
+class BroadcastTargetViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="bob", password="x", department="FO")
+        self.client.force_login(self.user)
+
+    def create(self, **target):
+        return self.client.post(reverse("create_notification"), {
+            "title": "hello",
+            "event_type": "one_time",
+            "event_datetime": "2030-01-01T09:00",
+            **target,
+        })
+
+    def test_user_can_target_own_department(self):
+        response = self.create(target_type="department", target_department="FO")
+
+        self.assertRedirects(response, reverse("dashboard"), fetch_redirect_response=False)
+        n = Notification.objects.get()
+        self.assertEqual((n.target_type, n.target_department), ("department", "FO"))
+
+    def test_user_cannot_target_other_department(self):
+        response = self.create(target_type="department", target_department="HR")
+
+        self.assertRedirects(response, reverse("create_notification"), fetch_redirect_response=False)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_user_cannot_target_everyone(self):
+        self.create(target_type="all")
+
+        self.assertFalse(Notification.objects.exists())
+
+    def test_form_offers_only_own_department(self):
+        response = self.client.get(reverse("create_notification"))
+
+        self.assertEqual([value for value, label in response.context["departments"]], ["FO"])
+
+
+class MetricsAuthTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(views, "METRICS_TOKEN", "s3cret")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bearer_token_matches(self):
+        self.assertTrue(bearer_token_matches("Bearer s3cret", "s3cret"))
+        self.assertTrue(bearer_token_matches("bearer s3cret ", "s3cret"))
+        self.assertFalse(bearer_token_matches("Bearer wrong", "s3cret"))
+        self.assertFalse(bearer_token_matches("Basic s3cret", "s3cret"))
+        self.assertFalse(bearer_token_matches("Bearer ", ""))
+
+    def test_anonymous_localhost_is_forbidden(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="127.0.0.1")
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_wrong_token_is_forbidden(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer nope")
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_token_is_accepted(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    def test_staff_is_accepted(self):
+        self.client.force_login(User.objects.create_user(username="root", password="x", is_staff=True))
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_single_ranges(self):
+        self.assertEqual(parse_range("bytes=0-3", 10), (0, 3))
+        self.assertEqual(parse_range("bytes=4-", 10), (4, 9))
+        self.assertEqual(parse_range("bytes=5-99", 10), (5, 9))
+        self.assertEqual(parse_range("bytes=-3", 10), (7, 9))
+        self.assertEqual(parse_range("bytes=-30", 10), (0, 9))
+
+    def test_unsatisfiable_ranges_have_start_past_end(self):
+        self.assertEqual(parse_range("bytes=-0", 10), (10, 9))
+        self.assertEqual(parse_range("bytes=10-", 10), (10, 9))
+
+    def test_unsupported_ranges_serve_whole_file(self):
+        for header in ("bytes=0-1,4-5", "bytes=-", "items=0-1", "bytes=5-2", "garbage"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 10))
+
+
+class ServeAttachmentTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        with open(f"{self.media_root}/agenda.pdf", "wb") as f:
+            f.write(b"0123456789")
+
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        NotificationAttachment.objects.create(
+            notification=self.make_notification(), file="agenda.pdf", original_name="วาระประชุม.pdf",
+        )
+        self.url = reverse("media", args=["agenda.pdf"])
+        self.client.force_login(self.user)
+
+    def test_owner_gets_whole_file(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("filename*=utf-8''", response["Content-Disposition"])
+
+    def test_range_returns_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=20-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_user_gets_404(self):
+        self.client.force_login(User.objects.create_user(username="mallory", password="x", department="HR"))
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_anonymous_is_sent_to_login(self):
+        self.client.logout()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith(reverse("login")))
@@ -13,5 +13,6 @@ urlpatterns = [
     path('notifications/delete/<int:notification_id>/', views.delete_notification, name='delete_notification'),
     path('notifications/send-now/<int:notification_id>/', views.send_now_notification, name='send_now_notification'),
     path("notifications/<int:notification_id>/edit/", views.edit_notification, name="edit_notification"),
-    path("notifications/<int:notification_id>/remove-file/", views.remove_notification_file, name="remove_notification_file"),
-]
\ No newline at end of file
+    path("notifications/<int:notification_id>/remove-file/<int:attachment_id>/", views.remove_notification_file, name="remove_notification_file"),
+    path("metrics", views.metrics_view, name="metrics"),
+]
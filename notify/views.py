@@ -1,20 +1,35 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib import messages
 from django.views.decorators.cache import never_cache
-from django.core.paginator import Paginator
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from datetime import datetime
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
 from django.db import transaction
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+import logging
+import os
 
 from notify.services.savefile import get_available_filename
-from notify.models import Notification, User
+from notify.services.notification_engine import compute_next_fire_at, release_lease
+from notify.scheduler import notify_schedule_changed
+from notify.services.metrics import bearer_token_matches as metrics_bearer_token_matches
+from notify.services.metrics import registry as metrics_registry
+from notify.services.pagination import invalidate_counts, keyset_page
+from notify.services import fragment_cache
+from notify.services import file_serving
+from notify.services import stats as notification_stats
+from notify.models import Notification, NotificationAttachment, User
+
+logger = logging.getLogger("notify.web")
 
 
 
@@ -68,29 +83,38 @@ def user_dashboard(request):
     if request.user.is_staff:
         return redirect('admin_dashboard')
 
-    # ----- Query notifications ของ user -----
-    notifications_qs = (
-        Notification.objects
-        .filter(user=request.user)
-        .order_by("-created_at")   # ใหม่สุดอยู่บน
-    )
-
-    # ----- Pagination (5 rows / page) -----
-    paginator = Paginator(notifications_qs, 5)
-    page_number = request.GET.get("page", 1)
-    page_obj = paginator.get_page(page_number)
+    # ----- Fragment cache (user + dashboard_version + หน้า) -----
+    cache_key = fragment_cache.dashboard_key(request.user, request.GET.urlencode())
+    table_html = fragment_cache.get_fragment(request, cache_key)
+
+    if table_html is None:
+        # ----- Query notifications ของ user -----
+        notifications_qs = (
+            Notification.objects
+            .filter(user=request.user)
+            .select_related("target_group")
+            .prefetch_related("attachments")
+            .order_by("-created_at")   # ใหม่สุดอยู่บน
+        )
 
-    total_pages = paginator.num_pages if paginator.count > 0 else 0
+        # ----- Pagination (5 rows / page, keyset) -----
+        page_obj = keyset_page(
+            request, notifications_qs, 5,
+            count_name=f"notifications:user:{request.user.id}",
+        )
 
-    # ----- Context -----
-    context = {
-        "notifications": page_obj,     
-        "page_obj": page_obj,
-        "total_pages": total_pages,
-        "MEDIA_URL": settings.MEDIA_URL,
-    }
+        # ----- Context -----
+        context = {
+            "notifications": page_obj,
+            "page_obj": page_obj,
+            "total_pages": page_obj.num_pages,
+            "MEDIA_URL": settings.MEDIA_URL,
+        }
+        table_html = fragment_cache.render_fragment(
+            request, "notifications/_dashboard_table.html", context, cache_key,
+        )
 
-    return render(request, "dashboard.html", context)
+    return render(request, "dashboard.html", {"notification_table": table_html})
 
 # Dashboard (ADMIN)
 @never_cache
@@ -106,26 +130,34 @@ def admin_dashboard(request):
         .order_by('-created_at')
     )
 
-    notif_page_num = request.GET.get('notif_page', 1)
-    notif_paginator = Paginator(notif_qs, 5)  # 5 rows data (header แยกใน template)
-    notif_page = notif_paginator.get_page(notif_page_num)
+    # 5 rows data (header แยกใน template) / keyset ไม่มี OFFSET, count มาจาก cache
+    notif_page = keyset_page(request, notif_qs, 5, prefix="notif_", count_name="notifications:all")
 
     # ====== Users (real db: users) ======
-    users_qs = User.objects.order_by('-date_joined')
-    user_page_num = request.GET.get('user_page', 1)
-    user_paginator = Paginator(users_qs, 5)   # 5 rows data
-    user_page = user_paginator.get_page(user_page_num)
+    users_qs = User.objects.all()
+    user_page = keyset_page(
+        request, users_qs, 5,
+        ordering=("-date_joined", "-id"), prefix="user_", count_name="users",
+    )
+
+    # ====== Stats (notification_stats: อ่านแถวสรุป ไม่ GROUP BY ทั้งตาราง) ======
+    stats = notification_stats.get_stats()
 
     context = {
         "notif_page": notif_page,
         "user_page": user_page,
 
-        # ใช้รักษาหน้าปัจจุบันเวลาคลิก next/prev ของอีกตาราง
-        "notif_page_num": notif_page.number if notif_page.paginator.count else 0,
-        "notif_page_total": notif_page.paginator.num_pages if notif_page.paginator.count else 0,
+        "stats_panels": [
+            ("Status", notification_stats.labelled(stats, "status", Notification.STATUS_CHOICES)),
+            ("Department", notification_stats.labelled(stats, "department", User.DEPARTMENT_CHOICES)),
+            ("Event Type", notification_stats.labelled(stats, "event_type", Notification.EVENT_TYPE_CHOICES)),
+        ],
 
-        "user_page_num": user_page.number if user_page.paginator.count else 0,
-        "user_page_total": user_page.paginator.num_pages if user_page.paginator.count else 0,
+        "notif_page_num": notif_page.number,
+        "notif_page_total": notif_page.num_pages,
+
+        "user_page_num": user_page.number,
+        "user_page_total": user_page.num_pages,
     }
     return render(request, "admin/dashboard.html", context)
 
@@ -190,6 +222,7 @@ def admin_create_user(request):
         new_user.department = department
         new_user.is_staff = (role == "admin")
         new_user.save()
+        invalidate_counts("users")
 
         messages.success(request, "สร้างผู้ใช้งานสำเร็จ")
         return redirect('admin_dashboard')
@@ -216,7 +249,10 @@ def admin_delete_user(request, user_id):
         messages.error(request, "ไม่สามารถลบบัญชีของตัวเองได้")
         return redirect('admin_dashboard')
 
+    # notification ของ user ถูกลบตาม (CASCADE) -> หักออกจาก stats ก่อนลบ
+    notification_stats.track_deleted_queryset(Notification.objects.filter(user=target))
     target.delete()
+    invalidate_counts("users", "notifications:all", f"notifications:user:{user_id}")
     messages.success(request, "ลบบัญชีเรียบร้อยแล้ว")
     return redirect('admin_dashboard')
 
@@ -260,7 +296,8 @@ def admin_edit_user(request, user_id):
             target.password = make_password(password)
 
         try:
-            target.save()
+            # ไม่เขียนทับ dashboard_version ที่ engine อาจ bump ไประหว่างนี้
+            target.save(update_fields=["username", "telegram_chat_id", "is_staff", "password"])
             messages.success(request, "บันทึกการแก้ไขเรียบร้อยแล้ว")
             return redirect("admin_dashboard")
         except Exception:
@@ -291,6 +328,10 @@ def delete_notification(request, notification_id):
 
     try:
         notification.delete()
+        notification_stats.track_deleted(notification)
+        fragment_cache.bump_dashboard_version(request.user.id)
+        invalidate_counts("notifications:all", f"notifications:user:{request.user.id}")
+        notify_schedule_changed()
         messages.success(request, "ลบการแจ้งเตือนสำเร็จ ✅")
     except Exception:
         messages.error(request, "ลบการแจ้งเตือนไม่สำเร็จ ❌")
@@ -298,6 +339,92 @@ def delete_notification(request, notification_id):
     return redirect('dashboard')
 
 
+# ----- Broadcast target (ส่งถึง user / แผนก / group / ทุกคน) -----
+def allowed_target_groups(user):
+    # admin เลือกได้ทุก group / user ทั่วไปเลือกได้เฉพาะ group ที่ตัวเองอยู่
+    if user.is_staff:
+        return Group.objects.order_by("name")
+    return user.groups.order_by("name")
+
+
+def allowed_target_departments(user):
+    # admin เลือกได้ทุกแผนก / user ทั่วไปส่งได้เฉพาะแผนกของตัวเอง (ยังไม่ได้กำหนดแผนก = ไม่ได้)
+    if user.is_staff:
+        return User.DEPARTMENT_CHOICES
+    return [(value, label) for value, label in User.DEPARTMENT_CHOICES if value == user.department and value != "UN"]
+
+
+def target_form_context(request):
+    return {
+        "target_types": Notification.TARGET_TYPE_CHOICES,
+        "departments": allowed_target_departments(request.user),
+        "groups": allowed_target_groups(request.user),
+    }
+
+
+def read_target(request):
+    """
+    อ่าน target จากฟอร์ม -> (target_type, department, group, error)
+    - ส่งทุกคนได้เฉพาะ admin (สร้างผ่าน Django admin)
+    - user ทั่วไปส่งตามแผนกได้เฉพาะแผนกตัวเอง / ตาม group ได้เฉพาะ group ที่ตัวเองอยู่
+    """
+    target_type = request.POST.get("target_type") or "user"
+    department = request.POST.get("target_department") or None
+    group_id = request.POST.get("target_group") or None
+
+    if target_type not in dict(Notification.TARGET_TYPE_CHOICES):
+        return None, None, None, "ผู้รับไม่ถูกต้อง"
+
+    if target_type == "all" and not request.user.is_staff:
+        return None, None, None, "เฉพาะผู้ดูแลเท่านั้นที่ส่งถึงทุกคนได้"
+
+    if target_type == "department":
+        if department not in dict(allowed_target_departments(request.user)):
+            return None, None, None, "กรุณาเลือกแผนก (ส่งได้เฉพาะแผนกของตัวเอง)"
+        return target_type, department, None, None
+
+    if target_type == "group":
+        group = allowed_target_groups(request.user).filter(id=group_id).first() if group_id else None
+        if group is None:
+            return None, None, None, "กรุณาเลือก Group"
+        return target_type, None, group, None
+
+    return target_type, None, None, None
+
+
+# ----- Attachments -----
+def save_attachments(notification, uploaded_files):
+    """
+    บันทึกไฟล์ที่อัปโหลดลง MEDIA_ROOT/user_uploads แล้วสร้าง NotificationAttachment
+    (ต่อท้ายไฟล์แนบเดิมตามลำดับที่อัปโหลด)
+    """
+    if not uploaded_files:
+        return
+
+    upload_dir = settings.MEDIA_ROOT / "user_uploads"
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    fs = FileSystemStorage(location=upload_dir)
+
+    last = notification.attachments.order_by("-position").first()
+    position = last.position + 1 if last else 0
+
+    attachments = []
+    for uploaded_file in uploaded_files:
+        safe_name = get_available_filename(str(upload_dir), uploaded_file.name)
+        filename = fs.save(safe_name, uploaded_file)
+
+        # เก็บ path ลง DB (ต้องเป็น relative จาก MEDIA_ROOT)
+        attachments.append(NotificationAttachment(
+            notification=notification,
+            file=f"user_uploads/{filename}",
+            original_name=uploaded_file.name[:255],
+            position=position,
+        ))
+        position += 1
+
+    NotificationAttachment.objects.bulk_create(attachments)
+
+
 # Create Notification (USER)
 @never_cache
 @login_required(login_url="login")
@@ -318,7 +445,12 @@ def create_notification(request):
         interval_value = request.POST.get("interval_value") or None
         interval_unit = request.POST.get("interval_unit") or None
 
-        uploaded_file = request.FILES.get("file")
+        uploaded_files = request.FILES.getlist("files")
+
+        target_type, target_department, target_group, error = read_target(request)
+        if error:
+            messages.error(request, error)
+            return redirect("create_notification")
 
         # =====================
         # 2. แปลง datetime ให้เป็น aware
@@ -339,7 +471,7 @@ def create_notification(request):
         # =====================
         # 3. สร้าง Notification
         # =====================
-        notification = Notification.objects.create(
+        notification = Notification(
             user=request.user,
             title=title,
             description=description,
@@ -348,25 +480,30 @@ def create_notification(request):
             start_datetime=start_datetime,
             interval_value=interval_value,
             interval_unit=interval_unit,
+            target_type=target_type,
+            target_department=target_department,
+            target_group=target_group,
             status="pending",
             retry_count=0,
         )
+        notification.next_fire_at = compute_next_fire_at(notification)
 
-        # =====================
-        # 4. จัดการไฟล์แนบ
-        # =====================
-        if uploaded_file:
-            upload_dir = settings.MEDIA_ROOT
-            upload_dir.mkdir(exist_ok=True)
+        # notification + ไฟล์แนบ commit พร้อมกัน
+        # (engine อีก process ต้องไม่เห็นแถวที่ถึงเวลาแล้วก่อนไฟล์แนบจะลง DB)
+        with transaction.atomic():
+            notification.save()
+            notification_stats.track_created(notification)
 
-            original_name = uploaded_file.name
-            safe_name = get_available_filename(upload_dir, original_name)
+            # =====================
+            # 4. จัดการไฟล์แนบ
+            # =====================
+            save_attachments(notification, uploaded_files)
+            fragment_cache.bump_dashboard_version(request.user.id)
 
-            fs = FileSystemStorage(location=upload_dir)
-            filename = fs.save(safe_name, uploaded_file)
+            # ปลุก timer หลัง commit
+            notify_schedule_changed(notification)
 
-            notification.file = filename
-            notification.save(update_fields=["file"])
+        invalidate_counts("notifications:all", f"notifications:user:{request.user.id}")
 
         # =====================
         # 6. Feedback + Redirect
@@ -375,7 +512,7 @@ def create_notification(request):
         return redirect("dashboard")
 
     # GET
-    return render(request, "notifications/create_notification.html")
+    return render(request, "notifications/create_notification.html", target_form_context(request))
 
 
 # Edit Notification (USER)
@@ -398,7 +535,15 @@ def edit_notification(request, notification_id):
         interval_value = request.POST.get("interval_value") or None
         interval_unit = request.POST.get("interval_unit") or None
 
-        uploaded_file = request.FILES.get("file")
+        uploaded_files = request.FILES.getlist("files")
+
+        target_type, target_department, target_group, error = read_target(request)
+        if error:
+            messages.error(request, error)
+            return render(request, "notifications/edit_notification.html", {
+                "notification": notification,
+                **target_form_context(request),
+            })
 
         # =====================
         # 2) Validate ตาม event_type
@@ -407,6 +552,7 @@ def edit_notification(request, notification_id):
             messages.error(request, "กรุณากรอก Title")
             return render(request, "notifications/edit_notification.html", {
                 "notification": notification,
+                **target_form_context(request),
             })
 
         if event_type == "one_time":
@@ -414,17 +560,20 @@ def edit_notification(request, notification_id):
                 messages.error(request, "กรุณาเลือก Event Datetime (One Time)")
                 return render(request, "notifications/edit_notification.html", {
                     "notification": notification,
+                    **target_form_context(request),
                 })
         elif event_type == "recurring":
             if not (start_datetime_raw and interval_value and interval_unit):
                 messages.error(request, "กรุณากรอก Start/Interval ให้ครบ (Recurring)")
                 return render(request, "notifications/edit_notification.html", {
                     "notification": notification,
+                    **target_form_context(request),
                 })
         else:
             messages.error(request, "Event Type ไม่ถูกต้อง")
             return render(request, "notifications/edit_notification.html", {
                 "notification": notification,
+                **target_form_context(request),
             })
 
         # =====================
@@ -445,6 +594,8 @@ def edit_notification(request, notification_id):
         # =====================
         # 4) Update Notification (เริ่มรอบใหม่)
         # =====================
+        stat_keys_before = notification_stats.keys_for(notification)
+
         notification.title = title
         notification.description = description
         notification.event_type = event_type
@@ -454,6 +605,10 @@ def edit_notification(request, notification_id):
         notification.interval_value = int(interval_value) if (event_type == "recurring" and interval_value) else None
         notification.interval_unit = interval_unit if event_type == "recurring" else None
 
+        notification.target_type = target_type
+        notification.target_department = target_department
+        notification.target_group = target_group
+
         # เริ่มรอบใหม่ทั้งหมด
         notification.status = "pending"
         notification.retry_count = 0
@@ -462,33 +617,27 @@ def edit_notification(request, notification_id):
         if hasattr(notification, "last_sent_event_at"):
             notification.last_sent_event_at = None
 
+        notification.next_fire_at = compute_next_fire_at(notification)
+
+        # engine กำลังส่งรอบเดิมอยู่ -> ตัด lease ทิ้ง ผลของรอบเดิมจะไม่ถูกเขียนทับการแก้ไขนี้
+        release_lease(notification)
+
         notification.save()
+        notification_stats.track_changed(stat_keys_before, notification)
 
         # =====================
-        # 5) ถ้ามีอัปโหลดไฟล์ใหม่ -> ลบไฟล์เก่า + save ใหม่
+        # 5) ไฟล์ที่อัปโหลดเพิ่ม -> ต่อท้ายไฟล์แนบเดิม
         # =====================
-        if uploaded_file:
-            if notification.file:
-                old_path = settings.MEDIA_ROOT / notification.file
-                if old_path.exists():
-                    old_path.unlink(missing_ok=True)
-
-            upload_dir = settings.MEDIA_ROOT / "user_uploads"
-            upload_dir.mkdir(parents=True, exist_ok=True)
-
-            safe_name = get_available_filename(str(upload_dir), uploaded_file.name)
-            fs = FileSystemStorage(location=upload_dir)
-            filename = fs.save(safe_name, uploaded_file)
-
-            # เก็บ path ลง DB (ต้องเป็น relative จาก MEDIA_ROOT)
-            notification.file = f"user_uploads/{filename}"
-            notification.save(update_fields=["file"])
+        save_attachments(notification, uploaded_files)
+        fragment_cache.bump_dashboard_version(request.user.id)
+        notify_schedule_changed(notification)
 
         messages.success(request, "บันทึกการแก้ไขเรียบร้อยแล้ว ✅")
         return redirect("dashboard")
 
     return render(request, "notifications/edit_notification.html", {
         "notification": notification,
+        **target_form_context(request),
     })
 
 
@@ -497,35 +646,75 @@ from pathlib import Path
 @never_cache
 @login_required(login_url="login")
 @transaction.atomic
-def remove_notification_file(request, notification_id):
+def remove_notification_file(request, notification_id, attachment_id):
     if request.method != "POST":
         return redirect("dashboard")
 
-    notification = get_object_or_404(
-        Notification, id=notification_id, user=request.user
+    attachment = (
+        NotificationAttachment.objects
+        .filter(
+            id=attachment_id,
+            notification_id=notification_id,
+            notification__user=request.user,
+        )
+        .first()
     )
 
-    if not notification.file:
+    if attachment is None:
         messages.warning(request, "ไม่พบไฟล์แนบ")
-        return redirect("edit_notification", notification_id=notification.id)
+        return redirect("edit_notification", notification_id=notification_id)
 
-    file_path = Path(settings.MEDIA_ROOT) / notification.file
+    file_path = Path(settings.MEDIA_ROOT) / attachment.file
 
     if file_path.exists():
         try:
             file_path.unlink()
-        except Exception as e:
+        except OSError:
             messages.error(request, "ไม่สามารถลบไฟล์ได้")
-            print("[FILE] delete error:", e)
-            return redirect("edit_notification", notification_id=notification.id)
+            logger.warning(
+                "attachment delete failed",
+                extra={"notification_id": notification_id, "path": attachment.file},
+                exc_info=True,
+            )
+            return redirect("edit_notification", notification_id=notification_id)
 
-    notification.file = None
-    notification.save(update_fields=["file"])
+    attachment.delete()
+    fragment_cache.bump_dashboard_version(request.user.id)
 
     messages.success(request, "ลบไฟล์แนบเรียบร้อยแล้ว ✅")
-    return redirect("edit_notification", notification_id=notification.id)
+    return redirect("edit_notification", notification_id=notification_id)
+
 
 
+# Serve Attachment (/media/)
+# =========================
+@login_required(login_url="login")
+def serve_attachment(request, path):
+    """
+    ไฟล์แนบเปิดได้เฉพาะเจ้าของ notification (admin เปิดได้ทุกไฟล์)
+    ไม่มีสิทธิ์ / ไม่พบไฟล์ -> 404 เหมือนกัน (ไม่บอกว่ามีไฟล์อยู่)
+    """
+    attachments = NotificationAttachment.objects.filter(file=path)
+    if not request.user.is_staff:
+        attachments = attachments.filter(notification__user=request.user)
+    original_name = attachments.values_list("original_name", flat=True).first()
+    if original_name is None:
+        raise Http404
+
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    return file_serving.serve_file(
+        request,
+        settings.MEDIA_ROOT,
+        path,
+        filename=original_name,
+    )
+
 # Send Now Notification (USER)
 @never_cache
 @login_required(login_url='login')
@@ -542,6 +731,8 @@ def send_now_notification(request, notification_id):
         user=request.user
     )
 
+    from notify.services.rate_limiter import RetryAfter
+
     try:
         from notify.services.telegram_sender import send_telegram_message
 
@@ -558,10 +749,38 @@ def send_now_notification(request, notification_id):
                 "ไม่สามารถส่งข้อความทดสอบได้ ❌"
             )
 
+    except RetryAfter as e:
+        messages.warning(
+            request,
+            f"ส่งถี่เกินไป กรุณาลองใหม่ในอีก {int(e.retry_after) + 1} วินาที ⏳"
+        )
+
     except Exception:
         messages.error(
             request,
             "เกิดข้อผิดพลาดระหว่างส่งข้อความ ❌"
         )
 
-    return redirect("dashboard")
\ No newline at end of file
+    return redirect("dashboard")
+
+
+# Metrics (Prometheus text format)
+# =========================
+METRICS_TOKEN = getattr(settings, "NOTIFY_METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = getattr(settings, "NOTIFY_METRICS_ALLOWED_IPS", [])
+
+def metrics_view(request):
+    # admin ที่ login อยู่ / scraper ที่มี bearer token เท่านั้น
+    # (REMOTE_ADDR หลัง reverse proxy เป็น 127.0.0.1 ทุก request -> ใช้แยก scraper ไม่ได้)
+    if not (
+        request.user.is_staff
+        or metrics_bearer_token_matches(request.headers.get("Authorization", ""), METRICS_TOKEN)
+        or request.META.get("REMOTE_ADDR") in METRICS_ALLOWED_IPS
+    ):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+